@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from ...auth import create_access_token, get_current_user, get_password_hash, verify_password
+from ...auth import create_user_token, get_current_user, get_password_hash, user_cache, verify_password
 from ...db import get_db
 from ...models import User
 from ...schemas import ChangePasswordRequest, LoginRequest, LoginResponse, UserInfo
@@ -12,6 +12,16 @@ from ...schemas import ChangePasswordRequest, LoginRequest, LoginResponse, UserI
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
+def _set_token_cookie(response: Response, token: str) -> None:
+    response.set_cookie(
+        key="access_token",
+        value=token,
+        httponly=True,
+        max_age=86400,
+        samesite="lax",
+    )
+
+
 @router.post("/login", response_model=LoginResponse)
 def login(payload: LoginRequest, response: Response, db: Session = Depends(get_db)) -> LoginResponse:
     stmt = select(User).where(User.username == payload.username)
@@ -23,14 +33,7 @@ def login(payload: LoginRequest, response: Response, db: Session = Depends(get_d
     if not user.is_active:
         raise HTTPException(status_code=403, detail="Account is disabled. No permission to access.")
 
-    token = create_access_token(data={"sub": user.username})
-    response.set_cookie(
-        key="access_token",
-        value=token,
-        httponly=True,
-        max_age=86400,
-        samesite="lax",
-    )
+    _set_token_cookie(response, create_user_token(user))
 
     return LoginResponse(username=user.username, role=user.role)
 
@@ -55,20 +58,29 @@ def get_me(current_user: User = Depends(get_current_user)) -> UserInfo:
 @router.post("/change-password", response_model=UserInfo)
 def change_password(
     payload: ChangePasswordRequest,
+    response: Response,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> UserInfo:
-    if not verify_password(payload.old_password, current_user.password_hash):
+    # current_user 可能来自认证缓存（未绑定会话），写库前按 id 重新读取
+    user = db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if not verify_password(payload.old_password, user.password_hash):
         raise HTTPException(status_code=400, detail="Old password is incorrect")
 
-    current_user.password_hash = get_password_hash(payload.new_password)
+    user.password_hash = get_password_hash(payload.new_password)
+    # 其它已登录会话的令牌随之失效；当前会话换发新令牌
+    user.token_version = (user.token_version or 0) + 1
     db.commit()
-    db.refresh(current_user)
+    db.refresh(user)
+    user_cache.invalidate(user.username)
+    _set_token_cookie(response, create_user_token(user))
 
     return UserInfo(
-        id=current_user.id,
-        username=current_user.username,
-        role=current_user.role,
-        is_active=current_user.is_active,
-        created_at=current_user.created_at,
+        id=user.id,
+        username=user.username,
+        role=user.role,
+        is_active=user.is_active,
+        created_at=user.created_at,
     )
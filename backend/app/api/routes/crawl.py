@@ -35,10 +35,7 @@ def get_status(task_id: str, _: User = Depends(get_current_user)) -> TaskStatus:
 
 @router.get("/status", response_model=List[TaskStatus])
 def list_status(open_only: bool = Query(True, description="仅返回进行中/等待中的任务"), _: User = Depends(get_current_user)) -> List[TaskStatus]:
-    statuses = task_manager.list_status()
-    if open_only:
-        return [s for s in statuses if s.status in ("pending", "running")]
-    return statuses
+    return task_manager.list_status(open_only=open_only)
 
 
 @router.get("/runs", response_model=List[CrawlRunItem])
@@ -2,45 +2,103 @@ from __future__ import annotations
 
 import os
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from ...auth import get_current_user
+from ...auth import get_admin_user, get_current_user
+from ...config import UPSTREAM_TIMEOUT_SEC
 from ...crawler.client import PublicAnnouncementClient
 from ...crawler.models import TARGET_ITEM_NAMES
 from ...db import get_db
-from ...models import User, ValuableProject
+from ...models import User
 from ...schemas import (
     ParseCaptchaStartRequest,
     ParseCaptchaStartResponse,
     ParseCaptchaVerifyRequest,
     ParseCaptchaVerifyResponse,
+    ExtractionTierStats,
     ParseDetailItem,
     ParseDetailResponse,
+    ParseDocumentResult,
+    ParseDownloadAllRequest,
+    ParseDownloadAllResponse,
     ParseDownloadRequest,
     ParseDownloadResponse,
+    ParseLeaseItem,
+    ParseNextRequest,
+    ParseNextResponse,
+    ParseQueueEntry,
+    ParseQueueStartRequest,
+    ParseQueueStatus,
+    ParseQueueVerifyRequest,
+    ReextractJobRequest,
+    ReextractJobStatus,
 )
+from ...services.extract_cache import extract_cache
+from ...services.pdf_extractor import EXTRACTOR_VERSION
 from ...services.parse_service import (
+    DOWNLOAD_CHUNK_BYTES,
+    DownloadTooLarge,
+    ExtractionResult,
+    ParseSession,
+    download_documents,
     download_with_session,
     establish_session_and_get_captcha,
+    extract_documents_async,
+    merge_extracted_fields,
+    open_download,
+    record_parse_result,
     save_to_project_dir,
     session_manager,
     to_base64_image,
     verify_captcha,
 )
-from ...services.pdf_extractor import extract_from_pdf
+from ...services.parse_leases import acquire_leases, release_lease, renew_leases
+from ...services.parse_queue import parse_queues
+from ...services.reextract_jobs import reextract_jobs
+from ...services.upstream import ClientDisconnected, UpstreamTimeout, aiter_response_chunks, run_upstream
 
 
 router = APIRouter(prefix="/api/parse", tags=["parse"])
 
 
+def _upstream_error(exc: Exception) -> HTTPException:
+    if isinstance(exc, ClientDisconnected):
+        return HTTPException(status_code=499, detail="客户端已断开")
+    return HTTPException(status_code=504, detail="上游请求超时")
+
+
+async def _verified_session(parse_session_id: str) -> ParseSession:
+    # 会话读写都是 SQLite 提交，放到线程池中执行，避免阻塞事件循环
+    s = await run_in_threadpool(session_manager.get, parse_session_id)
+    if not s:
+        raise HTTPException(status_code=404, detail="会话不存在或已过期")
+    if not s.verified_captcha_code:
+        raise HTTPException(status_code=400, detail="验证码未验证")
+    return s
+
+
+def _record_and_commit(
+    db: Session, projectuuid: str, fields: Optional[Dict[str, str]], pdf_sha256s: List[Optional[str]]
+) -> None:
+    if not record_parse_result(db, projectuuid, fields, pdf_sha256s):
+        raise HTTPException(status_code=404, detail="项目记录不存在")
+    db.commit()
+
+
 @router.get("/detail/{projectuuid}", response_model=ParseDetailResponse)
-def get_project_parse_detail(projectuuid: str, _: User = Depends(get_current_user)) -> ParseDetailResponse:
-    client = PublicAnnouncementClient()
-    detail = client.get_project_detail(projectuuid)
+async def get_project_parse_detail(
+    projectuuid: str, request: Request, _: User = Depends(get_current_user)
+) -> ParseDetailResponse:
+    client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+    try:
+        detail = await run_upstream(client.get_project_detail, projectuuid, request=request)
+    except (UpstreamTimeout, ClientDisconnected) as exc:
+        raise _upstream_error(exc)
     if not detail:
         raise HTTPException(status_code=404, detail="项目详情不存在")
     items: List[ParseDetailItem] = []
@@ -50,42 +108,71 @@ def get_project_parse_detail(projectuuid: str, _: User = Depends(get_current_use
 
 
 @router.post("/captcha/start", response_model=ParseCaptchaStartResponse)
-def start_captcha(payload: ParseCaptchaStartRequest, _: User = Depends(get_current_user)) -> ParseCaptchaStartResponse:
-    client = PublicAnnouncementClient()
-    cookies, img_bytes = establish_session_and_get_captcha(client, payload.projectuuid, payload.sendid)
-    s = session_manager.create(payload.projectuuid, payload.sendid, cookies)
+async def start_captcha(
+    payload: ParseCaptchaStartRequest, request: Request, _: User = Depends(get_current_user)
+) -> ParseCaptchaStartResponse:
+    client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+    try:
+        cookies, img_bytes = await run_upstream(
+            establish_session_and_get_captcha, client, payload.projectuuid, payload.sendid, request=request
+        )
+    except (UpstreamTimeout, ClientDisconnected) as exc:
+        raise _upstream_error(exc)
+    s = await run_in_threadpool(session_manager.create, payload.projectuuid, payload.sendid, cookies)
     return ParseCaptchaStartResponse(parse_session_id=s.id, captcha_image_base64=to_base64_image(img_bytes))
 
 
 @router.post("/captcha/verify", response_model=ParseCaptchaVerifyResponse)
-def verify_captcha_code(payload: ParseCaptchaVerifyRequest, _: User = Depends(get_current_user)) -> ParseCaptchaVerifyResponse:
-    s = session_manager.get(payload.parse_session_id)
+async def verify_captcha_code(
+    payload: ParseCaptchaVerifyRequest, request: Request, _: User = Depends(get_current_user)
+) -> ParseCaptchaVerifyResponse:
+    s = await run_in_threadpool(session_manager.get, payload.parse_session_id)
     if not s:
         raise HTTPException(status_code=404, detail="会话不存在或已过期")
-    client = PublicAnnouncementClient()
-    ok = verify_captcha(client, s.cookies, s.referer, payload.code)
-    if ok:
-        s.verified_captcha_code = payload.code
-        return ParseCaptchaVerifyResponse(ok=True)
-    # 失败则返回新验证码图片，便于前端刷新
-    cookies, img_bytes = establish_session_and_get_captcha(client, s.projectuuid, s.sendid)
+    client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+    try:
+        ok = await run_upstream(verify_captcha, client, s.cookies, s.referer, payload.code, request=request)
+        if ok:
+            s.verified_captcha_code = payload.code
+            await run_in_threadpool(session_manager.save, s)
+            return ParseCaptchaVerifyResponse(ok=True)
+        # 失败则返回新验证码图片，便于前端刷新
+        cookies, img_bytes = await run_upstream(
+            establish_session_and_get_captcha, client, s.projectuuid, s.sendid, request=request
+        )
+    except (UpstreamTimeout, ClientDisconnected) as exc:
+        raise _upstream_error(exc)
     s.cookies = cookies
+    await run_in_threadpool(session_manager.save, s)
     return ParseCaptchaVerifyResponse(ok=False, captcha_image_base64=to_base64_image(img_bytes))
 
 
 @router.post("/download", response_model=ParseDownloadResponse)
-def download_and_extract(payload: ParseDownloadRequest, db: Session = Depends(get_db), _: User = Depends(get_current_user)) -> ParseDownloadResponse:
-    s = session_manager.get(payload.parse_session_id)
-    if not s:
-        raise HTTPException(status_code=404, detail="会话不存在或已过期")
-    if not s.verified_captcha_code:
-        raise HTTPException(status_code=400, detail="验证码未验证")
+async def download_and_extract(
+    payload: ParseDownloadRequest, request: Request, db: Session = Depends(get_db), _: User = Depends(get_current_user)
+) -> ParseDownloadResponse:
+    s = await _verified_session(payload.parse_session_id)
 
     # Use sendid from payload if provided, otherwise use session's sendid
     sendid = payload.sendid or s.sendid
 
-    client = PublicAnnouncementClient()
-    content = download_with_session(client, s.cookies, s.referer, sendid, payload.flag, s.verified_captcha_code)
+    client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+    try:
+        buffer = await run_upstream(
+            download_with_session,
+            client,
+            s.cookies,
+            s.referer,
+            sendid,
+            payload.flag,
+            s.verified_captcha_code,
+            request=request,
+            timeout=UPSTREAM_TIMEOUT_SEC * 2,
+        )
+    except DownloadTooLarge:
+        raise HTTPException(status_code=413, detail="附件过大，无法解析")
+    except (UpstreamTimeout, ClientDisconnected) as exc:
+        raise _upstream_error(exc)
 
     if payload.url:
         base_filename = os.path.basename(payload.url)
@@ -94,60 +181,106 @@ def download_and_extract(payload: ParseDownloadRequest, db: Session = Depends(ge
 
     filename = f"{s.id}_{base_filename}"
 
-    saved_path = save_to_project_dir(s.projectuuid, filename, content)
-    s.downloaded_files.append(saved_path)
+    # 仅下载时才落盘；解析直接使用内存中的缓冲区
+    if payload.download_only:
+        saved_path = await run_in_threadpool(save_to_project_dir, s.projectuuid, filename, buffer)
+        s.downloaded_files.append(saved_path)
+        await run_in_threadpool(session_manager.save, s)
+        return ParseDownloadResponse(ok=True, saved_path=saved_path, parsed_fields=None)
 
-    extracted_fields = None
-    if not payload.download_only and filename.lower().endswith(".pdf"):
-        try:
-            extracted_fields = extract_from_pdf(saved_path)
-        except Exception:
-            extracted_fields = None
+    result = ExtractionResult(None, None)
+    if filename.lower().endswith(".pdf"):
+        content = buffer.getvalue()
+        buffer.close()
+        result = (await extract_documents_async(db, [content]))[0]
 
-    project = db.get(ValuableProject, payload.projectuuid)
-    if not project:
-        raise HTTPException(status_code=404, detail="项目记录不存在")
-    if extracted_fields:
-        project.pdf_extract_json = __import__("json").dumps(extracted_fields, ensure_ascii=False)
-        project.parsed_pdf = True
-        project.parsed_at = datetime.utcnow()
-        project.pdf_file_path = None
-        project.is_invalid = False
-        db.add(project)
-        db.commit()
-    else:
-        project.pdf_file_path = None
-        project.is_invalid = True
-        db.add(project)
-        db.commit()
+    await run_in_threadpool(_record_and_commit, db, payload.projectuuid, result.fields, [result.pdf_sha256])
 
+    return ParseDownloadResponse(ok=True, saved_path=None, parsed_fields=result.fields, extract_tier=result.tier)
+
+
+@router.post("/download-all", response_model=ParseDownloadAllResponse)
+async def download_all_and_extract(
+    payload: ParseDownloadAllRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    _: User = Depends(get_current_user),
+) -> ParseDownloadAllResponse:
+    """Download every target-item document of the project over one verified session,
+    extract them in parallel and store the merged fields."""
+    s = await _verified_session(payload.parse_session_id)
+
+    client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
     try:
-        if os.path.exists(saved_path):
-            os.remove(saved_path)
-            s.downloaded_files.remove(saved_path)
-    except Exception:
-        pass
+        detail = await run_upstream(client.get_project_detail, s.projectuuid, request=request)
+        items = [it for it in (detail.items if detail else []) if it.matches_target() and it.url]
+        if not items:
+            raise HTTPException(status_code=404, detail="未找到可解析的目标文件")
+        downloads = await run_upstream(
+            download_documents,
+            client,
+            s,
+            [it.sendid for it in items],
+            payload.flag,
+            request=request,
+            timeout=UPSTREAM_TIMEOUT_SEC * 2,
+        )
+    except (UpstreamTimeout, ClientDisconnected) as exc:
+        raise _upstream_error(exc)
+
+    documents: List[ParseDocumentResult] = []
+    contents: List[bytes] = []
+    for item, (buffer, error) in zip(items, downloads):
+        documents.append(
+            ParseDocumentResult(sendid=item.sendid, item_name=item.item_name, url=item.url, ok=False, message=error)
+        )
+        if buffer is None:
+            continue
+        if not os.path.basename(item.url).lower().endswith(".pdf"):
+            documents[-1].message = "非 PDF 文件，未解析"
+            continue
+        contents.append(buffer.getvalue())
+        buffer.close()
 
-    return ParseDownloadResponse(ok=True, saved_path=saved_path, parsed_fields=extracted_fields)
+    parsed = [doc for doc in documents if doc.message is None]
+    results = await extract_documents_async(db, contents)
+    for doc, result in zip(parsed, results):
+        doc.ok = result.fields is not None
+        doc.parsed_fields = result.fields
+        doc.extract_tier = result.tier
+        if result.fields is None:
+            doc.message = "解析失败"
+
+    merged = merge_extracted_fields(result.fields for result in results)
+    # 记录全部已存储文档，重新解析时按同样顺序合并
+    await run_in_threadpool(
+        _record_and_commit, db, payload.projectuuid, merged, [result.pdf_sha256 for result in results]
+    )
+
+    return ParseDownloadAllResponse(ok=merged is not None, parsed_fields=merged, documents=documents)
 
 
 @router.post("/download-file")
-def download_file_to_client(payload: ParseDownloadRequest, _: User = Depends(get_current_user)) -> Response:
+async def download_file_to_client(
+    payload: ParseDownloadRequest, request: Request, _: User = Depends(get_current_user)
+) -> StreamingResponse:
     """
-    Directly stream the file bytes to client for download.
+    Stream the file bytes to the client for download as they arrive upstream.
     Requires a verified captcha session.
     This does not store the file on server nor parse it.
     """
-    s = session_manager.get(payload.parse_session_id)
-    if not s:
-        raise HTTPException(status_code=404, detail="会话不存在或已过期")
-    if not s.verified_captcha_code:
-        raise HTTPException(status_code=400, detail="验证码未验证")
+    s = await _verified_session(payload.parse_session_id)
 
     # Use sendid from payload if provided, otherwise session's sendid
     sendid = payload.sendid or s.sendid
-    client = PublicAnnouncementClient()
-    content = download_with_session(client, s.cookies, s.referer, sendid, payload.flag, s.verified_captcha_code)
+    client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+    # 先建立上游连接，连接失败时仍能返回正常的错误响应
+    try:
+        resp = await run_upstream(
+            open_download, client, s.cookies, s.referer, sendid, payload.flag, s.verified_captcha_code, request=request
+        )
+    except (UpstreamTimeout, ClientDisconnected) as exc:
+        raise _upstream_error(exc)
 
     # Determine filename and media type
     if payload.url:
@@ -156,4 +289,150 @@ def download_file_to_client(payload: ParseDownloadRequest, _: User = Depends(get
         filename = f"{sendid}.pdf"
     media_type = "application/pdf" if filename.lower().endswith(".pdf") else "application/octet-stream"
     headers = {"Content-Disposition": f"attachment; filename={filename}"}
-    return Response(content=content, media_type=media_type, headers=headers)
+    length = resp.headers.get("Content-Length")
+    if length and length.isdigit():
+        headers["Content-Length"] = length
+    # StreamingResponse 在客户端断开时取消生成器，finally 中关闭上游连接
+    return StreamingResponse(aiter_response_chunks(resp, DOWNLOAD_CHUNK_BYTES), media_type=media_type, headers=headers)
+
+
+def _lease_and_commit(db: Session, holder: str, regions: List[str], count: int):
+    leased = acquire_leases(db, holder, regions, count)
+    db.commit()
+    return leased
+
+
+def _renew_and_commit(db: Session, projectuuid: str, holder: str) -> bool:
+    renewed = renew_leases(db, [projectuuid], holder)
+    db.commit()
+    return bool(renewed)
+
+
+def _release_and_commit(db: Session, projectuuid: str, holder: str) -> bool:
+    released = release_lease(db, projectuuid, holder)
+    db.commit()
+    return released
+
+
+@router.post("/next", response_model=ParseNextResponse)
+async def lease_next_projects(
+    payload: ParseNextRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+) -> ParseNextResponse:
+    """Hand out unparsed projects nobody else holds, each under a time-limited lease.
+
+    Leases are released when the project's parse succeeds or fails, via
+    /leases/{projectuuid}/release, or when they expire.
+    """
+    leased = await run_in_threadpool(_lease_and_commit, db, current_user.username, payload.regions, payload.count)
+    return ParseNextResponse(
+        items=[
+            ParseLeaseItem(
+                projectuuid=projectuuid,
+                project_name=project_name,
+                region_code=region_code,
+                lease_expires_at=datetime.utcfromtimestamp(expires_at),
+            )
+            for projectuuid, project_name, region_code, expires_at in leased
+        ]
+    )
+
+
+@router.post("/leases/{projectuuid}/renew")
+async def renew_project_lease(
+    projectuuid: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+) -> dict:
+    if not await run_in_threadpool(_renew_and_commit, db, projectuuid, current_user.username):
+        raise HTTPException(status_code=409, detail="租约已过期或不属于当前用户")
+    return {"ok": True}
+
+
+@router.post("/leases/{projectuuid}/release")
+async def release_project_lease(
+    projectuuid: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+) -> dict:
+    released = await run_in_threadpool(_release_and_commit, db, projectuuid, current_user.username)
+    return {"ok": released}
+
+
+def _refreshed_queue_status(user_id: int) -> Optional[ParseQueueStatus]:
+    queue = parse_queues.get(user_id)
+    if not queue:
+        return None
+    queue.top_up()
+    return queue.to_status()
+
+
+@router.post("/queue/start", response_model=ParseQueueStatus)
+async def start_parse_queue(
+    payload: ParseQueueStartRequest, current_user: User = Depends(get_current_user)
+) -> ParseQueueStatus:
+    """Start (or restart) the caller's parse queue; the next projects' captchas are prepared in the background."""
+    queue = await run_in_threadpool(
+        parse_queues.start, current_user.id, current_user.username, payload.regions, payload.depth
+    )
+    return await run_in_threadpool(queue.to_status)
+
+
+@router.get("/queue", response_model=ParseQueueStatus)
+async def get_parse_queue(current_user: User = Depends(get_current_user)) -> ParseQueueStatus:
+    status = await run_in_threadpool(_refreshed_queue_status, current_user.id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="解析队列未启动")
+    return status
+
+
+@router.post("/queue/{entry_id}/verify", response_model=ParseQueueEntry)
+async def verify_parse_queue_entry(
+    entry_id: str, payload: ParseQueueVerifyRequest, request: Request, current_user: User = Depends(get_current_user)
+) -> ParseQueueEntry:
+    """Submit a captcha; on success download and extraction continue in the background."""
+    queue = await run_in_threadpool(parse_queues.get, current_user.id)
+    entry = await run_in_threadpool(queue.get, entry_id) if queue else None
+    if not entry:
+        raise HTTPException(status_code=404, detail="队列条目不存在")
+    if entry.state != "ready":
+        raise HTTPException(status_code=409, detail="验证码尚未就绪")
+    try:
+        await queue.verify(entry, payload.code, request=request)
+    except (UpstreamTimeout, ClientDisconnected) as exc:
+        raise _upstream_error(exc)
+    entry = await run_in_threadpool(queue.get, entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="队列条目不存在")
+    return entry.to_schema()
+
+
+@router.post("/queue/{entry_id}/skip", response_model=ParseQueueStatus)
+async def skip_parse_queue_entry(entry_id: str, current_user: User = Depends(get_current_user)) -> ParseQueueStatus:
+    queue = await run_in_threadpool(parse_queues.get, current_user.id)
+    if not queue or not await run_in_threadpool(queue.skip, entry_id):
+        raise HTTPException(status_code=404, detail="队列条目不存在或已在处理")
+    return await run_in_threadpool(queue.to_status)
+
+
+@router.delete("/queue")
+async def stop_parse_queue(current_user: User = Depends(get_current_user)) -> dict:
+    await run_in_threadpool(parse_queues.stop, current_user.id)
+    return {"ok": True}
+
+
+@router.get("/extraction-tiers", response_model=ExtractionTierStats)
+async def get_extraction_tiers(db: Session = Depends(get_db), _: User = Depends(get_admin_user)) -> ExtractionTierStats:
+    """Documents per extractor tier under the current extractor version, across every process."""
+    counts = await run_in_threadpool(extract_cache.tier_counts, db)
+    return ExtractionTierStats(extractor_version=EXTRACTOR_VERSION, documents=counts)
+
+
+@router.post("/reextract", response_model=ReextractJobStatus)
+async def start_reextract(payload: ReextractJobRequest, _: User = Depends(get_admin_user)) -> ReextractJobStatus:
+    """Re-run the current extractor over every stored PDF (optionally limited to regions)."""
+    job = await run_in_threadpool(reextract_jobs.submit, payload.regions)
+    return job.to_status()
+
+
+@router.get("/reextract/{job_id}", response_model=ReextractJobStatus)
+async def get_reextract_job(job_id: str, _: User = Depends(get_admin_user)) -> ReextractJobStatus:
+    job = await run_in_threadpool(reextract_jobs.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="重新解析任务不存在")
+    return job.to_status()
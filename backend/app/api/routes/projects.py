@@ -1,28 +1,58 @@
 from __future__ import annotations
 
-import io
-from typing import List
+import asyncio
+import base64
+import json
+from datetime import date, datetime
+from typing import List, Literal, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
-from sqlalchemy import delete, func, select
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import Row, delete, func, select, tuple_
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from ...auth import get_current_user
+from ...config import PROJECT_COUNTS_CACHE
 from ...db import get_db
-from ...models import User, ValuableProject
+from ...models import ProjectExtractFields, User, ValuableProject
 from ...schemas import (
     DeleteByRegionsResponse,
     DeleteProjectsRequest,
+    ExportJobRequest,
+    ExportJobStatus,
     PaginatedProjects,
     ProjectCounts,
     ProjectFull,
     ProjectItem,
 )
+from ...services.export_jobs import export_jobs
+from ...services.export_service import EXPORT_MEDIA_TYPES, export_filename, stream_export
+from ...services.project_counts import cached_project_counts, count_projects, total_for_filter
+from ...services.search_index import build_match_query, search_matches
 
 router = APIRouter(prefix="/api/projects", tags=["projects"])
 
+# 导出进度 SSE 的刷新间隔
+EXPORT_EVENTS_POLL_SEC = 0.5
+
+
+def _filter_projects(stmt, selected: List[str] | None = None, *, parsed: bool | None = None, invalid: bool | None = None):
+    """Apply the shared region/status filters.
+
+    Every predicate here must stay covered by the indexes declared on ``ValuableProject``;
+    ``test/test_query_plans.py`` asserts the resulting query plans.
+    """
+    if selected:
+        stmt = stmt.where(ValuableProject.region_code.in_(selected))
+    if invalid is not None:
+        stmt = stmt.where(ValuableProject.is_invalid == invalid)
+    elif parsed is not None:
+        stmt = stmt.where(ValuableProject.parsed_pdf == parsed)
+        if parsed is False:
+            stmt = stmt.where(ValuableProject.is_invalid == False)
+    return stmt
+
 
 @router.get("/counts", response_model=ProjectCounts)
 def get_project_counts(
@@ -32,21 +62,64 @@ def get_project_counts(
     _: User = Depends(get_current_user),
 ) -> ProjectCounts:
     selected = regions or ([region] if region else [])
-    base_query = select(func.count()).select_from(ValuableProject)
-    if selected:
-        base_query = base_query.where(ValuableProject.region_code.in_(selected))
-
-    all_count = int(db.scalar(base_query) or 0)
-    parsed_count = int(db.scalar(base_query.where(ValuableProject.parsed_pdf == True)) or 0)
-    unparsed_count = int(db.scalar(base_query.where(ValuableProject.parsed_pdf == False).where(ValuableProject.is_invalid == False)) or 0)
-    invalid_count = int(db.scalar(base_query.where(ValuableProject.is_invalid == True)) or 0)
-
-    return ProjectCounts(
-        all=all_count,
-        parsed=parsed_count,
-        unparsed=unparsed_count,
-        invalid=invalid_count,
-    )
+    return count_projects(db, selected)
+
+
+# ProjectItem 只需要这些列；不加载 pdf_extract_json 等大字段，也不构造 ORM 实例
+_LIST_COLUMNS = (
+    ValuableProject.projectuuid,
+    ValuableProject.project_name,
+    ValuableProject.region_code,
+    ValuableProject.discovered_at,
+    ValuableProject.parsed_pdf,
+    ValuableProject.is_invalid,
+)
+
+# 按解析字段筛选/排序时额外返回的列
+_EXTRACT_COLUMNS = (
+    ProjectExtractFields.project_type,
+    ProjectExtractFields.total_investment,
+    ProjectExtractFields.planned_start_date,
+)
+
+
+def _encode_cursor(direction: str, item: Row) -> str:
+    raw = json.dumps([direction, item.discovered_at.isoformat(), item.projectuuid], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, discovered_at, projectuuid = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(discovered_at), str(projectuuid)
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail="无效的分页游标") from exc
+
+
+def _filter_extract_fields(
+    stmt,
+    *,
+    project_type: str | None = None,
+    min_investment: float | None = None,
+    max_investment: float | None = None,
+    start_from: date | None = None,
+    start_to: date | None = None,
+):
+    """Apply range filters on the typed extraction columns (requires a join to ProjectExtractFields)."""
+    if project_type:
+        stmt = stmt.where(ProjectExtractFields.project_type == project_type)
+    if min_investment is not None:
+        stmt = stmt.where(ProjectExtractFields.total_investment >= min_investment)
+    if max_investment is not None:
+        stmt = stmt.where(ProjectExtractFields.total_investment <= max_investment)
+    if start_from is not None:
+        stmt = stmt.where(ProjectExtractFields.planned_start_date >= start_from)
+    if start_to is not None:
+        stmt = stmt.where(ProjectExtractFields.planned_start_date <= start_to)
+    return stmt
 
 
 @router.get("", response_model=PaginatedProjects)
@@ -57,27 +130,106 @@ def list_projects(
     invalid: bool | None = Query(default=None),
     page: int = Query(default=1, ge=1),
     size: int = Query(default=20, ge=1, le=200),
+    cursor: str | None = Query(default=None, description="上一页响应中的 next_cursor/prev_cursor；提供时忽略 page"),
+    with_total: bool = Query(default=True, description="为 false 时不计算 total"),
+    project_type: str | None = Query(default=None, description="项目类型"),
+    min_investment: float | None = Query(default=None, description="总投资下限（万元）"),
+    max_investment: float | None = Query(default=None, description="总投资上限（万元）"),
+    start_from: date | None = Query(default=None, description="拟开工时间起"),
+    start_to: date | None = Query(default=None, description="拟开工时间止"),
+    q: str | None = Query(default=None, description="按项目名称、法人单位、法定代表人、建设内容全文检索"),
+    sort: Literal["relevance", "discovered_at", "total_investment", "planned_start_date"] | None = Query(
+        default=None, description="默认：有 q 时按相关度，否则按发现时间"
+    ),
+    order: Literal["desc", "asc"] = Query(default="desc"),
     db: Session = Depends(get_db),
     _: User = Depends(get_current_user),
 ) -> PaginatedProjects:
     selected = regions or ([region] if region else [])
-    query = select(ValuableProject)
-    count_query = select(func.count()).select_from(ValuableProject)
-    if selected:
-        query = query.where(ValuableProject.region_code.in_(selected))
-        count_query = count_query.where(ValuableProject.region_code.in_(selected))
-    if invalid is not None:
-        query = query.where(ValuableProject.is_invalid == invalid)
-        count_query = count_query.where(ValuableProject.is_invalid == invalid)
-    elif parsed is not None:
-        query = query.where(ValuableProject.parsed_pdf == parsed)
-        count_query = count_query.where(ValuableProject.parsed_pdf == parsed)
-        if parsed is False:
-            query = query.where(ValuableProject.is_invalid == False)
-            count_query = count_query.where(ValuableProject.is_invalid == False)
-    query = query.order_by(ValuableProject.discovered_at.desc()).offset((page - 1) * size).limit(size)
-    items = db.scalars(query).all()
-    total = int(db.scalar(count_query) or 0)
+    extract_filters = dict(
+        project_type=project_type,
+        min_investment=min_investment,
+        max_investment=max_investment,
+        start_from=start_from,
+        start_to=start_to,
+    )
+    filter_by_extract = any(value is not None for value in extract_filters.values())
+    match_query = build_match_query(q) if q else None
+    if q and not match_query:
+        raise HTTPException(status_code=400, detail="检索关键词无效")
+    sort = sort or ("relevance" if match_query else "discovered_at")
+    if sort == "relevance" and not match_query:
+        raise HTTPException(status_code=400, detail="按相关度排序需要提供检索关键词")
+    keyset_order = sort == "discovered_at" and order == "desc" and not match_query
+    if cursor and not keyset_order:
+        raise HTTPException(status_code=400, detail="游标分页仅支持按发现时间倒序且不带检索关键词")
+
+    columns = _LIST_COLUMNS
+    if filter_by_extract or sort in ("total_investment", "planned_start_date"):
+        columns = _LIST_COLUMNS + _EXTRACT_COLUMNS
+    query = _filter_projects(select(*columns), selected, parsed=parsed, invalid=invalid)
+    matches = search_matches(match_query) if match_query else None
+    if matches is not None:
+        query = query.join(matches, matches.c.projectuuid == ValuableProject.projectuuid)
+    if filter_by_extract:
+        query = _filter_extract_fields(
+            query.join(ProjectExtractFields, ProjectExtractFields.projectuuid == ValuableProject.projectuuid),
+            **extract_filters,
+        )
+    elif sort in ("total_investment", "planned_start_date"):
+        query = query.outerjoin(ProjectExtractFields, ProjectExtractFields.projectuuid == ValuableProject.projectuuid)
+    # (discovered_at, projectuuid) 作为排序键，保证翻页稳定且与游标条件一致
+    sort_key = tuple_(ValuableProject.discovered_at, ValuableProject.projectuuid)
+    newest_first = (ValuableProject.discovered_at.desc(), ValuableProject.projectuuid.desc())
+
+    if cursor:
+        direction, anchor_at, anchor_uuid = _decode_cursor(cursor)
+        if direction == "next":
+            query = query.where(sort_key < tuple_(anchor_at, anchor_uuid)).order_by(*newest_first)
+        else:
+            query = query.where(sort_key > tuple_(anchor_at, anchor_uuid)).order_by(
+                ValuableProject.discovered_at.asc(), ValuableProject.projectuuid.asc()
+            )
+        rows = db.execute(query.limit(size + 1)).all()
+        has_more = len(rows) > size
+        items = list(rows[:size])
+        if direction == "prev":
+            items.reverse()
+        has_next = has_more if direction == "next" else True
+        has_prev = True if direction == "next" else has_more
+    else:
+        if sort == "relevance":
+            ordering = (matches.c.rank.asc(), *newest_first)
+        elif sort == "discovered_at":
+            ordering = newest_first if order == "desc" else (
+                ValuableProject.discovered_at.asc(), ValuableProject.projectuuid.asc()
+            )
+        else:
+            sort_column = getattr(ProjectExtractFields, sort)
+            primary = sort_column.desc() if order == "desc" else sort_column.asc()
+            ordering = (primary.nulls_last(), *newest_first)
+        rows = db.execute(query.order_by(*ordering).offset((page - 1) * size).limit(size + 1)).all()
+        items = list(rows[:size])
+        has_next = len(rows) > size
+        has_prev = page > 1
+
+    total = None
+    if with_total:
+        if filter_by_extract or matches is not None:
+            count_query = _filter_projects(select(func.count()).select_from(ValuableProject), selected, parsed=parsed, invalid=invalid)
+            if matches is not None:
+                count_query = count_query.join(matches, matches.c.projectuuid == ValuableProject.projectuuid)
+            if filter_by_extract:
+                count_query = _filter_extract_fields(
+                    count_query.join(ProjectExtractFields, ProjectExtractFields.projectuuid == ValuableProject.projectuuid),
+                    **extract_filters,
+                )
+            total = int(db.scalar(count_query) or 0)
+        elif PROJECT_COUNTS_CACHE:
+            total = total_for_filter(cached_project_counts(db, selected), parsed=parsed, invalid=invalid)
+        else:
+            count_query = _filter_projects(select(func.count()).select_from(ValuableProject), selected, parsed=parsed, invalid=invalid)
+            total = int(db.scalar(count_query) or 0)
     return PaginatedProjects(
         items=[
             ProjectItem(
@@ -87,12 +239,20 @@ def list_projects(
                 discovered_at=item.discovered_at,
                 parsed_pdf=item.parsed_pdf,
                 is_invalid=item.is_invalid,
+                project_type=getattr(item, "project_type", None),
+                total_investment=getattr(item, "total_investment", None),
+                planned_start_date=getattr(item, "planned_start_date", None),
             )
             for item in items
         ],
         total=total,
         page=page,
         size=size,
+        has_next=has_next,
+        has_prev=has_prev,
+        # 游标只对默认的发现时间倒序有效；其他排序与搜索结果按 page 翻页
+        next_cursor=_encode_cursor("next", items[-1]) if keyset_order and items and has_next else None,
+        prev_cursor=_encode_cursor("prev", items[0]) if keyset_order and items and has_prev else None,
     )
 
 
@@ -100,139 +260,69 @@ def list_projects(
 def export_projects(
     region: str | None = Query(default=None),
     regions: List[str] = Query(default_factory=list),
-    db: Session = Depends(get_db),
+    fmt: Literal["xlsx", "csv", "ndjson"] = Query(default="xlsx", alias="format"),
     _: User = Depends(get_current_user),
-) -> Response:
-    import json as _json
-
+) -> StreamingResponse:
     selected = regions or ([region] if region else [])
-    query = select(ValuableProject).order_by(ValuableProject.discovered_at.desc())
-    if selected:
-        query = query.where(ValuableProject.region_code.in_(selected))
-    projects = db.scalars(query).all()
-
-    parse_field_names = [
-        "项目名称",
-        "项目类型",
-        "建设性质",
-        "拟开工时间",
-        "拟建成时间",
-        "建设规模与建设内容（生产能力）",
-        "项目联系人姓名",
-        "项目联系人手机",
-        "总投资",
-        "固定投资",
-        "土建工程",
-        "设备购置费",
-        "安装工程",
-        "工程建设其他费用",
-        "预备费",
-        "建设期利息",
-        "铺底流动资金",
-        "财政性资金",
-        "自有资金（非财政性资金）",
-        "银行贷款",
-        "其它",
-        "项目（法人）单位",
-        "成立日期",
-        "法定代表人",
-        "法定代表人手机号码",
-    ]
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "项目列表"
-
-    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True, size=11)
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    thin_border = Border(
-        left=Side(style="thin", color="D0D0D0"),
-        right=Side(style="thin", color="D0D0D0"),
-        top=Side(style="thin", color="D0D0D0"),
-        bottom=Side(style="thin", color="D0D0D0"),
-    )
+    headers = {"Content-Disposition": f"attachment; filename={export_filename(fmt)}"}
+    return StreamingResponse(stream_export(fmt, selected), media_type=EXPORT_MEDIA_TYPES[fmt], headers=headers)
 
-    basic_headers = ["项目编号", "项目名称", "地区代码", "发现时间", "解析状态"]
-    headers = basic_headers + parse_field_names
-
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    parsed_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
-    unparsed_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-    data_alignment = Alignment(horizontal="left", vertical="center", wrap_text=False)
-    center_alignment = Alignment(horizontal="center", vertical="center")
-
-    for row_idx, project in enumerate(projects, 2):
-        is_parsed = bool(project.parsed_pdf)
-        status_fill = parsed_fill if is_parsed else unparsed_fill
-
-        basic_data = [
-            project.projectuuid,
-            project.project_name,
-            project.region_code,
-            project.discovered_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "已解析" if is_parsed else "未解析",
-        ]
-
-        for col_idx, value in enumerate(basic_data, 1):
-            cell = ws.cell(row=row_idx, column=col_idx, value=value)
-            cell.border = thin_border
-            cell.alignment = center_alignment if col_idx in [1, 3, 5] else data_alignment
-            if col_idx == 5:
-                cell.fill = status_fill
-                cell.font = Font(bold=True, color="1F4E78" if is_parsed else "9C6500")
-
-        parsed_data = {}
-        if project.pdf_extract_json:
-            try:
-                parsed_data = _json.loads(project.pdf_extract_json)
-            except Exception:
-                pass
-
-        for col_offset, field in enumerate(parse_field_names, len(basic_data) + 1):
-            value = parsed_data.get(field, "")
-            cell = ws.cell(row=row_idx, column=col_offset, value=value)
-            cell.border = thin_border
-            cell.alignment = data_alignment
-
-    column_widths = {
-        1: 32,
-        2: 40,
-        3: 12,
-        4: 20,
-        5: 12,
-    }
-    for col_idx, width in column_widths.items():
-        ws.column_dimensions[ws.cell(row=1, column=col_idx).column_letter].width = width
-
-    for col_idx in range(6, len(headers) + 1):
-        ws.column_dimensions[ws.cell(row=1, column=col_idx).column_letter].width = 20
-
-    ws.freeze_panes = "A2"
-
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    headers = {"Content-Disposition": "attachment; filename=valuable_projects.xlsx"}
-    return Response(
-        content=buffer.getvalue(),
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers=headers,
-    )
+
+@router.post("/export/jobs", response_model=ExportJobStatus)
+def create_export_job(payload: ExportJobRequest, _: User = Depends(get_current_user)) -> ExportJobStatus:
+    return export_jobs.submit(payload.format, payload.regions).to_status()
+
+
+@router.get("/export/jobs/{job_id}", response_model=ExportJobStatus)
+def get_export_job(job_id: str, _: User = Depends(get_current_user)) -> ExportJobStatus:
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    return job.to_status()
+
+
+@router.get("/export/jobs/{job_id}/events")
+def stream_export_job(job_id: str, _: User = Depends(get_current_user)) -> StreamingResponse:
+    """Server-sent events with the job status until it finishes."""
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+
+    async def events():
+        current = job
+        while True:
+            status = current.to_status()
+            yield f"data: {status.model_dump_json()}\n\n"
+            if status.status in ("succeeded", "failed"):
+                return
+            await asyncio.sleep(EXPORT_EVENTS_POLL_SEC)
+            # 任务可能在别的进程里生成，每次从数据库重新读取
+            current = await run_in_threadpool(export_jobs.get, job_id) or current
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/export/jobs/{job_id}/download")
+def download_export_job(job_id: str, _: User = Depends(get_current_user)) -> FileResponse:
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导出任务不存在")
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail="导出尚未完成")
+    if not job.path.exists():
+        raise HTTPException(status_code=410, detail="导出文件已过期，请重新导出")
+    return FileResponse(job.path, media_type=EXPORT_MEDIA_TYPES[job.fmt], filename=export_filename(job.fmt))
 
 
 @router.delete("", status_code=204)
 def delete_projects(payload: DeleteProjectsRequest, db: Session = Depends(get_db), _: User = Depends(get_current_user)) -> Response:
     if not payload.projectuuids:
         raise HTTPException(status_code=400, detail="必须提供要删除的项目uuid 列表")
-    stmt = delete(ValuableProject).where(ValuableProject.projectuuid.in_(payload.projectuuids))
+    stmt = (
+        delete(ValuableProject)
+        .where(ValuableProject.projectuuid.in_(payload.projectuuids))
+        .execution_options(synchronize_session=False)
+    )
     db.execute(stmt)
     db.commit()
     return Response(status_code=204)
@@ -242,7 +332,11 @@ def delete_projects(payload: DeleteProjectsRequest, db: Session = Depends(get_db
 def delete_by_regions(regions: List[str] = Query(default_factory=list), db: Session = Depends(get_db), _: User = Depends(get_current_user)) -> DeleteByRegionsResponse:
     if not regions:
         raise HTTPException(status_code=400, detail="必须提供至少一个地区进行删除")
-    stmt = delete(ValuableProject).where(ValuableProject.region_code.in_(regions))
+    stmt = (
+        delete(ValuableProject)
+        .where(ValuableProject.region_code.in_(regions))
+        .execution_options(synchronize_session=False)
+    )
     result = db.execute(stmt)
     db.commit()
     deleted = int(result.rowcount or 0)
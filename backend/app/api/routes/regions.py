@@ -1,70 +1,76 @@
 from __future__ import annotations
 
-import json
-from pathlib import Path
-from typing import List, Optional
+from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
 
 from ...auth import get_current_user
-from ...config import DATA_DIR
+from ...db import get_db
 from ...models import User
-from ...schemas import RegionNode
+from ...schemas import RegionNode, RegionRollupNode
 from ...services.crawler_service import CrawlerService
+from ...services.region_index import RegionSnapshot, region_index, serialize_regions
+from ...services.region_rollups import region_rollup_tree, sync_region_parents
 
 router = APIRouter(prefix="/api/regions", tags=["regions"])
 service = CrawlerService()
 
 
-CACHE_FILE: Path = DATA_DIR / "regions.json"
+def _regions_response(request: Request, snapshot: RegionSnapshot) -> Response:
+    # 树结构已预先序列化；客户端携带相同 ETag 时直接返回 304
+    headers = {"ETag": snapshot.etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if snapshot.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
 
 
-def _load_cached_regions() -> Optional[List[RegionNode]]:
-    if not CACHE_FILE.exists():
-        return None
-    try:
-        payload = json.loads(CACHE_FILE.read_text(encoding="utf-8"))
-        if not isinstance(payload, list):
-            return None
-        return [RegionNode.model_validate(item) for item in payload]
-    except Exception:
-        # 缓存损坏或不兼容，忽略并返回 None
-        return None
-
-
-def _save_regions_cache(regions: List[RegionNode]) -> None:
-    # 将树结构完整写入缓存文件
-    data = [r.model_dump() for r in regions]
-    CACHE_FILE.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+def _replace_regions(db: Session, regions: List[RegionNode]) -> RegionSnapshot:
+    snapshot = region_index.replace(regions)
+    # 区县归属变化时同步 region_parents 并重建汇总
+    if sync_region_parents(db, snapshot):
+        db.commit()
+    return snapshot
 
 
 @router.get("", response_model=List[RegionNode])
-def get_regions(_: User = Depends(get_current_user)) -> List[RegionNode]:
-    # 先尝试读取缓存，若无则实时抓取并落盘
-    cached = _load_cached_regions()
-    if cached is not None:
-        return cached
+def get_regions(request: Request, db: Session = Depends(get_db), _: User = Depends(get_current_user)) -> Response:
+    # 先使用内存中的地区索引，若无缓存文件则实时抓取并落盘
+    snapshot = region_index.snapshot()
+    if snapshot is not None:
+        return _regions_response(request, snapshot)
     try:
         regions = service.fetch_region_tree()
-        try:
-            _save_regions_cache(regions)
-        except Exception:
-            # 缓存失败不影响接口返回
-            pass
-        return regions
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"地区数据获取失败: {exc}") from exc
+    try:
+        snapshot = _replace_regions(db, regions)
+    except Exception:
+        # 缓存失败不影响接口返回
+        return Response(content=serialize_regions(regions), media_type="application/json")
+    return _regions_response(request, snapshot)
 
 
 @router.post("/refresh", response_model=List[RegionNode])
-def refresh_regions(_: User = Depends(get_current_user)) -> List[RegionNode]:
-    # 强制刷新：调用现有爬取逻辑并更新缓存
+def refresh_regions(request: Request, db: Session = Depends(get_db), _: User = Depends(get_current_user)) -> Response:
+    # 强制刷新：调用现有爬取逻辑，更新缓存文件并替换内存索引
     try:
         regions = service.fetch_region_tree()
-        try:
-            _save_regions_cache(regions)
-        except Exception:
-            pass
-        return regions
     except Exception as exc:
         raise HTTPException(status_code=502, detail=f"地区数据刷新失败: {exc}") from exc
+    try:
+        snapshot = _replace_regions(db, regions)
+    except Exception:
+        region_index.invalidate()
+        return Response(content=serialize_regions(regions), media_type="application/json")
+    return _regions_response(request, snapshot)
+
+
+@router.get("/stats", response_model=List[RegionRollupNode])
+def get_region_stats(db: Session = Depends(get_db), _: User = Depends(get_current_user)) -> List[RegionRollupNode]:
+    # 市/区县项目统计来自触发器维护的 region_rollups，一次查询即可得到整棵树
+    snapshot = region_index.snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="地区数据尚未加载")
+    return region_rollup_tree(db, snapshot)
@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from ...auth import get_admin_user, get_password_hash
+from ...auth import get_admin_user, get_password_hash, user_cache
 from ...db import get_db
 from ...models import User
 from ...schemas import CreateUserRequest, ResetPasswordRequest, UpdateUserRequest, UserInfo
@@ -80,6 +80,7 @@ def update_user(
     user.is_active = payload.is_active
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.username)
 
     return UserInfo(
         id=user.id,
@@ -105,6 +106,7 @@ def delete_user(
 
     db.delete(user)
     db.commit()
+    user_cache.invalidate(user.username)
     return Response(status_code=204)
 
 
@@ -120,8 +122,11 @@ def reset_user_password(
         raise HTTPException(status_code=404, detail="User not found")
 
     user.password_hash = get_password_hash(payload.new_password)
+    # 重置密码后该用户已签发的令牌全部失效，需要重新登录
+    user.token_version = (user.token_version or 0) + 1
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(user.username)
 
     return UserInfo(
         id=user.id,
@@ -1,30 +1,40 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 
 from fastapi import Cookie, Depends, HTTPException, status
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from .config import AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL_SEC, AUTH_USERS_STAMP_CHECK_SEC
 from .db import get_db
-from .models import User
+from .models import TableVersion, User
 
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# passlib / python-jose（及其加密后端）只在首次登录或校验令牌时导入，不拖慢应用启动
+@lru_cache(maxsize=None)
+def _pwd_context():
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _pwd_context().hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -34,10 +44,126 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_HOURS)
     to_encode.update({"exp": expire})
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_user_token(user: User) -> str:
+    return create_access_token(data={"sub": user.username, "ver": user.token_version or 0})
+
+
+@dataclass(frozen=True)
+class _CachedUser:
+    id: int
+    username: str
+    password_hash: str
+    role: str
+    is_active: bool
+    created_at: datetime
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: User) -> "_CachedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            password_hash=user.password_hash,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at,
+            token_version=user.token_version or 0,
+        )
+
+    def to_user(self) -> User:
+        # 每次返回新的游离对象，调用方修改它不会影响缓存；需要写库时请按 id 重新读取
+        return User(
+            id=self.id,
+            username=self.username,
+            password_hash=self.password_hash,
+            role=self.role,
+            is_active=self.is_active,
+            created_at=self.created_at,
+            token_version=self.token_version,
+        )
+
+
+def users_version(db: Session) -> int:
+    """Change stamp of the users table, bumped by triggers on every update or delete."""
+    version = db.scalar(select(TableVersion.version).where(TableVersion.name == "users"))
+    return int(version or 0)
+
+
+class UserCache:
+    """Small TTL + LRU cache of active users by username.
+
+    Entries are only trusted while the token's ``ver`` claim matches the cached
+    token_version and the users table's change stamp is the one seen when the entry was
+    cached. Routes that edit users invalidate this process's entry directly; the stamp,
+    shared by every API worker process, is re-read at most once per ``stamp_check_sec``,
+    so an edit made through another process takes effect within that window and a
+    cache hit inside it runs no SQL at all.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = AUTH_USER_CACHE_SIZE,
+        ttl_sec: float = AUTH_USER_CACHE_TTL_SEC,
+        stamp_check_sec: float = AUTH_USERS_STAMP_CHECK_SEC,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.stamp_check_sec = stamp_check_sec
+        self._entries: "OrderedDict[str, Tuple[_CachedUser, int, float]]" = OrderedDict()
+        self._stamp: Optional[Tuple[int, float]] = None
+        self._lock = threading.Lock()
+
+    def stamp(self, db: Session) -> int:
+        """The users change stamp, read from the database at most once per ``stamp_check_sec``."""
+        now = time.monotonic()
+        with self._lock:
+            if self._stamp is not None and now < self._stamp[1]:
+                return self._stamp[0]
+        stamp = users_version(db)
+        with self._lock:
+            self._stamp = (stamp, now + self.stamp_check_sec)
+        return stamp
+
+    def get(self, username: str, token_version: int, stamp: int) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return None
+            cached, cached_stamp, expires_at = entry
+            if expires_at <= time.monotonic() or cached.token_version != token_version or cached_stamp != stamp:
+                del self._entries[username]
+                return None
+            self._entries.move_to_end(username)
+        return cached.to_user()
+
+    def put(self, user: User, stamp: int) -> None:
+        if self.max_entries <= 0 or self.ttl_sec <= 0:
+            return
+        with self._lock:
+            self._entries[user.username] = (_CachedUser.from_user(user), stamp, time.monotonic() + self.ttl_sec)
+            self._entries.move_to_end(user.username)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._entries.pop(username, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._stamp = None
+
+
+user_cache = UserCache()
+
+
 def get_current_user(
     token: Optional[str] = Cookie(default=None, alias="access_token"),
     db: Session = Depends(get_db),
@@ -48,23 +174,34 @@ def get_current_user(
     )
     if not token:
         raise credentials_exception
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-    except JWTError:
+        # 旧令牌没有 ver 声明，视为版本 0
+        token_version = int(payload.get("ver", 0))
+    except (JWTError, TypeError, ValueError):
         raise credentials_exception
 
+    # 先读变更戳再读用户：期间若有修改，缓存的是旧戳，读到新戳后会重新读取
+    stamp = user_cache.stamp(db)
+    cached = user_cache.get(username, token_version, stamp)
+    if cached is not None:
+        return cached
+
     stmt = select(User).where(User.username == username)
     user = db.scalar(stmt)
-    if user is None:
+    if user is None or (user.token_version or 0) != token_version:
         raise credentials_exception
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account is disabled. No permission to access.",
         )
+    user_cache.put(user, stamp)
     return user
 
 
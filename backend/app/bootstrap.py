@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .auth import get_password_hash
+from .db import Base, engine
+from .migrations import SCHEMA_VERSION, ensure_migrations, get_schema_version
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADMIN_USERNAME = "admin"
+DEFAULT_ADMIN_PASSWORD = "imadmin"
+
+
+def ensure_schema(session: Session) -> bool:
+    """Create missing tables and run pending migrations; returns True if anything ran.
+
+    A database already at ``SCHEMA_VERSION`` is left alone: both ``create_all`` (one
+    table lookup per model) and the migration bookkeeping are skipped after one PRAGMA.
+    """
+    if get_schema_version(session) >= SCHEMA_VERSION:
+        return False
+    session.rollback()
+    Base.metadata.create_all(bind=engine)
+    try:
+        ensure_migrations(session)
+    except Exception:
+        # 与旧版行为一致：迁移失败不阻止服务启动，但要留下记录
+        session.rollback()
+        logger.exception("schema migration failed")
+    return True
+
+
+def ensure_default_admin(session: Session) -> bool:
+    """Seed the default admin account if it is missing; returns True if it was created.
+
+    The bcrypt hash is only computed when the row actually has to be inserted.
+    """
+    exists = session.scalar(select(User.id).where(User.username == DEFAULT_ADMIN_USERNAME))
+    if exists is not None:
+        return False
+    session.add(
+        User(
+            username=DEFAULT_ADMIN_USERNAME,
+            password_hash=get_password_hash(DEFAULT_ADMIN_PASSWORD),
+            role="admin",
+            is_active=True,
+        )
+    )
+    session.commit()
+    return True
+
+
+def bootstrap(session: Session) -> None:
+    """One-time startup work for the API (and any other entry point that needs the DB)."""
+    ensure_schema(session)
+    ensure_default_admin(session)
+
+
+if __name__ == "__main__":
+    # python -m app.bootstrap：部署时先单独建库/迁移，再以 GOV_STATS_STARTUP_BOOTSTRAP=0 启动各进程
+    from .db import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    with SessionLocal() as _session:
+        bootstrap(_session)
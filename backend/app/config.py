@@ -19,6 +19,68 @@ LOG_FILE = LOGS_DIR / "crawler.log"
 # Database URL can be overridden by env var GOV_STATS_DATABASE_URL
 DATABASE_URL = os.getenv("GOV_STATS_DATABASE_URL", f"sqlite:///{(DATA_DIR / 'app.db').as_posix()}")
 
+# Serve /api/projects/counts from the trigger-maintained region_rollups table
+# (O(regions)); set GOV_STATS_PROJECT_COUNTS_CACHE=0 to aggregate valuable_projects directly.
+PROJECT_COUNTS_CACHE = os.getenv("GOV_STATS_PROJECT_COUNTS_CACHE", "1") != "0"
+
+# Finished export files, reused while valuable_projects is unchanged; oldest evicted past the size cap
+EXPORT_CACHE_DIR = DATA_DIR / "exports"
+EXPORT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("GOV_STATS_EXPORT_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# PDF extraction runs in a separate process pool so pdfplumber never holds the API's GIL
+PDF_EXTRACT_WORKERS = int(os.getenv("GOV_STATS_PDF_EXTRACT_WORKERS", "1"))
+PDF_EXTRACT_TIMEOUT_SEC = float(os.getenv("GOV_STATS_PDF_EXTRACT_TIMEOUT_SEC", "60"))
+PDF_EXTRACT_MAX_MEMORY_MB = int(os.getenv("GOV_STATS_PDF_EXTRACT_MAX_MEMORY_MB", "768"))
+PDF_EXTRACT_MAX_TASKS_PER_CHILD = int(os.getenv("GOV_STATS_PDF_EXTRACT_MAX_TASKS_PER_CHILD", "20"))
+
+# Extraction results are memoized per (PDF SHA-256, extractor version) in pdf_extract_cache;
+# this many recent results are also kept in process memory
+EXTRACT_CACHE_MEMORY_ENTRIES = int(os.getenv("GOV_STATS_EXTRACT_CACHE_ENTRIES", "512"))
+
+# Opt-in content-addressed store of downloaded PDFs (gzip, keyed by SHA-256) so documents can be
+# re-extracted offline without another captcha; least recently used files go past the size cap
+PDF_STORE_ENABLED = os.getenv("GOV_STATS_PDF_STORE", "0") == "1"
+PDF_STORE_DIR = DATA_DIR / "pdf_store"
+PDF_STORE_MAX_BYTES = int(os.getenv("GOV_STATS_PDF_STORE_MAX_MB", "2048")) * 1024 * 1024
+
+# Upper bound for an attachment buffered in memory for parsing; larger downloads are rejected
+PARSE_MAX_DOWNLOAD_BYTES = int(os.getenv("GOV_STATS_PARSE_MAX_DOWNLOAD_MB", "64")) * 1024 * 1024
+
+# Projects whose detail and captcha session are prepared ahead of the operator in the parse queue
+PARSE_QUEUE_DEPTH = int(os.getenv("GOV_STATS_PARSE_QUEUE_DEPTH", "3"))
+
+# Blocking upstream calls (urllib) made by the async parse routes run on their own bounded executor,
+# not Starlette's shared threadpool; each call is abandoned after the timeout
+UPSTREAM_MAX_WORKERS = int(os.getenv("GOV_STATS_UPSTREAM_MAX_WORKERS", "16"))
+UPSTREAM_TIMEOUT_SEC = float(os.getenv("GOV_STATS_UPSTREAM_TIMEOUT_SEC", "30"))
+
+# How long a project handed out by /api/parse/next (or held by a parse queue) stays reserved
+PARSE_LEASE_TTL_SEC = int(os.getenv("GOV_STATS_PARSE_LEASE_TTL_SEC", "900"))
+
+# Authenticated users are cached per process for this long (seconds) so polling endpoints
+# skip the users lookup. Edits made through this process invalidate its cache at once; any
+# change to the users table (from any process) bumps a shared stamp that each process reads
+# at most once per AUTH_USERS_STAMP_CHECK_SEC, so edits made elsewhere apply within that window
+AUTH_USER_CACHE_TTL_SEC = float(os.getenv("GOV_STATS_AUTH_USER_CACHE_TTL_SEC", "30"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("GOV_STATS_AUTH_USER_CACHE_SIZE", "256"))
+AUTH_USERS_STAMP_CHECK_SEC = float(os.getenv("GOV_STATS_AUTH_USERS_STAMP_CHECK_SEC", "2"))
+
+# Schema creation, migrations and the default admin seed run once in the API lifespan; set to 0
+# when the database is provisioned separately (e.g. every extra worker process of a deployment)
+STARTUP_BOOTSTRAP = os.getenv("GOV_STATS_STARTUP_BOOTSTRAP", "1") == "1"
+
+# Crawl tasks are queued in the crawl_tasks table. "embedded" runs a crawler worker inside the API
+# process (single-process setups); "external" leaves them to `python -m app.worker`
+CRAWL_WORKER_MODE = os.getenv("GOV_STATS_CRAWL_WORKER", "embedded")
+CRAWL_WORKER_CONCURRENCY = int(os.getenv("GOV_STATS_CRAWL_WORKER_CONCURRENCY", "2"))
+CRAWL_WORKER_POLL_SEC = float(os.getenv("GOV_STATS_CRAWL_WORKER_POLL_SEC", "2"))
+# On shutdown running crawls get this long to stop on their own; whatever is still running is then
+# handed back to the queue before the process exits. Keep it below pm2's kill_timeout (15 s)
+CRAWL_WORKER_STOP_TIMEOUT_SEC = float(os.getenv("GOV_STATS_CRAWL_WORKER_STOP_TIMEOUT_SEC", "10"))
+# A running task whose worker has not reported progress for this long is marked failed
+CRAWL_TASK_LEASE_TTL_SEC = float(os.getenv("GOV_STATS_CRAWL_TASK_LEASE_TTL_SEC", "120"))
+
 
 __all__ = [
     "REPO_ROOT",
@@ -26,5 +88,30 @@ __all__ = [
     "LOGS_DIR",
     "LOG_FILE",
     "DATABASE_URL",
+    "PROJECT_COUNTS_CACHE",
+    "EXPORT_CACHE_DIR",
+    "EXPORT_CACHE_MAX_BYTES",
+    "PDF_EXTRACT_WORKERS",
+    "PDF_EXTRACT_TIMEOUT_SEC",
+    "PDF_EXTRACT_MAX_MEMORY_MB",
+    "PDF_EXTRACT_MAX_TASKS_PER_CHILD",
+    "EXTRACT_CACHE_MEMORY_ENTRIES",
+    "PDF_STORE_ENABLED",
+    "PDF_STORE_DIR",
+    "PDF_STORE_MAX_BYTES",
+    "PARSE_MAX_DOWNLOAD_BYTES",
+    "PARSE_QUEUE_DEPTH",
+    "PARSE_LEASE_TTL_SEC",
+    "UPSTREAM_MAX_WORKERS",
+    "UPSTREAM_TIMEOUT_SEC",
+    "AUTH_USER_CACHE_TTL_SEC",
+    "AUTH_USER_CACHE_SIZE",
+    "AUTH_USERS_STAMP_CHECK_SEC",
+    "STARTUP_BOOTSTRAP",
+    "CRAWL_WORKER_MODE",
+    "CRAWL_WORKER_CONCURRENCY",
+    "CRAWL_WORKER_POLL_SEC",
+    "CRAWL_WORKER_STOP_TIMEOUT_SEC",
+    "CRAWL_TASK_LEASE_TTL_SEC",
 ]
 
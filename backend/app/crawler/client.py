@@ -9,6 +9,7 @@ from urllib.error import HTTPError, URLError
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
+from ..deadlines import socket_timeout
 from .models import ItemSummary, ProjectDetail, Region
 
 logger = logging.getLogger(__name__)
@@ -50,7 +51,7 @@ class PublicAnnouncementClient:
         encoded_data = urlencode(data).encode("utf-8") if data else None
         request = Request(url, data=encoded_data, headers=self.headers, method="POST")
         try:
-            with urlopen(request, timeout=self.timeout) as response:
+            with urlopen(request, timeout=socket_timeout(self.timeout)) as response:
                 raw = response.read()
                 content_type = response.headers.get("Content-Type", "")
         except HTTPError as exc:
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class UpstreamTimeout(TimeoutError):
+    """The upstream site did not answer within the allotted time."""
+
+
+class ClientDisconnected(Exception):
+    """The API client went away while we were waiting on the upstream site."""
+
+
+@dataclass
+class CallBudget:
+    """Deadline of one upstream call, shared with the threads doing its blocking work."""
+
+    deadline: float
+    abandoned: threading.Event = field(default_factory=threading.Event)
+    disconnected: bool = False
+
+    @classmethod
+    def starting_now(cls, timeout: float) -> "CallBudget":
+        return cls(deadline=time.monotonic() + timeout)
+
+    def abandon(self, disconnected: bool = False) -> None:
+        self.disconnected = disconnected
+        self.abandoned.set()
+
+
+_budget: contextvars.ContextVar[Optional[CallBudget]] = contextvars.ContextVar("upstream_budget", default=None)
+
+
+def set_budget(budget: Optional[CallBudget]) -> contextvars.Token:
+    """Make ``budget`` the deadline of blocking upstream work in the current context."""
+    return _budget.set(budget)
+
+
+@contextmanager
+def upstream_deadline(timeout: float) -> Iterator[CallBudget]:
+    """Give blocking upstream work in the current thread ``timeout`` seconds in total.
+
+    For background work that does not go through ``run_upstream``; socket operations
+    and ``check_deadline`` inside the block are held to the same budget.
+    """
+    budget = CallBudget.starting_now(timeout)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+def check_deadline() -> None:
+    """Raise once the current call's budget has run out or the call was given up on.
+
+    Blocking upstream code calls this between operations (e.g. per downloaded chunk) so
+    an abandoned call stops promptly instead of occupying a thread. Without a budget it
+    does nothing.
+    """
+    budget = _budget.get()
+    if budget is None:
+        return
+    if budget.abandoned.is_set():
+        raise ClientDisconnected() if budget.disconnected else UpstreamTimeout("upstream call abandoned")
+    if time.monotonic() >= budget.deadline:
+        raise UpstreamTimeout("upstream call passed its deadline")
+
+
+def socket_timeout(default: float) -> float:
+    """Timeout for one blocking socket operation: ``default``, capped by the time left in the call."""
+    check_deadline()
+    budget = _budget.get()
+    if budget is None:
+        return default
+    return max(0.001, min(default, budget.deadline - time.monotonic()))
+
+
+def propagate_budget(fn: Callable[..., T]) -> Callable[..., T]:
+    """Wrap ``fn`` so threads it is handed to inherit the caller's upstream deadline."""
+    budget = _budget.get()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _budget.set(budget)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _budget.reset(token)
+
+    return wrapper
@@ -1,36 +1,48 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import select
+from starlette.concurrency import run_in_threadpool
 
 from .api.routes import auth, crawl, logs, parse, projects, regions, users
-from .auth import get_password_hash
-from .db import Base, SessionLocal, engine
-from .migrations import ensure_migrations
-from .models import User
+from .config import CRAWL_WORKER_MODE, STARTUP_BOOTSTRAP
+from .db import SessionLocal
+from .services import upstream
+from .services.crawl_worker import CrawlWorker
+from .services.extraction_pool import extraction_pool
+from .services.parse_service import session_manager
+
+
+def run_bootstrap() -> None:
+    from .bootstrap import bootstrap
 
-Base.metadata.create_all(bind=engine)
+    with SessionLocal() as session:
+        bootstrap(session)
 
-with SessionLocal() as _session:
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # 导入本模块不再触碰数据库：建表、迁移和默认管理员都在这里执行一次
+    if STARTUP_BOOTSTRAP:
+        await run_in_threadpool(run_bootstrap)
+    # external 模式下由独立的 python -m app.worker 进程执行爬取任务
+    crawl_worker = CrawlWorker() if CRAWL_WORKER_MODE == "embedded" else None
+    if crawl_worker is not None:
+        crawl_worker.start()
     try:
-        ensure_migrations(_session)
-    except Exception:
-        pass
-
-    stmt = select(User).where(User.username == "admin")
-    admin_user = _session.scalar(stmt)
-    if not admin_user:
-        admin_user = User(
-            username="admin",
-            password_hash=get_password_hash("imadmin"),
-            role="admin",
-            is_active=True,
-        )
-        _session.add(admin_user)
-        _session.commit()
-
-app = FastAPI(title="审批管理系统爬取平台 API")
+        yield
+    finally:
+        if crawl_worker is not None:
+            crawl_worker.stop()
+        extraction_pool.shutdown()
+        session_manager.stop()
+        upstream.shutdown()
+
+
+app = FastAPI(title="审批管理系统爬取平台 API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Callable, List, Tuple
+
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
@@ -9,11 +11,15 @@ def _column_exists(session: Session, table: str, column: str) -> bool:
     return any(r[1] == column for r in rows)
 
 
-def ensure_migrations(session: Session) -> None:
-    """Lightweight, idempotent migrations for SQLite.
+def get_schema_version(session: Session) -> int:
+    return int(session.execute(text("PRAGMA user_version")).scalar() or 0)
 
-    Adds new columns introduced after initial table creation without requiring Alembic.
-    """
+
+def _set_schema_version(session: Session, version: int) -> None:
+    session.execute(text(f"PRAGMA user_version = {int(version)}"))
+
+
+def _m001_project_status_columns(session: Session) -> None:
     alters: list[tuple[str, str]] = []
     if not _column_exists(session, "valuable_projects", "parsed_pdf"):
         alters.append(("valuable_projects", "ALTER TABLE valuable_projects ADD COLUMN parsed_pdf INTEGER NOT NULL DEFAULT 0"))
@@ -28,6 +34,414 @@ def ensure_migrations(session: Session) -> None:
 
     for _, sql in alters:
         session.execute(text(sql))
-    if alters:
-        session.commit()
 
+
+def _m002_project_query_indexes(session: Session) -> None:
+    # 与 models 中声明的索引保持同名，create_all 新建库与旧库升级得到相同结构
+    statements = (
+        "CREATE INDEX IF NOT EXISTS ix_valuable_projects_region_discovered "
+        "ON valuable_projects (region_code, discovered_at)",
+        "CREATE INDEX IF NOT EXISTS ix_valuable_projects_status_region "
+        "ON valuable_projects (parsed_pdf, is_invalid, region_code)",
+        "CREATE INDEX IF NOT EXISTS ix_valuable_projects_discovered_at "
+        "ON valuable_projects (discovered_at)",
+        "CREATE INDEX IF NOT EXISTS ix_crawl_runs_started_at ON crawl_runs (started_at)",
+    )
+    for sql in statements:
+        session.execute(text(sql))
+
+
+_PROJECT_COUNT_DELTAS = {
+    "all_count": "1",
+    "parsed_count": "({row}.parsed_pdf != 0)",
+    "unparsed_count": "({row}.parsed_pdf = 0 AND {row}.is_invalid = 0)",
+    "invalid_count": "({row}.is_invalid != 0)",
+}
+
+
+def _count_upsert(row: str) -> str:
+    columns = ", ".join(_PROJECT_COUNT_DELTAS)
+    values = ", ".join(expr.format(row=row) for expr in _PROJECT_COUNT_DELTAS.values())
+    updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in _PROJECT_COUNT_DELTAS)
+    return (
+        f"INSERT INTO project_region_counts (region_code, {columns}) VALUES ({row}.region_code, {values}) "
+        f"ON CONFLICT(region_code) DO UPDATE SET {updates};"
+    )
+
+
+def _count_decrement(row: str) -> str:
+    updates = ", ".join(f"{col} = {col} - {expr.format(row=row)}" for col, expr in _PROJECT_COUNT_DELTAS.items())
+    return f"UPDATE project_region_counts SET {updates} WHERE region_code = {row}.region_code;"
+
+
+def _m003_project_region_counts(session: Session) -> None:
+    session.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS project_region_counts ("
+            "region_code VARCHAR(20) NOT NULL PRIMARY KEY, "
+            "all_count INTEGER NOT NULL DEFAULT 0, "
+            "parsed_count INTEGER NOT NULL DEFAULT 0, "
+            "unparsed_count INTEGER NOT NULL DEFAULT 0, "
+            "invalid_count INTEGER NOT NULL DEFAULT 0)"
+        )
+    )
+    triggers = (
+        "CREATE TRIGGER IF NOT EXISTS trg_valuable_projects_counts_insert AFTER INSERT ON valuable_projects "
+        f"BEGIN {_count_upsert('NEW')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_valuable_projects_counts_delete AFTER DELETE ON valuable_projects "
+        f"BEGIN {_count_decrement('OLD')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_valuable_projects_counts_update "
+        "AFTER UPDATE OF region_code, parsed_pdf, is_invalid ON valuable_projects "
+        f"BEGIN {_count_decrement('OLD')} {_count_upsert('NEW')} END",
+    )
+    for sql in triggers:
+        session.execute(text(sql))
+    rebuild_project_region_counts(session)
+
+
+def rebuild_project_region_counts(session: Session) -> None:
+    """Recompute project_region_counts from valuable_projects in one grouped pass."""
+    session.execute(text("DELETE FROM project_region_counts"))
+    session.execute(
+        text(
+            "INSERT INTO project_region_counts "
+            "(region_code, all_count, parsed_count, unparsed_count, invalid_count) "
+            "SELECT region_code, count(*), "
+            "sum(parsed_pdf != 0), sum(parsed_pdf = 0 AND is_invalid = 0), sum(is_invalid != 0) "
+            "FROM valuable_projects GROUP BY region_code"
+        )
+    )
+
+
+def _m004_keyset_indexes(session: Session) -> None:
+    # 列表按 (discovered_at, projectuuid) 排序与游标分页，索引需带上 projectuuid
+    statements = (
+        "DROP INDEX IF EXISTS ix_valuable_projects_region_discovered",
+        "CREATE INDEX ix_valuable_projects_region_discovered "
+        "ON valuable_projects (region_code, discovered_at, projectuuid)",
+        "DROP INDEX IF EXISTS ix_valuable_projects_discovered_at",
+        "CREATE INDEX ix_valuable_projects_discovered_at ON valuable_projects (discovered_at, projectuuid)",
+    )
+    for sql in statements:
+        session.execute(text(sql))
+
+
+def _m005_project_extract_fields(session: Session) -> None:
+    from .models import ProjectExtractFields
+    from .services.extract_fields import upsert_extract_json
+
+    ProjectExtractFields.__table__.create(bind=session.connection(), checkfirst=True)
+    session.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS trg_valuable_projects_extract_fields_delete "
+            "AFTER DELETE ON valuable_projects "
+            "BEGIN DELETE FROM project_extract_fields WHERE projectuuid = OLD.projectuuid; END"
+        )
+    )
+    # 分批回填已解析项目，避免一次性读入全部 JSON
+    last_uuid = ""
+    while True:
+        rows = session.execute(
+            text(
+                "SELECT projectuuid, pdf_extract_json FROM valuable_projects "
+                "WHERE pdf_extract_json IS NOT NULL AND projectuuid > :last "
+                "ORDER BY projectuuid LIMIT 500"
+            ),
+            {"last": last_uuid},
+        ).fetchall()
+        if not rows:
+            break
+        for projectuuid, raw_json in rows:
+            upsert_extract_json(session, projectuuid, raw_json)
+        last_uuid = rows[-1][0]
+
+
+def _m006_project_search(session: Session) -> None:
+    from .models import ProjectSearchDoc
+    from .services.search_index import CREATE_SEARCH_TABLE_SQL, index_project_json
+
+    ProjectSearchDoc.__table__.create(bind=session.connection(), checkfirst=True)
+    session.execute(text(CREATE_SEARCH_TABLE_SQL))
+    session.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS trg_valuable_projects_search_delete "
+            "AFTER DELETE ON valuable_projects BEGIN "
+            "DELETE FROM project_search WHERE rowid = "
+            "(SELECT docid FROM project_search_docs WHERE projectuuid = OLD.projectuuid); "
+            "DELETE FROM project_search_docs WHERE projectuuid = OLD.projectuuid; "
+            "END"
+        )
+    )
+    last_uuid = ""
+    while True:
+        rows = session.execute(
+            text(
+                "SELECT projectuuid, project_name, pdf_extract_json FROM valuable_projects "
+                "WHERE projectuuid > :last ORDER BY projectuuid LIMIT 500"
+            ),
+            {"last": last_uuid},
+        ).fetchall()
+        if not rows:
+            break
+        for projectuuid, project_name, raw_json in rows:
+            index_project_json(session, projectuuid, project_name, raw_json)
+        last_uuid = rows[-1][0]
+
+
+def _m007_table_versions(session: Session) -> None:
+    session.execute(
+        text(
+            "CREATE TABLE IF NOT EXISTS table_versions ("
+            "name VARCHAR(64) NOT NULL PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)"
+        )
+    )
+    session.execute(text("INSERT OR IGNORE INTO table_versions (name, version) VALUES ('valuable_projects', 0)"))
+    bump = "UPDATE table_versions SET version = version + 1 WHERE name = 'valuable_projects';"
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        session.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_valuable_projects_version_{event.lower()} "
+                f"AFTER {event} ON valuable_projects BEGIN {bump} END"
+            )
+        )
+
+
+def _m008_project_pdf_sha256(session: Session) -> None:
+    if not _column_exists(session, "valuable_projects", "pdf_sha256"):
+        session.execute(text("ALTER TABLE valuable_projects ADD COLUMN pdf_sha256 VARCHAR(64) NULL"))
+    session.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_valuable_projects_pdf_sha256 ON valuable_projects (pdf_sha256)")
+    )
+
+
+def _m009_pdf_extract_cache(session: Session) -> None:
+    from .models import PdfExtractCache
+
+    PdfExtractCache.__table__.create(bind=session.connection(), checkfirst=True)
+
+
+def _m010_parse_sessions(session: Session) -> None:
+    from .models import ParseSessionRecord
+
+    ParseSessionRecord.__table__.create(bind=session.connection(), checkfirst=True)
+
+
+def _m011_parse_leases(session: Session) -> None:
+    from .models import ParseLease
+
+    ParseLease.__table__.create(bind=session.connection(), checkfirst=True)
+
+
+def _rollup_targets(region: str) -> str:
+    # 项目所在地区本身及其上级（市）各一行
+    return (
+        f"SELECT ({region}) AS code UNION ALL "
+        f"SELECT parent_code FROM region_parents WHERE region_code = ({region})"
+    )
+
+
+def _rollup_count_delta(row: str, sign: str) -> str:
+    columns = ", ".join(_PROJECT_COUNT_DELTAS)
+    values = ", ".join(f"{sign}{expr.format(row=row)}" for expr in _PROJECT_COUNT_DELTAS.values())
+    updates = ", ".join(f"{col} = {col} + excluded.{col}" for col in _PROJECT_COUNT_DELTAS)
+    return (
+        f"INSERT INTO region_rollups (region_code, {columns}) "
+        f"SELECT code, {values} FROM ({_rollup_targets(f'{row}.region_code')}) WHERE code IS NOT NULL "
+        f"ON CONFLICT(region_code) DO UPDATE SET {updates};"
+    )
+
+
+def _rollup_investment_delta(region: str, amount: str) -> str:
+    return (
+        "INSERT INTO region_rollups (region_code, total_investment) "
+        f"SELECT t.code, d.amount FROM ({_rollup_targets(region)}) AS t, (SELECT ({amount}) AS amount) AS d "
+        "WHERE t.code IS NOT NULL AND d.amount IS NOT NULL AND d.amount != 0 "
+        "ON CONFLICT(region_code) DO UPDATE SET total_investment = total_investment + excluded.total_investment;"
+    )
+
+
+def _m012_region_rollups(session: Session) -> None:
+    from .models import RegionParent, RegionRollup
+    from .services.region_index import RegionIndex
+    from .services.region_rollups import sync_region_parents
+
+    RegionParent.__table__.create(bind=session.connection(), checkfirst=True)
+    RegionRollup.__table__.create(bind=session.connection(), checkfirst=True)
+
+    project_region = "(SELECT region_code FROM valuable_projects WHERE projectuuid = {row}.projectuuid)"
+    stored_investment = "(SELECT total_investment FROM project_extract_fields WHERE projectuuid = {row}.projectuuid)"
+    triggers = (
+        "CREATE TRIGGER IF NOT EXISTS trg_region_rollups_project_insert AFTER INSERT ON valuable_projects "
+        f"BEGIN {_rollup_count_delta('NEW', '')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_region_rollups_project_delete AFTER DELETE ON valuable_projects "
+        f"BEGIN {_rollup_count_delta('OLD', '-')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_region_rollups_project_update "
+        "AFTER UPDATE OF region_code, parsed_pdf, is_invalid ON valuable_projects "
+        f"BEGIN {_rollup_count_delta('OLD', '-')} {_rollup_count_delta('NEW', '')} END",
+        # 项目换地区时，其投资额随之转移
+        "CREATE TRIGGER IF NOT EXISTS trg_region_rollups_project_move "
+        "AFTER UPDATE OF region_code ON valuable_projects WHEN OLD.region_code IS NOT NEW.region_code BEGIN "
+        f"{_rollup_investment_delta('OLD.region_code', '-' + stored_investment.format(row='NEW'))} "
+        f"{_rollup_investment_delta('NEW.region_code', stored_investment.format(row='NEW'))} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_region_rollups_fields_insert AFTER INSERT ON project_extract_fields "
+        f"BEGIN {_rollup_investment_delta(project_region.format(row='NEW'), 'NEW.total_investment')} END",
+        "CREATE TRIGGER IF NOT EXISTS trg_region_rollups_fields_update "
+        "AFTER UPDATE OF total_investment ON project_extract_fields BEGIN "
+        f"{_rollup_investment_delta(project_region.format(row='NEW'), 'coalesce(NEW.total_investment, 0) - coalesce(OLD.total_investment, 0)')} END",
+        # 项目被删除时 valuable_projects 中已无该行，这里自然不生效；由下面的级联触发器扣减
+        "CREATE TRIGGER IF NOT EXISTS trg_region_rollups_fields_delete AFTER DELETE ON project_extract_fields "
+        f"BEGIN {_rollup_investment_delta(project_region.format(row='OLD'), '-OLD.total_investment')} END",
+    )
+    for sql in triggers:
+        session.execute(text(sql))
+    # 级联删除 project_extract_fields 的触发器先扣减投资额再删除，避免依赖触发器执行顺序
+    session.execute(text("DROP TRIGGER IF EXISTS trg_valuable_projects_extract_fields_delete"))
+    session.execute(
+        text(
+            "CREATE TRIGGER trg_valuable_projects_extract_fields_delete AFTER DELETE ON valuable_projects BEGIN "
+            f"{_rollup_investment_delta('OLD.region_code', '-' + stored_investment.format(row='OLD'))} "
+            "DELETE FROM project_extract_fields WHERE projectuuid = OLD.projectuuid; END"
+        )
+    )
+    # 不经过 region_index 的重载钩子：它在另一个连接上写库，会与本事务争锁。
+    # 文件此时不存在也无妨，之后加载时由钩子同步
+    snapshot = RegionIndex().snapshot()
+    if snapshot is not None:
+        sync_region_parents(session, snapshot, rebuild=False)
+    rebuild_region_rollups(session)
+
+
+def rebuild_region_rollups(session: Session) -> None:
+    """Recompute region_rollups from valuable_projects, project_extract_fields and region_parents."""
+    session.execute(text("DELETE FROM region_rollups"))
+    session.execute(
+        text(
+            "INSERT INTO region_rollups "
+            "(region_code, all_count, parsed_count, unparsed_count, invalid_count, total_investment) "
+            "SELECT code, count(*), sum(parsed_pdf != 0), sum(parsed_pdf = 0 AND is_invalid = 0), "
+            "sum(is_invalid != 0), coalesce(sum(total_investment), 0) FROM ("
+            "SELECT p.region_code AS code, p.parsed_pdf, p.is_invalid, f.total_investment "
+            "FROM valuable_projects AS p LEFT JOIN project_extract_fields AS f ON f.projectuuid = p.projectuuid "
+            "UNION ALL "
+            "SELECT r.parent_code, p.parsed_pdf, p.is_invalid, f.total_investment "
+            "FROM valuable_projects AS p JOIN region_parents AS r ON r.region_code = p.region_code "
+            "LEFT JOIN project_extract_fields AS f ON f.projectuuid = p.projectuuid"
+            ") GROUP BY code"
+        )
+    )
+
+
+def _m013_user_token_version(session: Session) -> None:
+    if not _column_exists(session, "users", "token_version"):
+        session.execute(text("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _m014_crawl_tasks(session: Session) -> None:
+    from .models import CrawlTask
+
+    CrawlTask.__table__.create(bind=session.connection(), checkfirst=True)
+
+
+def _m015_project_documents(session: Session) -> None:
+    from .models import ProjectDocument
+
+    ProjectDocument.__table__.create(bind=session.connection(), checkfirst=True)
+    session.execute(
+        text(
+            "INSERT OR IGNORE INTO project_documents (projectuuid, position, pdf_sha256) "
+            "SELECT projectuuid, 0, pdf_sha256 FROM valuable_projects WHERE pdf_sha256 IS NOT NULL"
+        )
+    )
+    session.execute(
+        text(
+            "CREATE TRIGGER IF NOT EXISTS trg_valuable_projects_documents_delete AFTER DELETE ON valuable_projects "
+            "BEGIN DELETE FROM project_documents WHERE projectuuid = OLD.projectuuid; END"
+        )
+    )
+
+
+def _m016_parse_queues(session: Session) -> None:
+    from .models import ParseQueueItem, ParseQueueRecord
+
+    ParseQueueRecord.__table__.create(bind=session.connection(), checkfirst=True)
+    ParseQueueItem.__table__.create(bind=session.connection(), checkfirst=True)
+
+
+def _m017_export_jobs(session: Session) -> None:
+    from .models import ExportJobRecord
+
+    ExportJobRecord.__table__.create(bind=session.connection(), checkfirst=True)
+
+
+def _m018_users_version(session: Session) -> None:
+    session.execute(text("INSERT OR IGNORE INTO table_versions (name, version) VALUES ('users', 0)"))
+    bump = "UPDATE table_versions SET version = version + 1 WHERE name = 'users';"
+    for event in ("UPDATE", "DELETE"):
+        session.execute(
+            text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_users_version_{event.lower()} "
+                f"AFTER {event} ON users BEGIN {bump} END"
+            )
+        )
+
+
+def _m019_reextract_jobs(session: Session) -> None:
+    from .models import ReextractJobRecord
+
+    ReextractJobRecord.__table__.create(bind=session.connection(), checkfirst=True)
+
+
+def _m020_pdf_extract_cache_tier(session: Session) -> None:
+    if not _column_exists(session, "pdf_extract_cache", "tier"):
+        session.execute(text("ALTER TABLE pdf_extract_cache ADD COLUMN tier VARCHAR(10)"))
+
+
+def _m021_drop_project_region_counts(session: Session) -> None:
+    # 计数改由 region_rollups 提供（区县行即本地区计数），不再维护两套触发器
+    for event in ("insert", "update", "delete"):
+        session.execute(text(f"DROP TRIGGER IF EXISTS trg_valuable_projects_counts_{event}"))
+    session.execute(text("DROP TABLE IF EXISTS project_region_counts"))
+
+
+# (version, description, migrate)。只能追加，不要修改或重排已发布的条目。
+MIGRATIONS: List[Tuple[int, str, Callable[[Session], None]]] = [
+    (1, "valuable_projects parse status columns", _m001_project_status_columns),
+    (2, "indexes for project list/count/delete queries", _m002_project_query_indexes),
+    (3, "trigger-maintained per-region project counters", _m003_project_region_counts),
+    (4, "keyset pagination indexes on (discovered_at, projectuuid)", _m004_keyset_indexes),
+    (5, "typed project_extract_fields side table with backfill", _m005_project_extract_fields),
+    (6, "FTS5 project search index with backfill", _m006_project_search),
+    (7, "trigger-maintained data version stamp for valuable_projects", _m007_table_versions),
+    (8, "valuable_projects.pdf_sha256 key into the PDF store", _m008_project_pdf_sha256),
+    (9, "extraction result cache keyed by document hash and extractor version", _m009_pdf_extract_cache),
+    (10, "parse_sessions shared across API workers", _m010_parse_sessions),
+    (11, "parse_leases for the multi-operator parse work queue", _m011_parse_leases),
+    (12, "trigger-maintained city/district rollups of project counts and investment", _m012_region_rollups),
+    (13, "users.token_version for revoking issued tokens", _m013_user_token_version),
+    (14, "crawl_tasks queue shared by the API and crawler workers", _m014_crawl_tasks),
+    (15, "project_documents: every stored PDF merged into a project", _m015_project_documents),
+    (16, "parse queues shared across API workers", _m016_parse_queues),
+    (17, "export_jobs shared across API workers", _m017_export_jobs),
+    (18, "trigger-maintained change stamp for users, checked by the auth cache", _m018_users_version),
+    (19, "reextract_jobs shared across API workers", _m019_reextract_jobs),
+    (20, "pdf_extract_cache.tier: extractor tier that produced each result", _m020_pdf_extract_cache_tier),
+    (21, "drop project_region_counts; counts are read from region_rollups", _m021_drop_project_region_counts),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def ensure_migrations(session: Session) -> None:
+    """Versioned, idempotent migrations for SQLite.
+
+    The applied version is tracked in ``PRAGMA user_version``; every migration newer than
+    it runs in order and bumps the version in the same transaction, without requiring Alembic.
+    """
+    current = get_schema_version(session)
+    for version, _description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        migrate(session)
+        _set_schema_version(session, version)
+        session.commit()
+        current = version
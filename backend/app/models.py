@@ -4,7 +4,7 @@ import json
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy import Column, Date, DateTime, Float, Index, Integer, String, Text
 from sqlalchemy.types import Boolean
 
 from .db import Base
@@ -21,8 +21,228 @@ class ValuableProject(Base):
     parsed_at = Column(DateTime, nullable=True)
     pdf_extract_json = Column(Text, nullable=True)
     pdf_file_path = Column(Text, nullable=True)
+    # 原始 PDF 在内容寻址存储中的键（仅在启用 PDF_STORE 时写入）
+    pdf_sha256 = Column(String(64), nullable=True, index=True)
     is_invalid = Column(Boolean, default=False, nullable=False)
 
+    __table_args__ = (
+        Index("ix_valuable_projects_region_discovered", "region_code", "discovered_at", "projectuuid"),
+        Index("ix_valuable_projects_status_region", "parsed_pdf", "is_invalid", "region_code"),
+        Index("ix_valuable_projects_discovered_at", "discovered_at", "projectuuid"),
+    )
+
+
+class ProjectExtractFields(Base):
+    """Typed copy of ``ValuableProject.pdf_extract_json``; amounts in 万元, dates parsed."""
+
+    __tablename__ = "project_extract_fields"
+
+    projectuuid = Column(String(64), primary_key=True)
+    project_type = Column(String(100), nullable=True, index=True)
+    construction_nature = Column(String(50), nullable=True)
+    planned_start_date = Column(Date, nullable=True, index=True)
+    planned_end_date = Column(Date, nullable=True)
+    total_investment = Column(Float, nullable=True, index=True)
+    fixed_investment = Column(Float, nullable=True)
+    civil_works = Column(Float, nullable=True)
+    equipment_purchase = Column(Float, nullable=True)
+    installation = Column(Float, nullable=True)
+    other_construction_costs = Column(Float, nullable=True)
+    reserve_funds = Column(Float, nullable=True)
+    construction_interest = Column(Float, nullable=True)
+    working_capital = Column(Float, nullable=True)
+    fiscal_funds = Column(Float, nullable=True)
+    own_funds = Column(Float, nullable=True)
+    bank_loans = Column(Float, nullable=True)
+    other_funds = Column(Float, nullable=True)
+    company_name = Column(String(255), nullable=True)
+    established_date = Column(Date, nullable=True)
+    legal_representative = Column(String(100), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ProjectDocument(Base):
+    """Every stored PDF a project's fields were merged from, in merge order.
+
+    ``ValuableProject.pdf_sha256`` keeps the first one; re-extraction re-merges all of them.
+    """
+
+    __tablename__ = "project_documents"
+
+    projectuuid = Column(String(64), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    pdf_sha256 = Column(String(64), nullable=False)
+
+
+class ProjectSearchDoc(Base):
+    """Stable integer rowid for each project in the ``project_search`` FTS5 table."""
+
+    __tablename__ = "project_search_docs"
+
+    docid = Column(Integer, primary_key=True, autoincrement=True)
+    projectuuid = Column(String(64), unique=True, nullable=False)
+
+
+class RegionParent(Base):
+    """District → city links from the region tree, used by the rollup triggers."""
+
+    __tablename__ = "region_parents"
+
+    region_code = Column(String(20), primary_key=True)
+    parent_code = Column(String(20), nullable=False, index=True)
+
+
+class RegionRollup(Base):
+    """Per-region project statistics including all descendants (a city row covers its
+    districts), maintained by SQLite triggers on ``valuable_projects`` and
+    ``project_extract_fields``. Investment is summed in 万元. The triggers insert partial
+    rows, hence the server-side defaults. Also the source of /api/projects/counts."""
+
+    __tablename__ = "region_rollups"
+
+    region_code = Column(String(20), primary_key=True)
+    all_count = Column(Integer, default=0, server_default="0", nullable=False)
+    parsed_count = Column(Integer, default=0, server_default="0", nullable=False)
+    unparsed_count = Column(Integer, default=0, server_default="0", nullable=False)
+    invalid_count = Column(Integer, default=0, server_default="0", nullable=False)
+    total_investment = Column(Float, default=0.0, server_default="0", nullable=False)
+
+
+class TableVersion(Base):
+    """Monotonic change counter per table, bumped by SQLite triggers on every row change."""
+
+    __tablename__ = "table_versions"
+
+    name = Column(String(64), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+
+
+class PdfExtractCache(Base):
+    """Memoized ``extract_from_pdf`` output per document hash and extractor version."""
+
+    __tablename__ = "pdf_extract_cache"
+
+    sha256 = Column(String(64), primary_key=True)
+    extractor_version = Column(Integer, primary_key=True)
+    result_json = Column(Text, nullable=False)
+    # 产生该结果的解析层级（text/table），用于统计文本层的命中率；升级前的旧记录为空
+    tier = Column(String(10), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ParseSessionRecord(Base):
+    """Captcha/download session shared by every API worker process; see ParseSessionManager."""
+
+    __tablename__ = "parse_sessions"
+
+    id = Column(String(36), primary_key=True)
+    projectuuid = Column(String(64), nullable=False)
+    sendid = Column(String(64), nullable=False)
+    cookies = Column(Text, nullable=False, default="")
+    referer = Column(Text, nullable=False, default="")
+    verified_captcha_code = Column(String(32), nullable=True)
+    downloaded_files_json = Column(Text, nullable=False, default="[]")
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+class ParseLease(Base):
+    """Time-limited claim on an unparsed project so concurrent operators never pick the same one."""
+
+    __tablename__ = "parse_leases"
+
+    projectuuid = Column(String(64), primary_key=True)
+    holder = Column(String(100), nullable=False)
+    leased_at = Column(Float, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)
+
+
+class ParseQueueRecord(Base):
+    """An operator's parse queue settings; see ParseQueueManager."""
+
+    __tablename__ = "parse_queues"
+
+    user_id = Column(Integer, primary_key=True)
+    holder = Column(String(100), nullable=False)
+    regions_json = Column(Text, nullable=False, default="[]")
+    depth = Column(Integer, nullable=False)
+    created_at = Column(Float, nullable=False)
+
+    def region_codes(self) -> List[str]:
+        return json.loads(self.regions_json)
+
+
+class ParseQueueItem(Base):
+    """One project in an operator's parse queue, visible to every API worker process.
+
+    ``updated_at`` is refreshed on every state change; a prefetching or processing entry
+    left untouched for too long belongs to a process that died and is picked up again.
+    """
+
+    __tablename__ = "parse_queue_entries"
+    __table_args__ = (Index("ix_parse_queue_entries_user_state", "user_id", "state"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entry_id = Column(String(36), nullable=False, unique=True)
+    user_id = Column(Integer, nullable=False)
+    projectuuid = Column(String(64), nullable=False)
+    project_name = Column(String(255), nullable=False, default="")
+    state = Column(String(20), nullable=False, default="prefetching")
+    parse_session_id = Column(String(36), nullable=True)
+    sendid = Column(String(64), nullable=True)
+    url = Column(Text, nullable=True)
+    captcha_image = Column(Text, nullable=True)
+    fields_json = Column(Text, nullable=True)
+    message = Column(Text, nullable=True)
+    prepared_at = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(Float, nullable=False)
+
+
+class ExportJobRecord(Base):
+    """Background export, keyed on its cache key so every API worker process finds the same job."""
+
+    __tablename__ = "export_jobs"
+
+    id = Column(String(32), primary_key=True)
+    format = Column(String(10), nullable=False)
+    regions_json = Column(Text, nullable=False, default="[]")
+    status = Column(String(20), nullable=False, default="pending")
+    rows_written = Column(Integer, nullable=False, default=0)
+    total_rows = Column(Integer, nullable=True)
+    cached = Column(Boolean, nullable=False, default=False)
+    message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True, index=True)
+    # 生成过程中随进度刷新；长时间不动说明生成它的进程已退出
+    updated_at = Column(Float, nullable=False)
+
+    def region_codes(self) -> List[str]:
+        return json.loads(self.regions_json)
+
+
+class ReextractJobRecord(Base):
+    """Offline re-extraction job, shared by every API worker process; at most one is active."""
+
+    __tablename__ = "reextract_jobs"
+
+    id = Column(String(36), primary_key=True)
+    regions_json = Column(Text, nullable=False, default="[]")
+    status = Column(String(20), nullable=False, default="pending", index=True)
+    total = Column(Integer, nullable=True)
+    processed = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    missing = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True, index=True)
+    # 每批提交时刷新；长时间不动说明运行它的进程已退出
+    updated_at = Column(Float, nullable=False)
+
+    def region_codes(self) -> List[str]:
+        return json.loads(self.regions_json)
+
 
 class CrawlProgress(Base):
     __tablename__ = "crawl_progress"
@@ -40,7 +260,37 @@ class CrawlRun(Base):
     regions_json = Column(Text, nullable=False)
     total_items = Column(Integer, default=0, nullable=False)
     valuable_projects = Column(Integer, default=0, nullable=False)
-    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    def region_codes(self) -> List[str]:
+        return json.loads(self.regions_json)
+
+
+class CrawlTask(Base):
+    """Queued crawl request; the API enqueues, a crawler worker claims and reports progress.
+
+    A running task is leased to one worker until ``lease_expires_at``; the worker renews the
+    lease with every progress heartbeat, so a task whose worker died can be detected and failed.
+    """
+
+    __tablename__ = "crawl_tasks"
+    __table_args__ = (Index("ix_crawl_tasks_status_created", "status", "created_at"),)
+
+    id = Column(String(36), primary_key=True)
+    status = Column(String(20), nullable=False, default="pending")
+    mode = Column(String(20), nullable=False)
+    regions_json = Column(Text, nullable=False)
+    exclude_keywords = Column(Text, nullable=False, default="")
+    message = Column(Text, nullable=True)
+    run_id = Column(String(36), nullable=True)
+    worker = Column(String(100), nullable=True)
+    lease_expires_at = Column(Float, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    total_items = Column(Integer, nullable=False, default=0)
+    valuable_projects = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
     finished_at = Column(DateTime, nullable=True)
 
     def region_codes(self) -> List[str]:
@@ -56,3 +306,5 @@ class User(Base):
     role = Column(String(20), nullable=False, default="user")
     is_active = Column(Boolean, nullable=False, default=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # 写入 JWT 的 ver 声明；重置/修改密码时递增，使已签发的令牌失效
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
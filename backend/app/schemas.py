@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import List, Literal, Optional
+from datetime import date, datetime
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -38,6 +38,9 @@ class TaskStatus(BaseModel):
     regions: Optional[List[str]] = None
     started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
+    # Progress reported by the crawler worker while the task runs
+    total_items: int = 0
+    valuable_projects: int = 0
 
 
 class ProjectItem(BaseModel):
@@ -47,13 +50,25 @@ class ProjectItem(BaseModel):
     discovered_at: datetime
     parsed_pdf: bool | None = None
     is_invalid: bool | None = None
+    # Only populated when filtering or sorting by extracted PDF fields
+    project_type: str | None = None
+    total_investment: float | None = None
+    planned_start_date: date | None = None
 
 
 class PaginatedProjects(BaseModel):
     items: List[ProjectItem]
-    total: int
+    # None when the caller passed with_total=false
+    total: Optional[int] = None
     page: int
     size: int
+    # Whether an adjacent page exists, in both offset and cursor mode
+    has_next: bool = False
+    has_prev: bool = False
+    # Opaque keyset cursors; pass back as ?cursor= to fetch the adjacent page
+    # (only for the default newest-first order without q)
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 
 class ProjectCounts(BaseModel):
@@ -63,6 +78,38 @@ class ProjectCounts(BaseModel):
     invalid: int
 
 
+class RegionRollupNode(BaseModel):
+    id: str
+    name: str
+    all: int = 0
+    parsed: int = 0
+    unparsed: int = 0
+    invalid: int = 0
+    # 已解析项目的总投资合计（万元），含下级地区
+    total_investment: float = 0.0
+    children: List["RegionRollupNode"] = Field(default_factory=list)
+
+
+class ExportJobRequest(BaseModel):
+    format: Literal["xlsx", "csv", "ndjson"] = "xlsx"
+    regions: List[str] = Field(default_factory=list)
+
+
+class ExportJobStatus(BaseModel):
+    job_id: str
+    status: Literal["pending", "running", "succeeded", "failed"]
+    format: str
+    regions: List[str]
+    rows_written: int = 0
+    total_rows: Optional[int] = None
+    # True when the artifact was served from the export cache without regenerating
+    cached: bool = False
+    size_bytes: Optional[int] = None
+    message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
 class CrawlRunItem(BaseModel):
     id: str
     mode: str
@@ -148,6 +195,104 @@ class ParseDownloadResponse(BaseModel):
     ok: bool
     saved_path: str | None = None
     parsed_fields: dict | None = None
+    # Extractor tier that produced parsed_fields: "text" or "table"
+    extract_tier: str | None = None
+
+
+class ParseDownloadAllRequest(BaseModel):
+    parse_session_id: str
+    projectuuid: str
+    flag: str = "1"
+
+
+class ParseDocumentResult(BaseModel):
+    sendid: str
+    item_name: str
+    url: str | None = None
+    ok: bool
+    parsed_fields: dict | None = None
+    extract_tier: str | None = None
+    message: str | None = None
+
+
+class ParseDownloadAllResponse(BaseModel):
+    # True when at least one document was parsed
+    ok: bool
+    # Field-wise merge of all parsed documents
+    parsed_fields: dict | None = None
+    documents: List[ParseDocumentResult] = Field(default_factory=list)
+
+
+class ExtractionTierStats(BaseModel):
+    extractor_version: int
+    # Documents per extractor tier among the cached results of this extractor version
+    documents: Dict[str, int] = Field(default_factory=dict)
+
+
+class ParseQueueStartRequest(BaseModel):
+    # Empty means all regions
+    regions: List[str] = Field(default_factory=list)
+    # How many projects to keep prepared ahead; defaults to GOV_STATS_PARSE_QUEUE_DEPTH
+    depth: Optional[int] = Field(default=None, ge=1, le=10)
+
+
+class ParseQueueVerifyRequest(BaseModel):
+    code: str
+
+
+class ParseQueueEntry(BaseModel):
+    entry_id: str
+    projectuuid: str
+    project_name: str
+    # prefetching -> ready (captcha waiting) -> processing (download + extract) -> succeeded / failed
+    state: Literal["prefetching", "ready", "processing", "succeeded", "failed"]
+    captcha_image_base64: Optional[str] = None
+    parsed_fields: Optional[dict] = None
+    message: Optional[str] = None
+
+
+class ParseQueueStatus(BaseModel):
+    depth: int
+    regions: List[str]
+    entries: List[ParseQueueEntry]
+
+
+class ParseNextRequest(BaseModel):
+    # Empty means all regions
+    regions: List[str] = Field(default_factory=list)
+    count: int = Field(default=1, ge=1, le=10)
+
+
+class ParseLeaseItem(BaseModel):
+    projectuuid: str
+    project_name: str
+    region_code: str
+    lease_expires_at: datetime
+
+
+class ParseNextResponse(BaseModel):
+    # Empty when every matching unparsed project is parsed or leased by someone else
+    items: List[ParseLeaseItem] = Field(default_factory=list)
+
+
+class ReextractJobRequest(BaseModel):
+    # Empty means every project with a stored PDF
+    regions: List[str] = Field(default_factory=list)
+
+
+class ReextractJobStatus(BaseModel):
+    job_id: str
+    status: Literal["pending", "running", "succeeded", "failed"]
+    regions: List[str]
+    total: Optional[int] = None
+    processed: int = 0
+    updated: int = 0
+    # Projects whose PDF is no longer in the store (evicted)
+    missing: int = 0
+    failed: int = 0
+    message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
 
 class LoginRequest(BaseModel):
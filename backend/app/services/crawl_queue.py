@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from ..config import CRAWL_TASK_LEASE_TTL_SEC
+from ..models import CrawlTask
+from ..schemas import TaskStatus
+
+OPEN_STATUSES = ("pending", "running")
+
+
+@dataclass(frozen=True)
+class ClaimedTask:
+    task_id: str
+    run_id: str
+    mode: str
+    regions: List[str]
+    exclude_keywords: str
+
+
+def to_status(task: CrawlTask) -> TaskStatus:
+    return TaskStatus(
+        task_id=task.id,
+        status=task.status,
+        message=task.message,
+        run_id=task.run_id,
+        mode=task.mode,
+        regions=task.region_codes(),
+        started_at=task.started_at,
+        finished_at=task.finished_at,
+        total_items=task.total_items,
+        valuable_projects=task.valuable_projects,
+    )
+
+
+def enqueue_task(session: Session, mode: str, regions: Sequence[str], exclude_keywords: str = "") -> str:
+    """Queue a crawl for the next free worker; caller commits."""
+    task_id = str(uuid.uuid4())
+    session.add(
+        CrawlTask(
+            id=task_id,
+            status="pending",
+            mode=mode,
+            regions_json=json.dumps(list(regions)),
+            exclude_keywords=exclude_keywords,
+            created_at=datetime.utcnow(),
+        )
+    )
+    return task_id
+
+
+def expire_tasks(session: Session, now: Optional[float] = None) -> int:
+    """Fail running tasks whose worker stopped renewing the lease; caller commits."""
+    now = time.time() if now is None else now
+    result = session.execute(
+        update(CrawlTask)
+        .where(CrawlTask.status == "running", CrawlTask.lease_expires_at <= now)
+        .values(status="failed", message="爬虫进程失联，任务中断", worker=None, finished_at=datetime.utcnow())
+    )
+    return result.rowcount or 0
+
+
+def claim_task(session: Session, worker: str, ttl_sec: float = CRAWL_TASK_LEASE_TTL_SEC) -> Optional[ClaimedTask]:
+    """Take the oldest pending task, or None; caller commits.
+
+    Choosing and marking happen in one UPDATE ... RETURNING, so two workers polling at
+    the same moment can never start the same task. Every attempt gets a fresh run id.
+    """
+    now = time.time()
+    expire_tasks(session, now)
+    oldest = (
+        select(CrawlTask.id)
+        .where(CrawlTask.status == "pending")
+        .order_by(CrawlTask.created_at, CrawlTask.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    row = session.execute(
+        update(CrawlTask)
+        .where(CrawlTask.id == oldest, CrawlTask.status == "pending")
+        .values(
+            status="running",
+            worker=worker,
+            run_id=str(uuid.uuid4()),
+            lease_expires_at=now + ttl_sec,
+            started_at=datetime.utcnow(),
+            message=None,
+        )
+        .returning(CrawlTask.id, CrawlTask.run_id, CrawlTask.mode, CrawlTask.regions_json, CrawlTask.exclude_keywords)
+    ).first()
+    if row is None:
+        return None
+    return ClaimedTask(
+        task_id=row.id,
+        run_id=row.run_id,
+        mode=row.mode,
+        regions=json.loads(row.regions_json),
+        exclude_keywords=row.exclude_keywords or "",
+    )
+
+
+def heartbeat(
+    session: Session,
+    task_id: str,
+    worker: str,
+    total_items: int,
+    valuable_projects: int,
+    ttl_sec: float = CRAWL_TASK_LEASE_TTL_SEC,
+) -> Optional[bool]:
+    """Renew the lease and publish progress; caller commits.
+
+    Returns whether cancellation was requested, or None if the worker no longer holds the task.
+    """
+    row = session.execute(
+        update(CrawlTask)
+        .where(CrawlTask.id == task_id, CrawlTask.worker == worker, CrawlTask.status == "running")
+        .values(lease_expires_at=time.time() + ttl_sec, total_items=total_items, valuable_projects=valuable_projects)
+        .returning(CrawlTask.cancel_requested)
+    ).first()
+    return None if row is None else bool(row.cancel_requested)
+
+
+def finish_task(
+    session: Session,
+    task_id: str,
+    worker: str,
+    status: str,
+    total_items: int,
+    valuable_projects: int,
+    message: Optional[str] = None,
+) -> bool:
+    """Record the outcome of a claimed task; caller commits.
+
+    ``status="pending"`` hands the task back to the queue (the worker is shutting down).
+    Returns False if the lease had already been lost.
+    """
+    values = dict(
+        status=status,
+        message=message,
+        worker=None,
+        lease_expires_at=None,
+        total_items=total_items,
+        valuable_projects=valuable_projects,
+        finished_at=None if status == "pending" else datetime.utcnow(),
+    )
+    result = session.execute(
+        update(CrawlTask)
+        .where(CrawlTask.id == task_id, CrawlTask.worker == worker, CrawlTask.status == "running")
+        .values(**values)
+    )
+    return (result.rowcount or 0) > 0
+
+
+def request_cancel(session: Session, task_id: str) -> bool:
+    """Cancel a pending task outright, or flag a running one for its worker; caller commits.
+
+    Returns True if the task exists.
+    """
+    # 条件更新而非先读后写：任务可能恰好在此刻被爬虫进程领取
+    cancelled = session.execute(
+        update(CrawlTask)
+        .where(CrawlTask.id == task_id, CrawlTask.status == "pending")
+        .values(status="cancelled", finished_at=datetime.utcnow())
+    )
+    if cancelled.rowcount:
+        return True
+    session.execute(
+        update(CrawlTask).where(CrawlTask.id == task_id, CrawlTask.status == "running").values(cancel_requested=True)
+    )
+    return session.scalar(select(CrawlTask.id).where(CrawlTask.id == task_id)) is not None
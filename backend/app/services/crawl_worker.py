@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from ..config import (
+    CRAWL_TASK_LEASE_TTL_SEC,
+    CRAWL_WORKER_CONCURRENCY,
+    CRAWL_WORKER_POLL_SEC,
+    CRAWL_WORKER_STOP_TIMEOUT_SEC,
+)
+from ..db import SessionLocal, session_scope
+from .crawl_queue import ClaimedTask, claim_task, finish_task, heartbeat
+from .crawler_service import CrawlerService, CrawlStats
+from .logs import append_log
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _ActiveTask:
+    task: ClaimedTask
+    stats: CrawlStats = field(default_factory=CrawlStats)
+    stop: threading.Event = field(default_factory=threading.Event)
+    cancelled: bool = False
+    lost: bool = False
+    future: Optional[Future] = None
+
+
+class CrawlWorker:
+    """Runs queued crawl tasks from the crawl_tasks table.
+
+    One polling thread claims tasks up to ``concurrency`` and, on every tick, renews the
+    leases of the running ones while publishing their counters; a cancel flag set through
+    the API is picked up there and turned into the crawler's cooperative ``should_stop``.
+    Stopping the worker gives running crawls ``stop_timeout_sec`` to wind down, then hands
+    whatever is still running back to the queue before returning, so a process manager's
+    kill can never strand a task in "running".
+    """
+
+    def __init__(
+        self,
+        concurrency: int = CRAWL_WORKER_CONCURRENCY,
+        poll_sec: float = CRAWL_WORKER_POLL_SEC,
+        lease_ttl_sec: float = CRAWL_TASK_LEASE_TTL_SEC,
+        crawler: Optional[CrawlerService] = None,
+        name: Optional[str] = None,
+        stop_timeout_sec: float = CRAWL_WORKER_STOP_TIMEOUT_SEC,
+    ) -> None:
+        self.concurrency = max(1, concurrency)
+        self.poll_sec = poll_sec
+        self.lease_ttl_sec = lease_ttl_sec
+        self.stop_timeout_sec = stop_timeout_sec
+        self.crawler = crawler
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._active: Dict[str, _ActiveTask] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        """Poll in a background thread (embedded mode)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="crawl-worker", daemon=True)
+            self._thread.start()
+
+    def run(self) -> None:
+        """Poll until ``stop()``; ``python -m app.worker`` calls this on the main thread."""
+        if self.crawler is None:
+            self.crawler = CrawlerService()
+        self._runner = threading.current_thread()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="crawl-task")
+        logger.info("crawl worker %s started (concurrency %d)", self.name, self.concurrency)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.tick()
+                except Exception:
+                    logger.exception("crawl worker poll failed")
+                self._stop.wait(self.poll_sec)
+        finally:
+            self._drain()
+            # 等不及收尾的任务线程不再等待（进程随后可能被强制结束）
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            self._runner = None
+            logger.info("crawl worker %s stopped", self.name)
+
+    def tick(self) -> None:
+        """Report progress for running tasks, then claim new ones while there is capacity."""
+        with self._lock:
+            active = list(self._active.values())
+        with SessionLocal() as session:
+            for entry in active:
+                if entry.future is not None and entry.future.done():
+                    continue
+                cancel = heartbeat(
+                    session,
+                    entry.task.task_id,
+                    self.name,
+                    entry.stats.total_items,
+                    entry.stats.valuable_projects,
+                    self.lease_ttl_sec,
+                )
+                if cancel is None:
+                    entry.lost = True
+                    entry.stop.set()
+                elif cancel:
+                    entry.cancelled = True
+                    entry.stop.set()
+            session.commit()
+
+            while not self._stop.is_set() and self.active_count() < self.concurrency:
+                task = claim_task(session, self.name, self.lease_ttl_sec)
+                session.commit()
+                if task is None:
+                    break
+                self._launch(task)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop polling; returns once every task has finished or been handed back to the queue.
+
+        ``timeout`` overrides ``stop_timeout_sec`` for this call.
+        """
+        self._stop.set()
+        if timeout is not None:
+            self.stop_timeout_sec = timeout
+        runner = self._runner or self._thread
+        if runner is None or runner is threading.current_thread():
+            # 未在运行，或在 run() 所在线程上调用（如 app.worker 的信号处理）：run() 收尾时会交还任务
+            return
+        # run() 自己在 stop_timeout_sec 后交还任务，这里多留一点余量
+        runner.join(self.stop_timeout_sec + self.poll_sec + 5)
+        self._requeue_active()
+
+    def _launch(self, task: ClaimedTask) -> None:
+        entry = _ActiveTask(task=task)
+        with self._lock:
+            self._active[task.task_id] = entry
+        entry.future = self._executor.submit(self._execute, entry)
+
+    def _execute(self, entry: _ActiveTask) -> None:
+        task = entry.task
+        status, message = "succeeded", None
+        try:
+            with session_scope() as session:
+                self.crawler.run_task(
+                    session,
+                    task.mode,
+                    task.regions,
+                    run_id=task.run_id,
+                    should_stop=entry.stop.is_set,
+                    exclude_keywords=task.exclude_keywords,
+                    stats=entry.stats,
+                )
+            if entry.stop.is_set():
+                # 用户终止记为 cancelled；进程退出导致的中止放回队列，由下一个进程重新执行
+                status = "cancelled" if entry.cancelled or not self._stop.is_set() else "pending"
+        except Exception as exc:
+            append_log("ERROR", f"任务 {task.task_id} 执行失败: {exc}")
+            status, message = "failed", str(exc)
+        finally:
+            try:
+                if not entry.lost:
+                    with session_scope() as session:
+                        finish_task(
+                            session,
+                            task.task_id,
+                            self.name,
+                            status,
+                            entry.stats.total_items,
+                            entry.stats.valuable_projects,
+                            message,
+                        )
+            except Exception:
+                logger.exception("failed to record the result of crawl task %s", task.task_id)
+            with self._lock:
+                self._active.pop(task.task_id, None)
+
+    def _drain(self) -> None:
+        """Ask running crawls to stop, wait up to ``stop_timeout_sec``, then requeue the rest."""
+        with self._lock:
+            active = list(self._active.values())
+        for entry in active:
+            entry.stop.set()
+        futures = [entry.future for entry in active if entry.future is not None]
+        if futures:
+            wait_futures(futures, timeout=self.stop_timeout_sec)
+        self._requeue_active()
+
+    def _requeue_active(self) -> None:
+        with self._lock:
+            active = [entry for entry in self._active.values() if not entry.lost]
+            for entry in active:
+                # 任务线程稍后结束时不再写结果，避免覆盖已交还的状态
+                entry.lost = True
+        for entry in active:
+            try:
+                with session_scope() as session:
+                    finish_task(
+                        session,
+                        entry.task.task_id,
+                        self.name,
+                        "pending",
+                        entry.stats.total_items,
+                        entry.stats.valuable_projects,
+                    )
+                logger.warning("handed unfinished crawl task %s back to the queue", entry.task.task_id)
+            except Exception:
+                logger.exception("failed to hand crawl task %s back to the queue", entry.task.task_id)
@@ -8,6 +8,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Callable, Dict, Iterable, List, Optional
 
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from ..crawler.client import PublicAnnouncementClient
@@ -15,6 +16,8 @@ from ..crawler.models import ItemSummary, ProjectDetail
 from ..models import CrawlProgress, CrawlRun, ValuableProject
 from ..schemas import RegionNode
 from .logs import append_log
+from .region_index import region_index
+from .search_index import index_project
 
 logger = logging.getLogger(__name__)
 
@@ -31,36 +34,7 @@ class CrawlerService:
         self.client = client or PublicAnnouncementClient()
 
     def _build_region_name_map(self, region_codes: List[str]) -> Dict[str, str]:
-        from ..config import DATA_DIR
-
-        cache_file = DATA_DIR / "regions.json"
-        if not cache_file.exists():
-            return {code: code for code in region_codes}
-
-        try:
-            data = json.loads(cache_file.read_text(encoding="utf-8"))
-        except Exception:
-            return {code: code for code in region_codes}
-
-        mapping: Dict[str, str] = {}
-        parent_map: Dict[str, str] = {}
-
-        def traverse(node: dict, parent_name: Optional[str] = None) -> None:
-            node_id = node.get("id")
-            node_name = node.get("name", node_id)
-            if node_id:
-                if parent_name and parent_name != node_name:
-                    mapping[node_id] = f"{parent_name}/{node_name}"
-                else:
-                    mapping[node_id] = node_name
-                parent_map[node_id] = parent_name or ""
-            for child in node.get("children", []):
-                traverse(child, node_name)
-
-        for region in data:
-            traverse(region)
-
-        return {code: mapping.get(code, code) for code in region_codes}
+        return region_index.display_names(region_codes)
 
     def fetch_region_tree(self) -> List[RegionNode]:
         regions = self.client.get_regions()
@@ -91,7 +65,12 @@ class CrawlerService:
         run_id: Optional[str] = None,
         should_stop: Optional[Callable[[], bool]] = None,
         exclude_keywords: str = "",
+        stats: Optional[CrawlStats] = None,
     ) -> CrawlRun:
+        """Crawl the regions into a new CrawlRun.
+
+        Pass ``stats`` to watch the counters from another thread while the crawl runs.
+        """
         run_id = run_id or str(uuid.uuid4())
         crawl_run = CrawlRun(
             id=run_id,
@@ -106,7 +85,7 @@ class CrawlerService:
         region_name_map = self._build_region_name_map(region_codes)
         region_names = [region_name_map.get(code, code) for code in region_codes]
         append_log("INFO", f"任务 {run_id} 开始，模式 {mode}，地区 {','.join(region_names)}")
-        stats = CrawlStats()
+        stats = stats if stats is not None else CrawlStats()
         keywords_list = [kw.strip() for kw in exclude_keywords.split(",") if kw.strip()] if exclude_keywords else []
         if keywords_list:
             append_log("INFO", f"任务 {run_id} 过滤关键词: {', '.join(keywords_list)}")
@@ -269,8 +248,9 @@ class CrawlerService:
                 append_log("INFO", f"地区 {region_name} 项目处理被中止")
                 break
             stats.total_items += 1
-            project = session.get(ValuableProject, item.projectuuid)
-            if project:
+            # 只查主键判断是否已入库，避免加载 pdf_extract_json 等大字段
+            exists = session.scalar(select(ValuableProject.projectuuid).where(ValuableProject.projectuuid == item.projectuuid))
+            if exists:
                 stats.matched_projects += 1
                 self._update_progress(session, region_code, item.sendid)
                 empty_items_count = 0
@@ -329,6 +309,7 @@ class CrawlerService:
                         discovered_at=datetime.utcnow(),
                     )
                 )
+                index_project(session, project_uuid, detail.project_name or "")
                 stats.valuable_projects += 1
                 stats.matched_projects += 1
                 append_log("INFO", f"记录项目 {detail.project_name}")
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from ..config import EXPORT_CACHE_DIR, EXPORT_CACHE_MAX_BYTES
+from ..db import SessionLocal
+from ..models import ExportJobRecord, TableVersion
+from ..schemas import ExportJobStatus
+from .export_service import write_export
+from .logs import append_log
+from .project_counts import count_projects
+
+
+def data_version(session: Session) -> int:
+    """Current change stamp of valuable_projects (bumped by triggers on every row change)."""
+    version = session.scalar(select(TableVersion.version).where(TableVersion.name == "valuable_projects"))
+    return int(version or 0)
+
+
+@dataclass
+class ExportJob:
+    """Snapshot of an export_jobs row; ``job_id`` is the cache key of the artifact."""
+
+    job_id: str
+    fmt: str
+    regions: List[str]
+    path: Path
+    status: str = "pending"
+    rows_written: int = 0
+    total_rows: Optional[int] = None
+    cached: bool = False
+    message: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    def to_status(self) -> ExportJobStatus:
+        size = None
+        if self.status == "succeeded" and self.path.exists():
+            size = self.path.stat().st_size
+        return ExportJobStatus(
+            job_id=self.job_id,
+            status=self.status,
+            format=self.fmt,
+            regions=self.regions,
+            rows_written=self.rows_written,
+            total_rows=self.total_rows,
+            cached=self.cached,
+            size_bytes=size,
+            message=self.message,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+        )
+
+
+def export_cache_key(fmt: str, regions: List[str], version: int) -> str:
+    raw_key = json.dumps([fmt, sorted(set(regions)), version], separators=(",", ":"))
+    return hashlib.sha256(raw_key.encode("utf-8")).hexdigest()[:32]
+
+
+class ExportJobManager:
+    """Runs exports in the background and caches finished files on disk.
+
+    Artifacts are keyed on (format, regions, data version), so a repeated export of
+    unchanged data is answered from the cache without touching the database rows.
+    The key doubles as the job id of an export_jobs row, so every API worker process
+    finds the same job and an export already running anywhere is not started twice.
+    """
+
+    JOB_RETENTION_SEC = 3600
+    # 生成中的任务超过这么久没有进度，视为所在进程已退出，允许重新提交
+    STALE_JOB_SEC = 300.0
+    PROGRESS_INTERVAL_SEC = 0.5
+    # 其他进程生成的文件不计入本进程的大小估算，隔一段时间重新扫描一次校正
+    RESCAN_SEC = 300.0
+
+    def __init__(self, cache_dir: Path = EXPORT_CACHE_DIR, max_bytes: int = EXPORT_CACHE_MAX_BYTES, max_workers: int = 1) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 上次扫描得到的缓存总大小加上此后本进程生成的文件大小；None 表示尚未扫描
+        self._evict_lock = threading.Lock()
+        self._size_estimate: Optional[int] = None
+        self._scanned_at = 0.0
+
+    def _to_job(self, row: ExportJobRecord) -> ExportJob:
+        return ExportJob(
+            job_id=row.id,
+            fmt=row.format,
+            regions=row.region_codes(),
+            path=self.cache_dir / f"{row.id}.{row.format}",
+            status=row.status,
+            rows_written=row.rows_written,
+            total_rows=row.total_rows,
+            cached=row.cached,
+            message=row.message,
+            created_at=row.created_at,
+            finished_at=row.finished_at,
+        )
+
+    def submit(self, fmt: str, regions: List[str]) -> ExportJob:
+        regions = sorted(set(regions))
+        now = time.time()
+        with SessionLocal() as session:
+            cache_key = export_cache_key(fmt, regions, data_version(session))
+            path = self.cache_dir / f"{cache_key}.{fmt}"
+            self._prune_jobs(session)
+            cached = path.exists()
+            if cached:
+                # 命中缓存：刷新 mtime 作为最近使用时间，供按大小淘汰时参考
+                os.utime(path)
+            values = dict(
+                format=fmt,
+                regions_json=json.dumps(regions),
+                status="succeeded" if cached else "pending",
+                rows_written=0,
+                total_rows=None,
+                cached=cached,
+                message=None,
+                created_at=datetime.utcnow(),
+                finished_at=datetime.utcnow() if cached else None,
+                updated_at=now,
+            )
+            # 同一份导出正在某个进程中生成时沿用它；已结束或所在进程已退出的任务则重新提交
+            stmt = insert(ExportJobRecord).values(id=cache_key, **values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ExportJobRecord.id],
+                set_=values,
+                where=or_(
+                    ExportJobRecord.status.in_(("succeeded", "failed")),
+                    ExportJobRecord.updated_at < now - self.STALE_JOB_SEC,
+                ),
+            )
+            claimed = session.execute(stmt.returning(ExportJobRecord.id)).first() is not None
+            session.commit()
+            job = self._to_job(session.get(ExportJobRecord, cache_key, populate_existing=True))
+        if claimed and not cached:
+            self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with SessionLocal() as session:
+            row = session.get(ExportJobRecord, job_id)
+            return self._to_job(row) if row else None
+
+    def _update(self, job_id: str, **values) -> None:
+        values["updated_at"] = time.time()
+        with SessionLocal() as session:
+            session.execute(update(ExportJobRecord).where(ExportJobRecord.id == job_id).values(**values))
+            session.commit()
+
+    def _run(self, job: ExportJob) -> None:
+        self._update(job.job_id, status="running")
+        tmp_path = job.path.with_name(job.path.name + ".part")
+        try:
+            with SessionLocal() as session:
+                total_rows = count_projects(session, job.regions).all
+            self._update(job.job_id, total_rows=total_rows)
+            last_report = time.monotonic()
+
+            def on_row(count: int) -> None:
+                nonlocal last_report
+                # 进度写库有开销，按时间节流
+                if time.monotonic() - last_report >= self.PROGRESS_INTERVAL_SEC:
+                    last_report = time.monotonic()
+                    self._update(job.job_id, rows_written=count)
+
+            rows_written = write_export(job.fmt, tmp_path.as_posix(), job.regions, on_row=on_row)
+            os.replace(tmp_path, job.path)
+            self._update(job.job_id, status="succeeded", rows_written=rows_written, finished_at=datetime.utcnow())
+        except Exception as exc:
+            self._update(job.job_id, status="failed", message=str(exc), finished_at=datetime.utcnow())
+            append_log("ERROR", f"导出任务 {job.job_id} 失败: {exc}")
+            try:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            except OSError:
+                pass
+        else:
+            # 只有缓存可能超出上限时才扫描目录
+            if self._may_exceed_cap(job.path.stat().st_size):
+                self.evict(keep=job.path)
+
+    def _may_exceed_cap(self, added: int) -> bool:
+        with self._evict_lock:
+            if self._size_estimate is None:
+                return True
+            self._size_estimate += added
+            return self._size_estimate > self.max_bytes or time.monotonic() - self._scanned_at >= self.RESCAN_SEC
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """Delete least recently used artifacts until the cache fits in ``max_bytes``."""
+        with self._evict_lock:
+            files = []
+            for path in self.cache_dir.glob("*"):
+                if not path.is_file() or path.name.endswith(".part"):
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and path == keep:
+                    continue
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+            self._size_estimate = total
+            self._scanned_at = time.monotonic()
+
+    def _prune_jobs(self, session: Session) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.JOB_RETENTION_SEC)
+        session.execute(delete(ExportJobRecord).where(ExportJobRecord.finished_at < cutoff))
+
+
+export_jobs = ExportJobManager()
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import select, tuple_
+
+from ..db import SessionLocal
+from ..models import ValuableProject
+
+
+EXPORT_FIELD_NAMES: List[str] = [
+    "项目名称",
+    "项目类型",
+    "建设性质",
+    "拟开工时间",
+    "拟建成时间",
+    "建设规模与建设内容（生产能力）",
+    "项目联系人姓名",
+    "项目联系人手机",
+    "总投资",
+    "固定投资",
+    "土建工程",
+    "设备购置费",
+    "安装工程",
+    "工程建设其他费用",
+    "预备费",
+    "建设期利息",
+    "铺底流动资金",
+    "财政性资金",
+    "自有资金（非财政性资金）",
+    "银行贷款",
+    "其它",
+    "项目（法人）单位",
+    "成立日期",
+    "法定代表人",
+    "法定代表人手机号码",
+]
+
+BASIC_HEADERS: List[str] = ["项目编号", "项目名称", "地区代码", "发现时间", "解析状态"]
+EXPORT_HEADERS: List[str] = BASIC_HEADERS + EXPORT_FIELD_NAMES
+
+EXPORT_FORMATS = ("xlsx", "csv", "ndjson")
+EXPORT_MEDIA_TYPES: Dict[str, str] = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# 每批从数据库读取的行数；导出内存占用只与该值有关，与总行数无关
+EXPORT_CHUNK_ROWS = 500
+STREAM_CHUNK_BYTES = 64 * 1024
+
+_EXPORT_COLUMNS = (
+    ValuableProject.projectuuid,
+    ValuableProject.project_name,
+    ValuableProject.region_code,
+    ValuableProject.discovered_at,
+    ValuableProject.parsed_pdf,
+    ValuableProject.pdf_extract_json,
+)
+
+
+def iter_export_rows(selected: Optional[List[str]] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[List[str]]:
+    """Yield one list of cell values per project, newest first, reading the DB in keyset chunks.
+
+    Uses its own session so it can outlive the request's ``get_db`` dependency, and
+    keeps no read transaction open between chunks.
+    """
+    anchor = None
+    while True:
+        stmt = select(*_EXPORT_COLUMNS)
+        if selected:
+            stmt = stmt.where(ValuableProject.region_code.in_(selected))
+        if anchor is not None:
+            stmt = stmt.where(tuple_(ValuableProject.discovered_at, ValuableProject.projectuuid) < tuple_(*anchor))
+        stmt = stmt.order_by(ValuableProject.discovered_at.desc(), ValuableProject.projectuuid.desc()).limit(chunk_rows)
+        with SessionLocal() as session:
+            rows = session.execute(stmt).all()
+        if not rows:
+            return
+        for row in rows:
+            yield _export_row(row)
+        if len(rows) < chunk_rows:
+            return
+        anchor = (rows[-1].discovered_at, rows[-1].projectuuid)
+
+
+def _export_row(row) -> List[str]:
+    parsed_data: dict = {}
+    if row.pdf_extract_json:
+        try:
+            parsed_data = json.loads(row.pdf_extract_json)
+        except Exception:
+            pass
+    basic = [
+        row.projectuuid,
+        row.project_name,
+        row.region_code,
+        row.discovered_at.strftime("%Y-%m-%d %H:%M:%S"),
+        "已解析" if row.parsed_pdf else "未解析",
+    ]
+    return basic + [parsed_data.get(field, "") for field in EXPORT_FIELD_NAMES]
+
+
+def write_xlsx(rows: Iterable[List[str]], path: str) -> int:
+    """Write rows to ``path`` with an openpyxl write-only workbook; returns the row count.
+
+    Write-only mode spools each row to disk as it is appended, so memory stays flat.
+    Only the header row and the status column are styled.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("项目列表")
+
+    column_widths = {1: 32, 2: 40, 3: 12, 4: 20, 5: 12}
+    for col_idx in range(1, len(EXPORT_HEADERS) + 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = column_widths.get(col_idx, 20)
+    ws.freeze_panes = "A2"
+
+    header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header_font = Font(color="FFFFFF", bold=True, size=11)
+    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    thin_border = Border(
+        left=Side(style="thin", color="D0D0D0"),
+        right=Side(style="thin", color="D0D0D0"),
+        top=Side(style="thin", color="D0D0D0"),
+        bottom=Side(style="thin", color="D0D0D0"),
+    )
+    header_cells = []
+    for header in EXPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+        cell.border = thin_border
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    parsed_fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+    unparsed_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+    parsed_font = Font(bold=True, color="1F4E78")
+    unparsed_font = Font(bold=True, color="9C6500")
+    center_alignment = Alignment(horizontal="center", vertical="center")
+
+    count = 0
+    for values in rows:
+        status = WriteOnlyCell(ws, value=values[4])
+        is_parsed = values[4] == "已解析"
+        status.fill = parsed_fill if is_parsed else unparsed_fill
+        status.font = parsed_font if is_parsed else unparsed_font
+        status.alignment = center_alignment
+        ws.append(values[:4] + [status] + values[5:])
+        count += 1
+    wb.save(path)
+    return count
+
+
+def iter_file_bytes(path: str, *, remove: bool = False) -> Iterator[bytes]:
+    try:
+        with open(path, "rb") as fp:
+            while True:
+                chunk = fp.read(STREAM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def iter_xlsx_bytes(rows: Iterable[List[str]]) -> Iterator[bytes]:
+    # xlsx 是 zip 容器，必须整体写完才能输出；先落到临时文件再分块读出
+    fd, path = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        write_xlsx(rows, path)
+    except Exception:
+        os.remove(path)
+        raise
+    yield from iter_file_bytes(path, remove=True)
+
+
+def iter_csv_bytes(rows: Iterable[List[str]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM 让 Excel 以 UTF-8 打开
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_HEADERS)
+    for values in rows:
+        writer.writerow(values)
+        if buffer.tell() >= STREAM_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_ndjson_bytes(rows: Iterable[List[str]]) -> Iterator[bytes]:
+    parts: List[str] = []
+    size = 0
+    for values in rows:
+        # 解析字段单独成一个对象：其中的“项目名称”与基本信息同名，平铺会互相覆盖
+        record = dict(zip(BASIC_HEADERS, values))
+        record["解析字段"] = dict(zip(EXPORT_FIELD_NAMES, values[len(BASIC_HEADERS):]))
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= STREAM_CHUNK_BYTES:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts).encode("utf-8")
+
+
+def stream_export(fmt: str, selected: Optional[List[str]] = None) -> Iterator[bytes]:
+    rows = iter_export_rows(selected)
+    if fmt == "csv":
+        return iter_csv_bytes(rows)
+    if fmt == "ndjson":
+        return iter_ndjson_bytes(rows)
+    return iter_xlsx_bytes(rows)
+
+
+def write_export(fmt: str, path: str, selected: Optional[List[str]] = None, on_row=None) -> int:
+    """Write a complete export file to ``path``; ``on_row(count)`` reports progress."""
+    count = 0
+
+    def counted(rows: Iterable[List[str]]) -> Iterator[List[str]]:
+        nonlocal count
+        for values in rows:
+            yield values
+            count += 1
+            if on_row:
+                on_row(count)
+
+    rows = counted(iter_export_rows(selected))
+    if fmt == "xlsx":
+        write_xlsx(rows, path)
+        return count
+    encoder = iter_csv_bytes if fmt == "csv" else iter_ndjson_bytes
+    with open(path, "wb") as fp:
+        for chunk in encoder(rows):
+            fp.write(chunk)
+    return count
+
+
+def export_filename(fmt: str) -> str:
+    return f"valuable_projects.{fmt}"
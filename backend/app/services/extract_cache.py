@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from ..config import EXTRACT_CACHE_MEMORY_ENTRIES
+from ..models import PdfExtractCache
+from .pdf_extractor import EXTRACTOR_VERSION
+
+
+class ExtractResultCache:
+    """Two-level memo of extraction results: an in-process LRU in front of pdf_extract_cache.
+
+    Entries are keyed on (SHA-256 of the PDF bytes, EXTRACTOR_VERSION), so bumping the
+    version after an extractor change invalidates every old result without a purge.
+    Each result keeps the extractor tier that produced it (see ``tier_counts``).
+    """
+
+    def __init__(self, max_entries: int = EXTRACT_CACHE_MEMORY_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[Dict[str, str], Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: Tuple[str, int], fields: Dict[str, str], tier: Optional[str]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (fields, tier)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_entry(
+        self, session: Session, sha256: str, version: int = EXTRACTOR_VERSION
+    ) -> Optional[Tuple[Dict[str, str], Optional[str]]]:
+        """``(fields, tier)`` of a cached result, or None."""
+        key = (sha256, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return dict(entry[0]), entry[1]
+        row = session.execute(
+            select(PdfExtractCache.result_json, PdfExtractCache.tier).where(
+                PdfExtractCache.sha256 == sha256, PdfExtractCache.extractor_version == version
+            )
+        ).first()
+        if row is None:
+            return None
+        fields = json.loads(row.result_json)
+        self._remember(key, fields, row.tier)
+        return dict(fields), row.tier
+
+    def get(self, session: Session, sha256: str, version: int = EXTRACTOR_VERSION) -> Optional[Dict[str, str]]:
+        entry = self.get_entry(session, sha256, version)
+        return entry[0] if entry else None
+
+    def put(
+        self,
+        session: Session,
+        sha256: str,
+        fields: Dict[str, str],
+        version: int = EXTRACTOR_VERSION,
+        tier: Optional[str] = None,
+    ) -> None:
+        """Record a successful extraction; caller commits."""
+        stmt = insert(PdfExtractCache).values(
+            sha256=sha256, extractor_version=version, result_json=json.dumps(fields, ensure_ascii=False), tier=tier
+        )
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["sha256", "extractor_version"],
+                set_={"result_json": stmt.excluded.result_json, "tier": stmt.excluded.tier},
+            )
+        )
+        self._remember((sha256, version), dict(fields), tier)
+
+    @staticmethod
+    def tier_counts(session: Session, version: int = EXTRACTOR_VERSION) -> Dict[str, int]:
+        """How many cached results of ``version`` each extractor tier produced, across all processes."""
+        rows = session.execute(
+            select(PdfExtractCache.tier, func.count())
+            .where(PdfExtractCache.extractor_version == version, PdfExtractCache.tier.is_not(None))
+            .group_by(PdfExtractCache.tier)
+        )
+        return {tier: count for tier, count in rows}
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+extract_cache = ExtractResultCache()
+
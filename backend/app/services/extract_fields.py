@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+import re
+from datetime import date, datetime
+from typing import Dict, Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from ..models import ProjectExtractFields
+
+
+# pdf_extractor 字段名 -> ProjectExtractFields 列名
+TEXT_COLUMNS: Dict[str, str] = {
+    "项目类型": "project_type",
+    "建设性质": "construction_nature",
+    "项目（法人）单位": "company_name",
+    "法定代表人": "legal_representative",
+}
+
+AMOUNT_COLUMNS: Dict[str, str] = {
+    "总投资": "total_investment",
+    "固定投资": "fixed_investment",
+    "土建工程": "civil_works",
+    "设备购置费": "equipment_purchase",
+    "安装工程": "installation",
+    "工程建设其他费用": "other_construction_costs",
+    "预备费": "reserve_funds",
+    "建设期利息": "construction_interest",
+    "铺底流动资金": "working_capital",
+    "财政性资金": "fiscal_funds",
+    "自有资金（非财政性资金）": "own_funds",
+    "银行贷款": "bank_loans",
+    "其它": "other_funds",
+}
+
+DATE_COLUMNS: Dict[str, str] = {
+    "拟开工时间": "planned_start_date",
+    "拟建成时间": "planned_end_date",
+    "成立日期": "established_date",
+}
+
+AMOUNT_PATTERN = re.compile(r"[-+]?\d+(?:\.\d+)?")
+DATE_PATTERN = re.compile(r"(\d{4})\s*[-/.年]\s*(\d{1,2})(?:\s*[-/.月]\s*(\d{1,2}))?")
+
+
+def parse_amount(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    match = AMOUNT_PATTERN.search(str(value).replace(",", "").replace("，", ""))
+    if not match:
+        return None
+    return float(match.group(0))
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    """Parse 2024-01-05 / 2024/1/5 / 2024年1月5日 / 2024年1月 (day defaults to 1)."""
+    if not value:
+        return None
+    match = DATE_PATTERN.search(str(value))
+    if not match:
+        return None
+    year, month, day = int(match.group(1)), int(match.group(2)), int(match.group(3) or 1)
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def normalize_extract(data: Dict[str, str]) -> Dict[str, object]:
+    values: Dict[str, object] = {}
+    for field, column in TEXT_COLUMNS.items():
+        text = (data.get(field) or "").strip()
+        values[column] = text[:255] or None
+    for field, column in AMOUNT_COLUMNS.items():
+        values[column] = parse_amount(data.get(field))
+    for field, column in DATE_COLUMNS.items():
+        values[column] = parse_date(data.get(field))
+    return values
+
+
+def upsert_extract_fields(session: Session, projectuuid: str, data: Dict[str, str]) -> None:
+    """Write the typed copy of an extraction result; caller commits."""
+    values = normalize_extract(data)
+    stmt = insert(ProjectExtractFields).values(projectuuid=projectuuid, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ProjectExtractFields.projectuuid],
+        set_={**values, "updated_at": datetime.utcnow()},
+    )
+    session.execute(stmt)
+
+
+def upsert_extract_json(session: Session, projectuuid: str, raw_json: Optional[str]) -> bool:
+    if not raw_json:
+        return False
+    try:
+        data = json.loads(raw_json)
+    except Exception:
+        return False
+    if not isinstance(data, dict):
+        return False
+    upsert_extract_fields(session, projectuuid, data)
+    return True
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
+
+from ..config import (
+    PDF_EXTRACT_MAX_MEMORY_MB,
+    PDF_EXTRACT_MAX_TASKS_PER_CHILD,
+    PDF_EXTRACT_TIMEOUT_SEC,
+    PDF_EXTRACT_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# 硬超时从 worker 真正开始执行任务时算起：软超时之后再多等这么久仍未返回，
+# 说明 worker 卡在 C 代码里（SIGALRM 无法打断），这时才回收进程池
+HARD_TIMEOUT_GRACE_SEC = 5.0
+# 父进程检查任务是否超时的间隔
+WATCHDOG_POLL_SEC = 0.2
+
+# worker 进程内：向父进程报告“开始执行某任务”的队列
+_started_queue = None
+
+
+class ExtractionError(RuntimeError):
+    """Extraction timed out, ran out of memory, or its worker process died."""
+
+
+def _init_worker(max_memory_mb: int, started_queue=None) -> None:
+    global _started_queue
+    _started_queue = started_queue
+    # Ctrl+C 由父进程统一处理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if max_memory_mb <= 0:
+        return
+    try:
+        import resource
+
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        logger.warning("PDF extraction worker memory limit not supported on this platform")
+
+
+def _alarm_handler(signum, frame) -> None:
+    raise TimeoutError("PDF extraction timed out")
+
+
+def _extract(source) -> Tuple[Dict[str, str], str]:
+    from .pdf_extractor import extract_with_tier
+
+    return extract_with_tier(source)
+
+
+def _run_job(job_id: int, timeout_sec: float, fn: Callable, *args):
+    if _started_queue is not None:
+        _started_queue.put((job_id, time.time()))
+    use_alarm = hasattr(signal, "SIGALRM") and timeout_sec > 0
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _alarm_handler)
+        signal.setitimer(signal.ITIMER_REAL, timeout_sec)
+    try:
+        return fn(*args)
+    except MemoryError as exc:
+        raise ExtractionError("PDF extraction exceeded the worker memory limit") from exc
+    except TimeoutError as exc:
+        raise ExtractionError(str(exc)) from exc
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+class ExtractionPool:
+    """Process pool for ``extract_from_pdf`` shared by the parse routes and batch jobs.
+
+    Each job gets a soft timeout (SIGALRM inside the worker) and a hard timeout in the
+    parent. Both start when a worker picks the job up (workers report it on a queue), so
+    time spent waiting behind other jobs never counts. Only a job still running past the
+    hard timeout, i.e. a worker stuck where the alarm cannot reach, recycles the pool;
+    jobs that die with it through no fault of their own are resubmitted once.
+    Workers run under an address-space limit and are recycled after
+    ``max_tasks_per_child`` jobs. ``tier_counts`` tallies which extractor tier (text or
+    table) finished each document in this process; ``extract_with_tier`` reports it per
+    document.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = PDF_EXTRACT_WORKERS,
+        timeout_sec: float = PDF_EXTRACT_TIMEOUT_SEC,
+        max_memory_mb: int = PDF_EXTRACT_MAX_MEMORY_MB,
+        max_tasks_per_child: int = PDF_EXTRACT_MAX_TASKS_PER_CHILD,
+        hard_grace_sec: float = HARD_TIMEOUT_GRACE_SEC,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.timeout_sec = timeout_sec
+        self.max_memory_mb = max_memory_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.hard_grace_sec = hard_grace_sec
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._started_queue = None
+        self._generation = 0
+        self._job_ids = itertools.count(1)
+        # job id → 父进程单调时钟下的开始时间
+        self._started: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.tier_counts: Counter = Counter()
+        self.restarts = 0
+
+    def _get_executor(self) -> Tuple[ProcessPoolExecutor, int]:
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context("spawn")
+                self._started_queue = context.Queue()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self.max_memory_mb, self._started_queue),
+                    max_tasks_per_child=self.max_tasks_per_child or None,
+                )
+                self._generation += 1
+            return self._executor, self._generation
+
+    def _submit(self, fn: Callable, args: tuple, timeout: float) -> Tuple[int, int, Future]:
+        job_id = next(self._job_ids)
+        executor, generation = self._get_executor()
+        try:
+            return job_id, generation, executor.submit(_run_job, job_id, timeout, fn, *args)
+        except BrokenProcessPool:
+            self.restart(generation)
+            executor, generation = self._get_executor()
+            return job_id, generation, executor.submit(_run_job, job_id, timeout, fn, *args)
+
+    def submit(self, source, timeout_sec: Optional[float] = None) -> Future:
+        """Queue an extraction; ``source`` is a file path, the PDF bytes or an in-memory buffer.
+
+        The future resolves to ``(fields, tier)``. It carries no hard timeout; use
+        ``extract``/``extract_async`` for that.
+        """
+        timeout = self.timeout_sec if timeout_sec is None else timeout_sec
+        return self._submit(_extract, (source,), timeout)[2]
+
+    def _drain_started(self) -> None:
+        queue = self._started_queue
+        if queue is None:
+            return
+        while True:
+            try:
+                job_id, wall = queue.get_nowait()
+            except Exception:
+                return
+            # 换算成父进程的单调时钟，不受 worker 汇报延迟影响
+            with self._lock:
+                self._started[job_id] = time.monotonic() - max(0.0, time.time() - wall)
+
+    def _overdue(self, job_id: int, timeout: float) -> bool:
+        if timeout <= 0:
+            return False
+        self._drain_started()
+        with self._lock:
+            started = self._started.get(job_id)
+        return started is not None and time.monotonic() - started > timeout + self.hard_grace_sec
+
+    def _forget(self, job_id: int) -> None:
+        with self._lock:
+            self._started.pop(job_id, None)
+
+    def _call(self, fn: Callable, args: tuple, timeout: float):
+        for attempt in range(2):
+            job_id, generation, future = self._submit(fn, args, timeout)
+            try:
+                while True:
+                    try:
+                        return future.result(timeout=WATCHDOG_POLL_SEC)
+                    except FutureTimeoutError:
+                        if self._overdue(job_id, timeout):
+                            self.restart(generation)
+                            raise ExtractionError("PDF extraction timed out")
+            except BrokenProcessPool as exc:
+                # 进程池因其他任务卡死被回收（或 worker 崩溃）：重新提交一次
+                if attempt:
+                    raise ExtractionError("PDF extraction worker crashed") from exc
+            finally:
+                self._forget(job_id)
+
+    async def _call_async(self, fn: Callable, args: tuple, timeout: float):
+        for attempt in range(2):
+            job_id, generation, future = self._submit(fn, args, timeout)
+            waiter = asyncio.wrap_future(future)
+            try:
+                while True:
+                    try:
+                        return await asyncio.wait_for(asyncio.shield(waiter), WATCHDOG_POLL_SEC)
+                    except asyncio.TimeoutError:
+                        if self._overdue(job_id, timeout):
+                            self.restart(generation)
+                            raise ExtractionError("PDF extraction timed out")
+            except BrokenProcessPool as exc:
+                if attempt:
+                    raise ExtractionError("PDF extraction worker crashed") from exc
+            finally:
+                self._forget(job_id)
+
+    def _record(self, outcome: Tuple[Dict[str, str], str]) -> Tuple[Dict[str, str], str]:
+        tier = outcome[1]
+        with self._lock:
+            self.tier_counts[tier] += 1
+            counts = dict(self.tier_counts)
+        logger.info("PDF extracted with the %s tier (this process so far: %s)", tier, counts)
+        return outcome
+
+    def extract_with_tier(self, source, timeout_sec: Optional[float] = None) -> Tuple[Dict[str, str], str]:
+        """Extract fields and report which tier produced them."""
+        timeout = self.timeout_sec if timeout_sec is None else timeout_sec
+        return self._record(self._call(_extract, (source,), timeout))
+
+    async def extract_with_tier_async(self, source, timeout_sec: Optional[float] = None) -> Tuple[Dict[str, str], str]:
+        timeout = self.timeout_sec if timeout_sec is None else timeout_sec
+        return self._record(await self._call_async(_extract, (source,), timeout))
+
+    def extract(self, source, timeout_sec: Optional[float] = None) -> Dict[str, str]:
+        return self.extract_with_tier(source, timeout_sec)[0]
+
+    async def extract_async(self, source, timeout_sec: Optional[float] = None) -> Dict[str, str]:
+        return (await self.extract_with_tier_async(source, timeout_sec))[0]
+
+    def restart(self, generation: Optional[int] = None) -> None:
+        """Kill the current workers; the next submit starts a fresh pool.
+
+        With ``generation``, only if that pool is still the current one, so several jobs
+        noticing the same stuck pool recycle it once.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            executor, self._executor = self._executor, None
+            queue, self._started_queue = self._started_queue, None
+        if executor is None:
+            return
+        self.restarts += 1
+        logger.warning("recycling the PDF extraction pool")
+        for process in list(getattr(executor, "_processes", {}).values()):
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        # 不取消排队中的任务：它们随进程池一起得到 BrokenProcessPool，并各自重新提交
+        executor.shutdown(wait=False)
+        if queue is not None:
+            queue.close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            queue, self._started_queue = self._started_queue, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if queue is not None:
+            queue.close()
+
+
+extraction_pool = ExtractionPool()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, String, delete, exists, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from ..config import PARSE_LEASE_TTL_SEC
+from ..models import ParseLease, ValuableProject
+
+
+def expire_leases(session: Session, now: Optional[float] = None) -> None:
+    """Drop leases past their deadline (uses the expires_at index); caller commits."""
+    now = time.time() if now is None else now
+    session.execute(delete(ParseLease).where(ParseLease.expires_at <= now))
+
+
+def acquire_leases(
+    session: Session,
+    holder: str,
+    regions: Sequence[str],
+    limit: int = 1,
+    ttl_sec: float = PARSE_LEASE_TTL_SEC,
+) -> List[Tuple[str, str, str, float]]:
+    """Lease up to ``limit`` unparsed, unleased projects, newest first; caller commits.
+
+    Picking and reserving happen in a single INSERT ... SELECT ... RETURNING, so two
+    operators asking at the same moment can never be handed the same project.
+    Returns ``(projectuuid, project_name, region_code, expires_at)`` tuples.
+    """
+    now = time.time()
+    expires_at = now + ttl_sec
+    expire_leases(session, now)
+
+    candidates = select(
+        ValuableProject.projectuuid,
+        literal(holder, String),
+        literal(now, Float),
+        literal(expires_at, Float),
+    ).where(
+        ValuableProject.parsed_pdf.is_(False),
+        ValuableProject.is_invalid.is_(False),
+        ~exists().where(ParseLease.projectuuid == ValuableProject.projectuuid),
+    )
+    if regions:
+        candidates = candidates.where(ValuableProject.region_code.in_(list(regions)))
+    candidates = candidates.order_by(ValuableProject.discovered_at.desc(), ValuableProject.projectuuid.desc()).limit(limit)
+
+    leased = session.scalars(
+        insert(ParseLease)
+        .from_select(["projectuuid", "holder", "leased_at", "expires_at"], candidates)
+        .returning(ParseLease.projectuuid)
+    ).all()
+    if not leased:
+        return []
+    rows = session.execute(
+        select(ValuableProject.projectuuid, ValuableProject.project_name, ValuableProject.region_code)
+        .where(ValuableProject.projectuuid.in_(leased))
+        .order_by(ValuableProject.discovered_at.desc(), ValuableProject.projectuuid.desc())
+    ).all()
+    return [(r.projectuuid, r.project_name, r.region_code, expires_at) for r in rows]
+
+
+def renew_leases(
+    session: Session, projectuuids: Sequence[str], holder: str, ttl_sec: float = PARSE_LEASE_TTL_SEC
+) -> int:
+    """Extend the holder's live leases; returns how many were still held. Caller commits."""
+    if not projectuuids:
+        return 0
+    now = time.time()
+    result = session.execute(
+        update(ParseLease)
+        .where(
+            ParseLease.projectuuid.in_(list(projectuuids)),
+            ParseLease.holder == holder,
+            ParseLease.expires_at > now,
+        )
+        .values(expires_at=now + ttl_sec)
+    )
+    return result.rowcount or 0
+
+
+def release_lease(session: Session, projectuuid: str, holder: Optional[str] = None) -> bool:
+    """Give a project back (any holder unless ``holder`` is given); caller commits."""
+    stmt = delete(ParseLease).where(ParseLease.projectuuid == projectuuid)
+    if holder is not None:
+        stmt = stmt.where(ParseLease.holder == holder)
+    return (session.execute(stmt).rowcount or 0) > 0
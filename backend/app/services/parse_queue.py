@@ -0,0 +1,406 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..config import PARSE_QUEUE_DEPTH, UPSTREAM_TIMEOUT_SEC
+from ..crawler.client import PublicAnnouncementClient
+from ..db import SessionLocal
+from ..deadlines import upstream_deadline
+from ..models import ParseQueueItem, ParseQueueRecord
+from ..schemas import ParseQueueEntry, ParseQueueStatus
+from .logs import append_log
+from .parse_leases import acquire_leases, release_lease, renew_leases
+from .parse_service import (
+    DownloadTooLarge,
+    ParseSession,
+    download_with_session,
+    establish_session_and_get_captcha,
+    extract_document,
+    record_parse_result,
+    session_manager,
+    to_base64_image,
+    verify_captcha,
+)
+from .upstream import run_upstream
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+# 解析会话 15 分钟过期；预取的验证码放置超过该时间就重新建立会话
+CAPTCHA_MAX_AGE_SEC = 600
+# 已完成（成功/失败）的条目只保留最近这么多条供前端展示
+FINISHED_HISTORY = 20
+# 预取/处理中的条目超过这么久没有进展，视为所在进程已退出，由下一次补位接手
+STALE_WORK_SEC = {"prefetching": 120.0, "processing": 600.0}
+
+WAITING_STATES = ("prefetching", "ready")
+ACTIVE_STATES = WAITING_STATES + ("processing",)
+
+
+@dataclass
+class QueueEntry:
+    """Snapshot of a parse_queue_entries row."""
+
+    entry_id: str
+    projectuuid: str
+    project_name: str
+    state: str = "prefetching"
+    parse_session_id: Optional[str] = None
+    sendid: Optional[str] = None
+    url: Optional[str] = None
+    captcha_image: Optional[str] = None
+    fields: Optional[dict] = None
+    message: Optional[str] = None
+    prepared_at: float = 0.0
+
+    @classmethod
+    def from_row(cls, row: ParseQueueItem) -> "QueueEntry":
+        return cls(
+            entry_id=row.entry_id,
+            projectuuid=row.projectuuid,
+            project_name=row.project_name,
+            state=row.state,
+            parse_session_id=row.parse_session_id,
+            sendid=row.sendid,
+            url=row.url,
+            captcha_image=row.captcha_image,
+            fields=json.loads(row.fields_json) if row.fields_json else None,
+            message=row.message,
+            prepared_at=row.prepared_at,
+        )
+
+    def to_schema(self) -> ParseQueueEntry:
+        return ParseQueueEntry(
+            entry_id=self.entry_id,
+            projectuuid=self.projectuuid,
+            project_name=self.project_name,
+            state=self.state,
+            captcha_image_base64=self.captcha_image if self.state == "ready" else None,
+            parsed_fields=self.fields,
+            message=self.message,
+        )
+
+
+def first_target_item(client: PublicAnnouncementClient, projectuuid: str):
+    """The first target-item attachment of a project that has a download URL, if any."""
+    detail = client.get_project_detail(projectuuid)
+    if not detail:
+        return None
+    return next((it for it in detail.items if it.matches_target() and it.url), None)
+
+
+class ParseQueue:
+    """One operator's pipeline of projects to parse.
+
+    Up to ``depth`` projects are kept prepared ahead of the operator: their detail is
+    fetched and a captcha session established in the background. Once a captcha is
+    solved, download and extraction run in the background too, so the operator can
+    move straight on to the next captcha.
+
+    The queue and its entries live in SQLite, so any API worker process can serve the
+    operator's next request; background work runs in whichever process picked it up.
+    """
+
+    def __init__(self, manager: "ParseQueueManager", user_id: int, holder: str, regions: List[str], depth: int) -> None:
+        self.manager = manager
+        self.user_id = user_id
+        self.holder = holder
+        self.regions = regions
+        self.depth = max(1, depth)
+
+    def top_up(self) -> None:
+        """Refresh stale captchas, recover orphaned work and claim new projects until ``depth`` are waiting."""
+        now = time.time()
+        prefetch: List[str] = []
+        with SessionLocal() as db:
+            # 先写队列行拿到 SQLite 写锁：同一用户并发的补位（可能来自不同进程）依次执行，不会多领项目
+            touched = db.execute(
+                update(ParseQueueRecord).where(ParseQueueRecord.user_id == self.user_id).values(holder=self.holder)
+            )
+            if not touched.rowcount:
+                return  # 队列已停止
+            rows = db.scalars(
+                select(ParseQueueItem).where(
+                    ParseQueueItem.user_id == self.user_id, ParseQueueItem.state.in_(ACTIVE_STATES)
+                )
+            ).all()
+            for row in rows:
+                stale_captcha = row.state == "ready" and now - row.prepared_at > CAPTCHA_MAX_AGE_SEC
+                orphaned = row.state in STALE_WORK_SEC and now - row.updated_at > STALE_WORK_SEC[row.state]
+                if stale_captcha or (orphaned and row.state == "prefetching"):
+                    row.state, row.updated_at = "prefetching", now
+                    prefetch.append(row.entry_id)
+                elif orphaned:
+                    row.state, row.message, row.updated_at = "failed", "处理中断，请重新解析", now
+            renew_leases(db, [r.projectuuid for r in rows if r.state in ACTIVE_STATES], self.holder)
+            need = self.depth - sum(1 for r in rows if r.state in WAITING_STATES)
+            if need > 0:
+                for projectuuid, project_name, _, _ in acquire_leases(db, self.holder, self.regions, need):
+                    entry_id = str(uuid.uuid4())
+                    db.add(
+                        ParseQueueItem(
+                            entry_id=entry_id,
+                            user_id=self.user_id,
+                            projectuuid=projectuuid,
+                            project_name=project_name,
+                            state="prefetching",
+                            updated_at=now,
+                        )
+                    )
+                    prefetch.append(entry_id)
+            self._trim_history(db)
+            db.commit()
+        for entry_id in prefetch:
+            self.manager.prefetch_executor.submit(self._prefetch, entry_id)
+
+    def _update(self, entry_id: str, states: Sequence[str], **values) -> bool:
+        """Update an entry still in one of ``states``; False if it moved on or was removed."""
+        values["updated_at"] = time.time()
+        with SessionLocal() as db:
+            result = db.execute(
+                update(ParseQueueItem)
+                .where(ParseQueueItem.entry_id == entry_id, ParseQueueItem.state.in_(list(states)))
+                .values(**values)
+            )
+            db.commit()
+        return (result.rowcount or 0) > 0
+
+    def _prefetch(self, entry_id: str) -> None:
+        entry = self.get(entry_id)
+        if entry is None or entry.state != "prefetching":
+            return
+        try:
+            # 后台预取不经过 run_upstream，同样限定总时长，避免上游卡住时一直占着租约
+            client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+            with upstream_deadline(UPSTREAM_TIMEOUT_SEC):
+                item = first_target_item(client, entry.projectuuid)
+                if item is None:
+                    self._finish(entry_id, "failed", "未找到可解析的目标文件")
+                    return
+                cookies, img_bytes = establish_session_and_get_captcha(client, entry.projectuuid, item.sendid)
+            session = session_manager.create(entry.projectuuid, item.sendid, cookies)
+            self._update(
+                entry_id,
+                ("prefetching",),
+                state="ready",
+                sendid=item.sendid,
+                url=item.url,
+                parse_session_id=session.id,
+                captcha_image=to_base64_image(img_bytes),
+                prepared_at=time.time(),
+                message=None,
+            )
+        except Exception as exc:
+            # 上游不可用时不要继续领取新项目，否则会把整个列表都刷成失败
+            self._finish(entry_id, "failed", f"准备验证码失败: {exc}", refill=False)
+
+    def get(self, entry_id: str) -> Optional[QueueEntry]:
+        with SessionLocal() as db:
+            row = db.scalar(
+                select(ParseQueueItem).where(
+                    ParseQueueItem.entry_id == entry_id, ParseQueueItem.user_id == self.user_id
+                )
+            )
+            return QueueEntry.from_row(row) if row else None
+
+    async def verify(self, entry: QueueEntry, code: str, request: Optional["Request"] = None) -> bool:
+        """Check a captcha; on success hand the download to the background and refill the queue.
+
+        Upstream calls go through ``run_upstream`` (raising UpstreamTimeout or
+        ClientDisconnected) and database work runs on the threadpool.
+        """
+        session = await run_in_threadpool(session_manager.get, entry.parse_session_id) if entry.parse_session_id else None
+        if session is None:
+            # 会话已过期：重新预取，前端稍后会拿到新的验证码
+            if await run_in_threadpool(
+                self._update,
+                entry.entry_id,
+                ("ready",),
+                state="prefetching",
+                captcha_image=None,
+                message="会话已过期，正在刷新验证码",
+            ):
+                self.manager.prefetch_executor.submit(self._prefetch, entry.entry_id)
+            return False
+        client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+        if not await run_upstream(verify_captcha, client, session.cookies, session.referer, code, request=request):
+            cookies, img_bytes = await run_upstream(
+                establish_session_and_get_captcha, client, session.projectuuid, session.sendid, request=request
+            )
+            session.cookies = cookies
+            await run_in_threadpool(session_manager.save, session)
+            await run_in_threadpool(
+                self._update,
+                entry.entry_id,
+                ("ready",),
+                captcha_image=to_base64_image(img_bytes),
+                prepared_at=time.time(),
+                message="验证码错误",
+            )
+            return False
+        session.verified_captcha_code = code
+        await run_in_threadpool(session_manager.save, session)
+        # 条件更新：同一条目的重复提交只会有一个进入下载
+        if not await run_in_threadpool(
+            self._update, entry.entry_id, ("ready",), state="processing", captcha_image=None, message=None
+        ):
+            return False
+        self.manager.process_executor.submit(self._process, entry, session)
+        await run_in_threadpool(self.top_up)
+        return True
+
+    def _process(self, entry: QueueEntry, parse_session: ParseSession) -> None:
+        client = PublicAnnouncementClient(timeout=UPSTREAM_TIMEOUT_SEC)
+        try:
+            # 与 /download 路由相同的下载时限
+            with upstream_deadline(UPSTREAM_TIMEOUT_SEC * 2):
+                buffer = download_with_session(
+                    client,
+                    parse_session.cookies,
+                    parse_session.referer,
+                    parse_session.sendid,
+                    "1",
+                    parse_session.verified_captcha_code,
+                )
+            filename = os.path.basename(entry.url) if entry.url else f"{parse_session.sendid}.pdf"
+            fields = None
+            pdf_sha256 = None
+            with SessionLocal() as db:
+                if filename.lower().endswith(".pdf"):
+                    fields, pdf_sha256, _tier = extract_document(db, buffer.getvalue())
+                buffer.close()
+                if not record_parse_result(db, entry.projectuuid, fields, [pdf_sha256]):
+                    self._finish(entry.entry_id, "failed", "项目记录不存在")
+                    return
+                db.commit()
+            if fields:
+                self._finish(entry.entry_id, "succeeded", None, fields=fields)
+            else:
+                self._finish(entry.entry_id, "failed", "解析失败，已标记为无效")
+        except DownloadTooLarge:
+            self._finish(entry.entry_id, "failed", "附件过大，无法解析")
+        except Exception as exc:
+            append_log("ERROR", f"解析队列处理项目 {entry.projectuuid} 失败: {exc}")
+            self._finish(entry.entry_id, "failed", f"下载或解析失败: {exc}")
+
+    def _finish(
+        self, entry_id: str, state: str, message: Optional[str], refill: bool = True, fields: Optional[dict] = None
+    ) -> None:
+        # 解析成功/失败时 record_parse_result 已释放租约；下载或准备失败的项目保留租约直到过期，
+        # 避免补位时立刻又领到同一个项目
+        with SessionLocal() as db:
+            db.execute(
+                update(ParseQueueItem)
+                .where(ParseQueueItem.entry_id == entry_id)
+                .values(
+                    state=state,
+                    message=message,
+                    captcha_image=None,
+                    fields_json=json.dumps(fields, ensure_ascii=False) if fields else None,
+                    updated_at=time.time(),
+                )
+            )
+            self._trim_history(db)
+            db.commit()
+        if refill:
+            self.top_up()
+
+    def _trim_history(self, db: Session) -> None:
+        stale = (
+            select(ParseQueueItem.id)
+            .where(ParseQueueItem.user_id == self.user_id, ParseQueueItem.state.in_(("succeeded", "failed")))
+            .order_by(ParseQueueItem.id.desc())
+            .offset(FINISHED_HISTORY)
+        )
+        db.execute(delete(ParseQueueItem).where(ParseQueueItem.id.in_(stale)))
+
+    def skip(self, entry_id: str) -> bool:
+        """Drop a waiting project; its lease is kept until expiry so the queue moves past it."""
+        with SessionLocal() as db:
+            result = db.execute(
+                delete(ParseQueueItem).where(
+                    ParseQueueItem.entry_id == entry_id,
+                    ParseQueueItem.user_id == self.user_id,
+                    ParseQueueItem.state.in_(WAITING_STATES),
+                )
+            )
+            db.commit()
+        if not result.rowcount:
+            return False
+        self.top_up()
+        return True
+
+    def to_status(self) -> ParseQueueStatus:
+        with SessionLocal() as db:
+            rows = db.scalars(
+                select(ParseQueueItem).where(ParseQueueItem.user_id == self.user_id).order_by(ParseQueueItem.id)
+            ).all()
+            entries = [QueueEntry.from_row(row).to_schema() for row in rows]
+        return ParseQueueStatus(depth=self.depth, regions=self.regions, entries=entries)
+
+
+class ParseQueueManager:
+    """Per-user parse queues kept in the parse_queues tables, shared by every API worker process.
+
+    Projects are claimed through parse_leases, so a project sits in at most one queue (or
+    /api/parse/next hand-out) at a time. Captcha prefetch and download/extraction run on
+    this process's executors.
+    """
+
+    def __init__(self, prefetch_workers: int = 4, process_workers: int = 2) -> None:
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=prefetch_workers)
+        self.process_executor = ThreadPoolExecutor(max_workers=process_workers)
+
+    def start(self, user_id: int, holder: str, regions: List[str], depth: Optional[int] = None) -> ParseQueue:
+        self.stop(user_id)
+        queue = ParseQueue(self, user_id, holder, sorted(set(regions)), depth or PARSE_QUEUE_DEPTH)
+        with SessionLocal() as db:
+            db.add(
+                ParseQueueRecord(
+                    user_id=user_id,
+                    holder=holder,
+                    regions_json=json.dumps(queue.regions),
+                    depth=queue.depth,
+                    created_at=time.time(),
+                )
+            )
+            db.commit()
+        queue.top_up()
+        return queue
+
+    def get(self, user_id: int) -> Optional[ParseQueue]:
+        with SessionLocal() as db:
+            record = db.get(ParseQueueRecord, user_id)
+            if record is None:
+                return None
+            return ParseQueue(self, user_id, record.holder, record.region_codes(), record.depth)
+
+    def stop(self, user_id: int) -> None:
+        """Drop the queue and give waiting projects back; downloads already running finish."""
+        with SessionLocal() as db:
+            record = db.get(ParseQueueRecord, user_id)
+            if record is None:
+                return
+            waiting = db.scalars(
+                select(ParseQueueItem.projectuuid).where(
+                    ParseQueueItem.user_id == user_id, ParseQueueItem.state.in_(WAITING_STATES)
+                )
+            ).all()
+            for projectuuid in waiting:
+                release_lease(db, projectuuid, record.holder)
+            db.execute(delete(ParseQueueItem).where(ParseQueueItem.user_id == user_id))
+            db.delete(record)
+            db.commit()
+
+
+parse_queues = ParseQueueManager()
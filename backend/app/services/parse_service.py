@@ -1,17 +1,38 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import heapq
+import io
+import json
 import os
+import shutil
+import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
 from urllib.parse import urlencode
 from urllib.request import Request, urlopen
 
-from ..config import DATA_DIR
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from ..config import DATA_DIR, PARSE_MAX_DOWNLOAD_BYTES
 from ..crawler.client import PublicAnnouncementClient
+from ..db import SessionLocal
+from ..deadlines import check_deadline, propagate_budget, socket_timeout
+from ..models import ParseSessionRecord, ProjectDocument, ValuableProject
+from .extract_cache import extract_cache
+from .extraction_pool import extraction_pool
+from .extract_fields import upsert_extract_fields
+from .parse_leases import release_lease
+from .pdf_store import pdf_store
+from .search_index import index_project
 
 
 CAPTCHA_IMG_URL = (
@@ -22,6 +43,14 @@ CHECK_RANDOM_URL = (
 )
 BASE_HOST = "https://tzxm.zjzwfw.gov.cn/"
 
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+# 同一已验证会话内并发下载的附件数上限
+DOWNLOAD_CONCURRENCY = 4
+
+
+class DownloadTooLarge(ValueError):
+    """The attachment exceeds ``PARSE_MAX_DOWNLOAD_BYTES``."""
+
 
 @dataclass
 class ParseSession:
@@ -37,8 +66,47 @@ class ParseSession:
 
 
 class ParseSessionManager:
-    def __init__(self) -> None:
-        self._sessions: Dict[str, ParseSession] = {}
+    """Parse sessions persisted in the parse_sessions table.
+
+    Every API worker process sees the same sessions, and they survive restarts.
+    Expiry is sliding (``ttl_sec`` after the last use). A background reaper sleeps
+    until the earliest local deadline on a min-heap, and at most ``REAP_INTERVAL_SEC``.
+    It then deletes expired rows through the expires_at index, together with any
+    files they left behind, so nothing is scanned on the request path.
+
+    ``get`` returns a detached copy: call ``save`` after mutating it.
+    """
+
+    REAP_INTERVAL_SEC = 60.0
+
+    def __init__(self, ttl_sec: int = 900) -> None:
+        self.ttl_sec = ttl_sec
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _to_session(row: ParseSessionRecord) -> ParseSession:
+        return ParseSession(
+            id=row.id,
+            projectuuid=row.projectuuid,
+            sendid=row.sendid,
+            cookies=row.cookies,
+            referer=row.referer,
+            created_at=row.created_at,
+            updated_at=row.updated_at,
+            verified_captcha_code=row.verified_captcha_code,
+            downloaded_files=json.loads(row.downloaded_files_json or "[]"),
+        )
+
+    def _schedule(self, expires_at: float, sid: str) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (expires_at, sid))
+            if self._reaper is None or not self._reaper.is_alive():
+                self._stop.clear()
+                self._reaper = threading.Thread(target=self._reap_loop, name="parse-session-reaper", daemon=True)
+                self._reaper.start()
 
     def create(self, projectuuid: str, sendid: str, cookies: str) -> ParseSession:
         sid = str(uuid.uuid4())
@@ -56,30 +124,100 @@ class ParseSessionManager:
             created_at=now,
             updated_at=now,
         )
-        self._sessions[sid] = session
-        self.cleanup()
+        with SessionLocal() as db:
+            db.add(
+                ParseSessionRecord(
+                    id=sid,
+                    projectuuid=projectuuid,
+                    sendid=sendid,
+                    cookies=cookies,
+                    referer=referer,
+                    downloaded_files_json="[]",
+                    created_at=now,
+                    updated_at=now,
+                    expires_at=now + self.ttl_sec,
+                )
+            )
+            db.commit()
+        self._schedule(now + self.ttl_sec, sid)
         return session
 
     def get(self, sid: str) -> Optional[ParseSession]:
-        self.cleanup()
-        s = self._sessions.get(sid)
-        if s:
-            s.updated_at = time.time()
-        return s
+        now = time.time()
+        with SessionLocal() as db:
+            row = db.get(ParseSessionRecord, sid)
+            if row is None or row.expires_at <= now:
+                return None
+            row.updated_at = now
+            row.expires_at = now + self.ttl_sec
+            db.commit()
+            session = self._to_session(row)
+        self._schedule(now + self.ttl_sec, sid)
+        return session
 
-    def cleanup(self, ttl_sec: int = 900) -> None:
+    def save(self, session: ParseSession) -> None:
+        """Persist cookies, the verified captcha and downloaded files, and extend the expiry."""
         now = time.time()
-        expired = [sid for sid, s in self._sessions.items() if now - s.updated_at > ttl_sec]
-        for sid in expired:
-            s = self._sessions.get(sid)
-            if s:
-                for filepath in s.downloaded_files:
-                    try:
-                        if os.path.exists(filepath):
-                            os.remove(filepath)
-                    except Exception:
-                        pass
-            self._sessions.pop(sid, None)
+        session.updated_at = now
+        with SessionLocal() as db:
+            db.execute(
+                update(ParseSessionRecord)
+                .where(ParseSessionRecord.id == session.id)
+                .values(
+                    cookies=session.cookies,
+                    verified_captcha_code=session.verified_captcha_code,
+                    downloaded_files_json=json.dumps(session.downloaded_files, ensure_ascii=False),
+                    updated_at=now,
+                    expires_at=now + self.ttl_sec,
+                )
+            )
+            db.commit()
+        self._schedule(now + self.ttl_sec, session.id)
+
+    def reap(self, now: Optional[float] = None) -> int:
+        """Delete expired sessions and their leftover files; returns how many were removed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                heapq.heappop(self._heap)
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(ParseSessionRecord.id, ParseSessionRecord.downloaded_files_json).where(
+                    ParseSessionRecord.expires_at <= now
+                )
+            ).all()
+            if not rows:
+                return 0
+            # 再次带上过期条件，避免删掉刚被其他进程续期的会话
+            db.execute(
+                delete(ParseSessionRecord).where(
+                    ParseSessionRecord.id.in_([r.id for r in rows]), ParseSessionRecord.expires_at <= now
+                )
+            )
+            db.commit()
+        for row in rows:
+            for filepath in json.loads(row.downloaded_files_json or "[]"):
+                try:
+                    if os.path.exists(filepath):
+                        os.remove(filepath)
+                except Exception:
+                    pass
+        return len(rows)
+
+    def _reap_loop(self) -> None:
+        while not self._stop.is_set():
+            now = time.time()
+            with self._lock:
+                next_due = self._heap[0][0] if self._heap else now + self.REAP_INTERVAL_SEC
+            if self._stop.wait(min(max(0.0, next_due - now), self.REAP_INTERVAL_SEC)):
+                break
+            try:
+                self.reap()
+            except Exception:
+                pass
+
+    def stop(self) -> None:
+        self._stop.set()
 
 
 session_manager = ParseSessionManager()
@@ -112,7 +250,7 @@ def establish_session_and_get_captcha(client: PublicAnnouncementClient, projectu
     query = urlencode(params)
     url = f"{client.BASE_URL}?{query}"
     req = Request(url, data=urlencode({}).encode("utf-8"), headers=client.headers, method="POST")
-    with urlopen(req, timeout=client.timeout) as resp:
+    with urlopen(req, timeout=socket_timeout(client.timeout)) as resp:
         cookies = _extract_cookies_from_headers(resp.headers)
         # consume body to complete request
         _ = resp.read()
@@ -132,7 +270,7 @@ def establish_session_and_get_captcha(client: PublicAnnouncementClient, projectu
         }
     )
     img_req = Request(cap_url, headers=headers, method="GET")
-    with urlopen(img_req, timeout=client.timeout) as img_resp:
+    with urlopen(img_req, timeout=socket_timeout(client.timeout)) as img_resp:
         img_bytes = img_resp.read()
     return cookies, img_bytes
 
@@ -147,30 +285,247 @@ def verify_captcha(client: PublicAnnouncementClient, cookies: str, referer: str,
     )
     form = urlencode({"Txtidcode": code}).encode("utf-8")
     req = Request(CHECK_RANDOM_URL, data=form, headers=headers, method="POST")
-    with urlopen(req, timeout=client.timeout) as resp:
+    with urlopen(req, timeout=socket_timeout(client.timeout)) as resp:
         payload = resp.read().decode("utf-8", errors="replace")
     return '"random_flag":"1"' in payload
 
 
-def download_with_session(client: PublicAnnouncementClient, cookies: str, referer: str, sendid: str, flag: str, captcha_code: str) -> bytes:
+def open_download(client: PublicAnnouncementClient, cookies: str, referer: str, sendid: str, flag: str, captcha_code: str):
+    """Open the downFile response without reading it; the caller must close it."""
     # Build the correct download URL according to the API specification
     download_url = f"{BASE_HOST}publicannouncement.do?method=downFile&sendid={sendid}&flag={flag}&Txtidcode={captcha_code}"
     headers = dict(client.headers)
     headers.update({"Cookie": cookies, "Referer": referer})
     req = Request(download_url, headers=headers, method="GET")
-    with urlopen(req, timeout=client.timeout) as resp:
-        return resp.read()
+    return urlopen(req, timeout=socket_timeout(client.timeout))
+
+
+def iter_response_chunks(resp, chunk_size: int = DOWNLOAD_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield the response body in chunks and close the response when done or abandoned."""
+    try:
+        while True:
+            # 在 run_upstream 中执行时，超时或客户端断开后不再继续读取
+            check_deadline()
+            chunk = resp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        resp.close()
+
+
+def download_with_session(
+    client: PublicAnnouncementClient,
+    cookies: str,
+    referer: str,
+    sendid: str,
+    flag: str,
+    captcha_code: str,
+    max_bytes: int = PARSE_MAX_DOWNLOAD_BYTES,
+) -> io.BytesIO:
+    """Read the attachment chunk by chunk into a bounded in-memory buffer.
+
+    The returned buffer is rewound and can be handed straight to the extractor,
+    so nothing touches the disk unless the caller explicitly saves it.
+    """
+    resp = open_download(client, cookies, referer, sendid, flag, captcha_code)
+    length = resp.headers.get("Content-Length")
+    if max_bytes and length and length.isdigit() and int(length) > max_bytes:
+        resp.close()
+        raise DownloadTooLarge(f"attachment is {length} bytes, limit is {max_bytes}")
+    buffer = io.BytesIO()
+    chunks = iter_response_chunks(resp)
+    try:
+        for chunk in chunks:
+            buffer.write(chunk)
+            if max_bytes and buffer.tell() > max_bytes:
+                raise DownloadTooLarge(f"attachment exceeds {max_bytes} bytes")
+    finally:
+        chunks.close()
+    buffer.seek(0)
+    return buffer
+
+
+class ExtractionResult(NamedTuple):
+    # None when extraction failed
+    fields: Optional[Dict[str, str]]
+    # None unless the document was kept in the PDF store
+    pdf_sha256: Optional[str]
+    # Extractor tier (text/table) that produced the fields, also for cached results
+    tier: Optional[str] = None
+
+
+def _prepare_extractions(session: Session, contents: List[bytes]):
+    """Store the PDFs (when enabled) and answer what the result cache can.
+
+    Returns ``(digests, stored, cached, pending)``; ``cached`` maps SHA-256 to
+    ``(fields, tier)`` and ``pending`` maps the SHA-256 of each distinct uncached
+    document to its bytes.
+    """
+    digests = [pdf_store.digest(content) for content in contents]
+    # 保留原始文件以便日后改进解析器后离线重新解析，无需再次验证码
+    stored = [pdf_store.put(content) if pdf_store.enabled else None for content in contents]
+
+    # 同一份附件（不同 sendid 或重复下载）直接命中解析结果缓存
+    results_by_sha: Dict[str, Tuple[Dict[str, str], Optional[str]]] = {}
+    pending: Dict[str, bytes] = {}
+    for sha256, content in zip(digests, contents):
+        if sha256 in results_by_sha or sha256 in pending:
+            continue
+        cached = extract_cache.get_entry(session, sha256)
+        if cached is not None:
+            results_by_sha[sha256] = cached
+        else:
+            pending[sha256] = content
+    return digests, stored, results_by_sha, pending
+
+
+def _finish_extractions(
+    session: Session,
+    digests: List[str],
+    stored: List[Optional[str]],
+    results_by_sha: Dict[str, Tuple[Dict[str, str], Optional[str]]],
+    extracted: Dict[str, Tuple[Dict[str, str], str]],
+) -> List[ExtractionResult]:
+    for sha256, (fields, tier) in extracted.items():
+        extract_cache.put(session, sha256, fields, tier=tier)
+        results_by_sha[sha256] = (fields, tier)
+    results = []
+    for sha256, stored_sha256 in zip(digests, stored):
+        if sha256 in results_by_sha:
+            fields, tier = results_by_sha[sha256]
+            results.append(ExtractionResult(dict(fields), stored_sha256, tier))
+        else:
+            results.append(ExtractionResult(None, stored_sha256))
+    return results
+
+
+def extract_documents(session: Session, contents: List[bytes]) -> List[ExtractionResult]:
+    """Keep the PDFs in the store (when enabled) and extract their fields.
+
+    Returns an ExtractionResult per document. Documents that miss the result cache are
+    extracted in parallel on the extraction pool.
+    """
+    digests, stored, cached, pending = _prepare_extractions(session, contents)
+    extracted: Dict[str, Tuple[Dict[str, str], str]] = {}
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as workers:
+            outcomes = {
+                sha256: workers.submit(extraction_pool.extract_with_tier, content) for sha256, content in pending.items()
+            }
+        for sha256, outcome in outcomes.items():
+            try:
+                extracted[sha256] = outcome.result()
+            except Exception:
+                continue
+    return _finish_extractions(session, digests, stored, cached, extracted)
+
+
+async def extract_documents_async(session: Session, contents: List[bytes]) -> List[ExtractionResult]:
+    """``extract_documents`` for async routes.
+
+    Hashing, the PDF store and the cache lookups/writes run on the threadpool, and the
+    extraction pool is awaited without holding a thread, so the event loop never blocks.
+    """
+    digests, stored, cached, pending = await run_in_threadpool(_prepare_extractions, session, contents)
+    outcomes = await asyncio.gather(
+        *(extraction_pool.extract_with_tier_async(content) for content in pending.values()), return_exceptions=True
+    )
+    extracted = {
+        sha256: outcome for sha256, outcome in zip(pending.keys(), outcomes) if not isinstance(outcome, BaseException)
+    }
+    return await run_in_threadpool(_finish_extractions, session, digests, stored, cached, extracted)
+
+
+def extract_document(session: Session, content: bytes) -> ExtractionResult:
+    return extract_documents(session, [content])[0]
+
+
+def merge_extracted_fields(results: Iterable[Optional[Dict[str, str]]]) -> Optional[Dict[str, str]]:
+    """Combine per-document results; the first document with a non-empty value wins each field."""
+    merged: Optional[Dict[str, str]] = None
+    for fields in results:
+        if not fields:
+            continue
+        if merged is None:
+            merged = dict(fields)
+            continue
+        for name, value in fields.items():
+            if value and not merged.get(name):
+                merged[name] = value
+    return merged
+
+
+def record_parse_result(
+    session: Session, projectuuid: str, fields: Optional[Dict[str, str]], pdf_sha256s: Sequence[Optional[str]] = ()
+) -> bool:
+    """Write an extraction outcome onto the project and release its lease; caller commits.
+
+    ``pdf_sha256s`` are the stored documents ``fields`` were merged from, in merge order
+    (None for documents that were not stored); re-extraction later re-merges all of them.
+    Returns False if the project is gone.
+    """
+    release_lease(session, projectuuid)
+    project = session.get(ValuableProject, projectuuid)
+    if not project:
+        return False
+    stored = list(dict.fromkeys(sha for sha in pdf_sha256s if sha))
+    if stored:
+        project.pdf_sha256 = stored[0]
+        session.execute(delete(ProjectDocument).where(ProjectDocument.projectuuid == projectuuid))
+        session.add_all(
+            ProjectDocument(projectuuid=projectuuid, position=position, pdf_sha256=sha)
+            for position, sha in enumerate(stored)
+        )
+    project.pdf_file_path = None
+    if fields:
+        project.pdf_extract_json = json.dumps(fields, ensure_ascii=False)
+        project.parsed_pdf = True
+        project.parsed_at = datetime.utcnow()
+        project.is_invalid = False
+        upsert_extract_fields(session, project.projectuuid, fields)
+        index_project(session, project.projectuuid, project.project_name, fields)
+    else:
+        project.is_invalid = True
+    return True
+
+
+def download_documents(
+    client: PublicAnnouncementClient, parse_session: ParseSession, sendids: List[str], flag: str = "1"
+) -> List[Tuple[Optional[io.BytesIO], Optional[str]]]:
+    """Fetch several attachments concurrently over one verified session.
+
+    Returns ``(buffer, error)`` per sendid, in order; exactly one of the two is set.
+    """
+    def fetch(sendid: str) -> Tuple[Optional[io.BytesIO], Optional[str]]:
+        try:
+            buffer = download_with_session(
+                client, parse_session.cookies, parse_session.referer, sendid, flag, parse_session.verified_captcha_code
+            )
+            return buffer, None
+        except DownloadTooLarge:
+            return None, "附件过大，无法解析"
+        except Exception as exc:
+            return None, f"下载失败: {exc}"
+
+    if not sendids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(sendids), DOWNLOAD_CONCURRENCY)) as workers:
+        return list(workers.map(propagate_budget(fetch), sendids))
 
 
 def to_base64_image(data: bytes) -> str:
     return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
 
 
-def save_to_project_dir(projectuuid: str, filename: str, data: bytes) -> str:
+def save_to_project_dir(projectuuid: str, filename: str, data: Union[bytes, BinaryIO]) -> str:
     base = Path(DATA_DIR) / "downloads" / projectuuid
     base.mkdir(parents=True, exist_ok=True)
     path = base / filename
     with open(path, "wb") as f:
-        f.write(data)
+        if isinstance(data, (bytes, bytearray)):
+            f.write(data)
+        else:
+            shutil.copyfileobj(data, f, DOWNLOAD_CHUNK_BYTES)
     return path.as_posix()
 
@@ -1,9 +1,21 @@
 from __future__ import annotations
 
+import bisect
+import io
 import re
-from typing import Dict, List
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
-import pdfplumber
+if TYPE_CHECKING:
+    import pdfplumber
+    from pdfminer.layout import LTPage
+    from pdfplumber.page import Page
+
+# 解析逻辑有任何会改变输出的修改时递增；解析结果缓存按 (文档哈希, 版本) 区分
+EXTRACTOR_VERSION = 4
+
+# 每份文档使用的解析层级：text 仅靠文字坐标完成；table 表示回退到了 extract_table
+TIER_TEXT = "text"
+TIER_TABLE = "table"
 
 
 FIELD_NAMES: List[str] = [
@@ -70,15 +82,44 @@ FUND_COLUMNS = {
     "其它": "其它",
 }
 
+# 同一章节的字段总是一起出现在表里：章节出现了但仍有字段为空，说明文字层可能漏读（如标签折行）
+SECTION_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "basic": (
+        "项目名称",
+        "项目类型",
+        "建设性质",
+        "拟开工时间",
+        "拟建成时间",
+        "建设规模与建设内容（生产能力）",
+        "项目联系人姓名",
+        "项目联系人手机",
+    ),
+    "unit": ("项目（法人）单位", "成立日期", "法定代表人", "法定代表人手机号码"),
+    "invest": tuple(INVEST_COLUMNS.values()),
+    "fund": tuple(v for v in FUND_COLUMNS.values() if v in FIELD_NAMES),
+}
+
 SECTION_END_MARKERS = (
     "项目单位基本情况",
     "项目变更情况",
     "项目单位声明",
 )
 
+# 所有字段都位于该章节之前；遇到即停止，不再打开后续页面
+TERMINAL_MARKERS = ("项目单位声明",)
+
+TABLE_SETTINGS = {
+    "vertical_strategy": "lines",
+    "horizontal_strategy": "lines",
+}
+
 FIXED_INVEST_PATTERN = re.compile(r"固定投资([0-9]+(?:\.[0-9]+)?)万元")
 NUMERIC_PATTERN = re.compile(r"^[-+]?\d+(?:\.\d+)?$")
 
+# 文字层解析时，坐标差在该范围内的线条视为同一条；同一单元格内顶端相差不超过 LINE_TOLERANCE 的字符视为同一行
+EDGE_TOLERANCE = 1.0
+LINE_TOLERANCE = 3.0
+
 
 def clean(cell: str) -> str:
     if not cell:
@@ -90,30 +131,136 @@ def is_numeric(cell: str) -> bool:
     return bool(cell) and bool(NUMERIC_PATTERN.match(cell))
 
 
-def extract_from_pdf(pdf_path: str) -> Dict[str, str]:
-    data: Dict[str, str] = {field: "" for field in FIELD_NAMES}
-    data["固定投资"] = ""
+def _iter_pages(pdf: pdfplumber.PDF) -> Iterator[Page]:
+    """Open pages one at a time instead of building ``pdf.pages`` for the whole document."""
+    from pdfminer.pdfpage import PDFPage
+    from pdfplumber.page import Page
+
+    doctop = 0
+    for page_number, page_obj in enumerate(PDFPage.create_pages(pdf.doc), start=1):
+        page = Page(pdf, page_obj, page_number=page_number, initial_doctop=doctop)
+        doctop += page.height
+        yield page
 
-    with pdfplumber.open(pdf_path) as pdf:
-        tables: List[List[str]] = []
-        for page in pdf.pages:
-            table = page.extract_table(
-                table_settings={
-                    "vertical_strategy": "lines",
-                    "horizontal_strategy": "lines",
-                }
-            )
-            if table:
-                tables.extend(table)
 
+def iter_table_rows(pdf: pdfplumber.PDF) -> Iterator[List[str]]:
+    """Stream table rows page by page; stops parsing pages as soon as the consumer stops."""
+    for page in _iter_pages(pdf):
+        try:
+            # lines 策略只依据线条/矩形边；没有任何边的页面不可能有表格，直接跳过
+            if not page.edges:
+                continue
+            table = page.extract_table(table_settings=TABLE_SETTINGS)
+        finally:
+            page.close()
+        if table:
+            yield from table
+
+
+def _merge_positions(values: Iterable[float]) -> List[float]:
+    merged: List[float] = []
+    for value in sorted(values):
+        if not merged or value - merged[-1] > EDGE_TOLERANCE:
+            merged.append(value)
+    return merged
+
+
+def _layout_rows(layout: LTPage) -> List[List[str]]:
+    """Rebuild table rows from a raw pdfminer layout: characters plus ruling lines.
+
+    Consecutive horizontal lines bound a row; the vertical lines crossing that band split
+    it into cells, and each character lands in the cell containing its centre. Empty
+    cells are kept so column positions line up the same way as in the table pass.
+    """
+    from pdfminer.layout import LTChar, LTCurve, LTRect
+
+    height = layout.y1
+    chars: List[Tuple[float, float, float, float, str]] = []
+    horizontal: List[float] = []
+    vertical: List[Tuple[float, float, float]] = []
+    for obj in layout:
+        if isinstance(obj, LTChar):
+            chars.append((height - obj.y1, height - obj.y0, obj.x0, obj.x1, obj.get_text()))
+        elif isinstance(obj, LTCurve):
+            points = list(obj.pts)
+            if isinstance(obj, LTRect):
+                points.append(points[0])
+            for (x0, y0), (x1, y1) in zip(points, points[1:]):
+                if abs(y0 - y1) <= EDGE_TOLERANCE and abs(x0 - x1) > EDGE_TOLERANCE:
+                    horizontal.append(height - y0)
+                elif abs(x0 - x1) <= EDGE_TOLERANCE and abs(y0 - y1) > EDGE_TOLERANCE:
+                    vertical.append((x0, height - max(y0, y1), height - min(y0, y1)))
+    horizontal = _merge_positions(horizontal)
+    if len(horizontal) < 2 or not vertical:
+        return []
+
+    bands: List[List[Tuple[float, float, float, str]]] = [[] for _ in range(len(horizontal) - 1)]
+    for top, bottom, x0, x1, text in chars:
+        band = bisect.bisect_right(horizontal, (top + bottom) / 2) - 1
+        if 0 <= band < len(bands):
+            bands[band].append((top, x0, (x0 + x1) / 2, text))
+
+    rows: List[List[str]] = []
+    for band, band_chars in enumerate(bands):
+        top, bottom = horizontal[band], horizontal[band + 1]
+        bounds = _merge_positions(
+            x for x, edge_top, edge_bottom in vertical
+            if edge_top <= top + EDGE_TOLERANCE and edge_bottom >= bottom - EDGE_TOLERANCE
+        )
+        if len(bounds) < 2:
+            continue
+        cells: List[List[Tuple[float, float, str]]] = [[] for _ in range(len(bounds) - 1)]
+        for char_top, x0, center, text in band_chars:
+            column = bisect.bisect_right(bounds, center) - 1
+            if 0 <= column < len(cells):
+                cells[column].append((char_top, x0, text))
+        rows.append([_cell_text(cell) for cell in cells])
+    return rows
+
+
+def _cell_text(chars: List[Tuple[float, float, str]]) -> str:
+    """Characters of one cell in reading order: lines top to bottom, each left to right."""
+    lines: List[List[Tuple[float, float, str]]] = []
+    for char in sorted(chars):
+        if lines and char[0] - lines[-1][0][0] <= LINE_TOLERANCE:
+            lines[-1].append(char)
+        else:
+            lines.append([char])
+    return "".join(text for line in lines for _, _, text in sorted(line, key=lambda c: c[1]))
+
+
+def iter_text_rows(pdf: pdfplumber.PDF) -> Iterator[List[str]]:
+    """Cheap counterpart of ``iter_table_rows``: reads characters and ruling lines straight
+    from pdfminer, skipping pdfplumber's object conversion and table finding."""
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    device = PDFPageAggregator(PDFResourceManager(caching=True), laparams=None)
+    interpreter = PDFPageInterpreter(device.rsrcmgr, device)
+    for page_obj in PDFPage.create_pages(pdf.doc):
+        interpreter.process_page(page_obj)
+        yield from _layout_rows(device.get_result())
+
+
+def collect_fields(rows: Iterable[List[str]], data: Dict[str, str], seen: Optional[Set[str]] = None) -> None:
+    """Fill ``data`` from table rows, returning early once every field is known
+    or a terminal section (e.g. 项目单位声明) is reached.
+
+    When ``seen`` is given, it receives every field whose label appeared, with or
+    without a value next to it.
+    """
     current_section = None
     column_labels: Dict[int, str] = {}
 
-    for row in tables:
+    for row in rows:
         cells = [clean(c) for c in row]
         if not any(cells):
             continue
 
+        if any(marker in cell for cell in cells if cell for marker in TERMINAL_MARKERS):
+            return
+
         if any("项目投资情况" in cell for cell in cells):
             current_section = "invest"
             column_labels = {}
@@ -134,10 +281,14 @@ def extract_from_pdf(pdf_path: str) -> Dict[str, str]:
             for idx, cell in enumerate(cells):
                 if cell in INVEST_COLUMNS:
                     column_labels[idx] = INVEST_COLUMNS[cell]
+                    if seen is not None:
+                        seen.add(INVEST_COLUMNS[cell])
         elif current_section == "fund":
             for idx, cell in enumerate(cells):
                 if cell in FUND_COLUMNS:
                     column_labels[idx] = FUND_COLUMNS[cell]
+                    if seen is not None:
+                        seen.add(FUND_COLUMNS[cell])
 
         for cell in cells:
             match = FIXED_INVEST_PATTERN.search(cell)
@@ -151,6 +302,8 @@ def extract_from_pdf(pdf_path: str) -> Dict[str, str]:
                 norm_label = TEXT_LABEL_MAP.get(label)
                 if not norm_label:
                     continue
+                if seen is not None:
+                    seen.add(norm_label)
                 value = ""
                 for j in range(idx + 1, len(cells)):
                     candidate = cells[j]
@@ -175,8 +328,63 @@ def extract_from_pdf(pdf_path: str) -> Dict[str, str]:
         if current_section in ("invest", "fund") and not any(column_labels.values()):
             column_labels = {}
 
+        if all(data[field] for field in FIELD_NAMES):
+            return
+
+
+def _needs_table_pass(data: Dict[str, str], seen: Set[str]) -> bool:
+    """Whether the table pass could add anything: a section the text pass found has an empty field.
+
+    Sections whose labels never appeared are left alone (e.g. a form without the
+    investment tables), since both passes read the same characters. A label the text
+    pass could not piece together (wrapped across its row bands) leaves its field empty
+    while the rest of the section is read, so that falls back too, as does a text pass
+    that found no labels at all (e.g. an unusual grid).
+    """
+    if not seen:
+        return True
+    return any(
+        any(not data.get(name) for name in fields)
+        for fields in SECTION_FIELDS.values()
+        if seen.intersection(fields)
+    )
+
+
+def extract_with_tier(source: Union[str, bytes, BinaryIO], text_tier: bool = True) -> Tuple[Dict[str, str], str]:
+    """Extract fields and report which tier produced them (TIER_TEXT or TIER_TABLE).
+
+    The text tier rebuilds rows from word coordinates and ruling lines; the lines-based
+    ``extract_table`` pass only runs when that leaves labelled fields empty, and then
+    only fills the fields that are still missing. ``text_tier=False`` skips straight
+    to the table pass.
+    """
+    import pdfplumber
+
+    data: Dict[str, str] = {field: "" for field in FIELD_NAMES}
+    data["固定投资"] = ""
+    tier = TIER_TABLE
+
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with pdfplumber.open(source) as pdf:
+        seen: Set[str] = set()
+        if text_tier:
+            collect_fields(iter_text_rows(pdf), data, seen)
+        if not text_tier or _needs_table_pass(data, seen):
+            from_tables: Dict[str, str] = {field: "" for field in data}
+            collect_fields(iter_table_rows(pdf), from_tables)
+            for name, value in from_tables.items():
+                if value and not data[name]:
+                    data[name] = value
+        else:
+            tier = TIER_TEXT
+
     if not data.get("总投资"):
         data["总投资"] = data.get("固定投资", "")
 
-    return data
+    return data, tier
+
 
+def extract_from_pdf(source: Union[str, bytes, BinaryIO]) -> Dict[str, str]:
+    """Extract fields from a PDF given as a file path, raw bytes or a binary file object."""
+    return extract_with_tier(source)[0]
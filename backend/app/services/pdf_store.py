@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional
+
+from ..config import PDF_STORE_DIR, PDF_STORE_ENABLED, PDF_STORE_MAX_BYTES
+
+
+class PdfStore:
+    """Content-addressed, gzip-compressed store for downloaded PDFs.
+
+    Documents live at ``<root>/<sha[:2]>/<sha>.pdf.gz``; storing the same bytes twice
+    is a no-op apart from refreshing the file's mtime, which doubles as the last-used
+    time for size-bounded LRU eviction. The store's size is tracked as documents are
+    added, so the directory is only scanned when the cap may have been reached.
+    """
+
+    SUFFIX = ".pdf.gz"
+    # 其他进程写入的文件不计入本进程的估算，隔一段时间重新扫描一次校正
+    RESCAN_SEC = 300.0
+
+    def __init__(self, root: Path = PDF_STORE_DIR, max_bytes: int = PDF_STORE_MAX_BYTES, enabled: bool = PDF_STORE_ENABLED) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._evict_lock = threading.Lock()
+        # 上次扫描得到的总大小加上此后本进程新写入的大小；None 表示尚未扫描
+        self._size_estimate: Optional[int] = None
+        self._scanned_at = 0.0
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / f"{sha256}{self.SUFFIX}"
+
+    def put(self, data: bytes) -> str:
+        """Store ``data`` (deduplicated) and return its SHA-256 key."""
+        sha256 = self.digest(data)
+        path = self.path_for(sha256)
+        if path.exists():
+            os.utime(path)
+            return sha256
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        try:
+            with gzip.open(tmp_path, "wb", compresslevel=6) as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        if self._may_exceed_cap(path.stat().st_size):
+            self.evict(keep=path)
+        return sha256
+
+    def _may_exceed_cap(self, added: int) -> bool:
+        if self.max_bytes <= 0:
+            return False
+        with self._evict_lock:
+            if self._size_estimate is None:
+                return True
+            self._size_estimate += added
+            return self._size_estimate > self.max_bytes or time.monotonic() - self._scanned_at >= self.RESCAN_SEC
+
+    def get(self, sha256: str) -> Optional[bytes]:
+        """Return the original bytes, or None when the document was never stored or was evicted."""
+        path = self.path_for(sha256)
+        try:
+            with gzip.open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return data
+
+    def contains(self, sha256: str) -> bool:
+        return self.path_for(sha256).exists()
+
+    def _iter_files(self) -> Iterator[Path]:
+        if not self.root.exists():
+            return
+        for path in self.root.glob(f"*/*{self.SUFFIX}"):
+            if path.is_file():
+                yield path
+
+    def total_bytes(self) -> int:
+        total = 0
+        for path in self._iter_files():
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """Delete least recently used documents until the store fits in ``max_bytes``."""
+        if self.max_bytes <= 0:
+            return
+        with self._evict_lock:
+            files = []
+            for path in self._iter_files():
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and path == keep:
+                    continue
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+            self._size_estimate = total
+            self._scanned_at = time.monotonic()
+
+
+pdf_store = PdfStore()
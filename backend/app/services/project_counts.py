@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from sqlalchemy import case, func, or_, select
+from sqlalchemy.orm import Session
+
+from ..config import PROJECT_COUNTS_CACHE
+from ..models import RegionParent, RegionRollup, ValuableProject
+from ..schemas import ProjectCounts
+
+
+def aggregate_project_counts(session: Session, selected: Optional[List[str]] = None) -> ProjectCounts:
+    """Count all/parsed/unparsed/invalid projects in a single pass over valuable_projects."""
+    stmt = select(
+        func.count(),
+        func.count().filter(ValuableProject.parsed_pdf == True),
+        func.count().filter(ValuableProject.parsed_pdf == False, ValuableProject.is_invalid == False),
+        func.count().filter(ValuableProject.is_invalid == True),
+    ).select_from(ValuableProject)
+    if selected:
+        stmt = stmt.where(ValuableProject.region_code.in_(selected))
+    all_count, parsed_count, unparsed_count, invalid_count = session.execute(stmt).one()
+    return ProjectCounts(
+        all=int(all_count or 0),
+        parsed=int(parsed_count or 0),
+        unparsed=int(unparsed_count or 0),
+        invalid=int(invalid_count or 0),
+    )
+
+
+def cached_project_counts(session: Session, selected: Optional[List[str]] = None) -> ProjectCounts:
+    """Read the counts off the trigger-maintained region_rollups; cost is O(regions), not O(rows).
+
+    A rollup row covers its region plus the districts below it, so a region's own
+    projects are its row minus its districts' rows: each row is weighted by whether it is
+    selected minus whether its parent is. With no selection that leaves the top-level rows.
+    """
+    if selected:
+        weight = case((RegionRollup.region_code.in_(selected), 1), else_=0) - case(
+            (RegionParent.parent_code.in_(selected), 1), else_=0
+        )
+        rows = or_(RegionRollup.region_code.in_(selected), RegionParent.parent_code.in_(selected))
+    else:
+        weight = 1
+        rows = RegionParent.region_code.is_(None)
+    stmt = (
+        select(
+            func.sum(RegionRollup.all_count * weight),
+            func.sum(RegionRollup.parsed_count * weight),
+            func.sum(RegionRollup.unparsed_count * weight),
+            func.sum(RegionRollup.invalid_count * weight),
+        )
+        .select_from(RegionRollup)
+        .outerjoin(RegionParent, RegionParent.region_code == RegionRollup.region_code)
+        .where(rows)
+    )
+    all_count, parsed_count, unparsed_count, invalid_count = session.execute(stmt).one()
+    return ProjectCounts(
+        all=int(all_count or 0),
+        parsed=int(parsed_count or 0),
+        unparsed=int(unparsed_count or 0),
+        invalid=int(invalid_count or 0),
+    )
+
+
+def count_projects(session: Session, selected: Optional[List[str]] = None) -> ProjectCounts:
+    if PROJECT_COUNTS_CACHE:
+        return cached_project_counts(session, selected)
+    return aggregate_project_counts(session, selected)
+
+
+def total_for_filter(counts: ProjectCounts, *, parsed: Optional[bool] = None, invalid: Optional[bool] = None) -> int:
+    """Map the list endpoint's parsed/invalid filter onto precomputed counts."""
+    if invalid is not None:
+        return counts.invalid if invalid else counts.all - counts.invalid
+    if parsed is not None:
+        return counts.parsed if parsed else counts.unparsed
+    return counts.all
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from ..models import ProjectDocument, ReextractJobRecord, ValuableProject
+from ..schemas import ReextractJobStatus
+from .extract_cache import extract_cache
+from .extract_fields import upsert_extract_fields
+from .extraction_pool import extraction_pool
+from .logs import append_log
+from .parse_service import merge_extracted_fields
+from .pdf_store import pdf_store
+from .search_index import index_project
+
+REEXTRACT_BATCH_ROWS = 100
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+@dataclass
+class ReextractJob:
+    """Snapshot of a reextract_jobs row."""
+
+    job_id: str
+    regions: List[str]
+    status: str = "pending"
+    total: Optional[int] = None
+    processed: int = 0
+    updated: int = 0
+    missing: int = 0
+    failed: int = 0
+    message: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+    @classmethod
+    def from_record(cls, row: ReextractJobRecord) -> "ReextractJob":
+        return cls(
+            job_id=row.id,
+            regions=row.region_codes(),
+            status=row.status,
+            total=row.total,
+            processed=row.processed,
+            updated=row.updated,
+            missing=row.missing,
+            failed=row.failed,
+            message=row.message,
+            created_at=row.created_at,
+            finished_at=row.finished_at,
+        )
+
+    def to_status(self) -> ReextractJobStatus:
+        return ReextractJobStatus(
+            job_id=self.job_id,
+            status=self.status,
+            regions=self.regions,
+            total=self.total,
+            processed=self.processed,
+            updated=self.updated,
+            missing=self.missing,
+            failed=self.failed,
+            message=self.message,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+        )
+
+
+def _extract_stored(sha256: str) -> Tuple[str, Optional[Dict[str, str]], Optional[str]]:
+    data = pdf_store.get(sha256)
+    if data is None:
+        return "missing", None, None
+    try:
+        return ("ok", *extraction_pool.extract_with_tier(data))
+    except Exception:
+        return "failed", None, None
+
+
+class ReextractJobManager:
+    """Re-runs the current extractor over PDFs kept in the PDF store.
+
+    Projects are walked in primary-key order in batches; each batch is extracted in
+    parallel on the extraction pool and written back in a single transaction, together
+    with the job's counters, so the job never needs a captcha or a network round trip.
+    Jobs live in the reextract_jobs table: every API worker process can report on them,
+    and only one runs at a time across all of them.
+    A project parsed from several documents (download-all) is re-merged from all of
+    them, in the order recorded in project_documents.
+    """
+
+    JOB_RETENTION_SEC = 3600
+    # 运行中的任务超过这么久没有提交批次，视为所在进程已退出，允许提交新任务
+    STALE_JOB_SEC = 600.0
+
+    def __init__(self, batch_rows: int = REEXTRACT_BATCH_ROWS) -> None:
+        self.batch_rows = batch_rows
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, regions: List[str]) -> ReextractJob:
+        regions = sorted(set(regions))
+        now = time.time()
+        with SessionLocal() as session:
+            # 先执行写语句拿到 SQLite 写锁：不同进程同时提交时依次检查，不会各自启动一个任务
+            self._prune_jobs(session)
+            session.execute(
+                update(ReextractJobRecord)
+                .where(
+                    ReextractJobRecord.status.in_(ACTIVE_STATUSES),
+                    ReextractJobRecord.updated_at < now - self.STALE_JOB_SEC,
+                )
+                .values(status="failed", message="任务中断：运行它的进程已退出", finished_at=datetime.utcnow())
+            )
+            existing = session.scalars(
+                select(ReextractJobRecord).where(ReextractJobRecord.status.in_(ACTIVE_STATUSES)).limit(1)
+            ).first()
+            if existing is not None:
+                session.commit()
+                return ReextractJob.from_record(existing)
+            row = ReextractJobRecord(
+                id=str(uuid.uuid4()),
+                regions_json=json.dumps(regions),
+                status="pending",
+                created_at=datetime.utcnow(),
+                updated_at=now,
+            )
+            session.add(row)
+            session.commit()
+            job = ReextractJob.from_record(row)
+        self.executor.submit(self._run, job.job_id, job.regions)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReextractJob]:
+        with SessionLocal() as session:
+            row = session.get(ReextractJobRecord, job_id)
+            return ReextractJob.from_record(row) if row else None
+
+    @staticmethod
+    def _update(session: Session, job_id: str, **values) -> None:
+        values["updated_at"] = time.time()
+        session.execute(update(ReextractJobRecord).where(ReextractJobRecord.id == job_id).values(**values))
+
+    def _stored_projects(self, regions: List[str]):
+        stmt = select(ValuableProject).where(ValuableProject.pdf_sha256.is_not(None))
+        if regions:
+            stmt = stmt.where(ValuableProject.region_code.in_(regions))
+        return stmt
+
+    @staticmethod
+    def _project_documents(session: Session, projects: List[ValuableProject]) -> Dict[str, List[str]]:
+        """Stored documents of each project in merge order (just ``pdf_sha256`` for older rows)."""
+        documents: Dict[str, List[str]] = {p.projectuuid: [] for p in projects}
+        rows = session.execute(
+            select(ProjectDocument.projectuuid, ProjectDocument.pdf_sha256)
+            .where(ProjectDocument.projectuuid.in_(list(documents)))
+            .order_by(ProjectDocument.projectuuid, ProjectDocument.position)
+        )
+        for projectuuid, sha256 in rows:
+            documents[projectuuid].append(sha256)
+        for project in projects:
+            if not documents[project.projectuuid]:
+                documents[project.projectuuid] = [project.pdf_sha256]
+        return documents
+
+    def _run(self, job_id: str, regions: List[str]) -> None:
+        counts = dict(processed=0, updated=0, missing=0, failed=0)
+        try:
+            with SessionLocal() as session:
+                base = self._stored_projects(regions)
+                total = session.scalar(select(func.count()).select_from(base.subquery()))
+                self._update(session, job_id, status="running", total=total)
+                session.commit()
+
+            last_uuid = ""
+            with ThreadPoolExecutor(max_workers=extraction_pool.max_workers) as workers:
+                while True:
+                    with SessionLocal() as session:
+                        projects = session.scalars(
+                            self._stored_projects(regions)
+                            .where(ValuableProject.projectuuid > last_uuid)
+                            .order_by(ValuableProject.projectuuid)
+                            .limit(self.batch_rows)
+                        ).all()
+                        if not projects:
+                            break
+                        last_uuid = projects[-1].projectuuid
+
+                        documents = self._project_documents(session, projects)
+
+                        # 同一文档（或当前解析器版本已解析过的文档）只解析一次
+                        wanted = {sha for shas in documents.values() for sha in shas}
+                        results: Dict[str, Tuple[str, Optional[Dict[str, str]], Optional[str]]] = {}
+                        for sha256 in wanted:
+                            cached = extract_cache.get_entry(session, sha256)
+                            if cached is not None:
+                                results[sha256] = ("ok", *cached)
+                        pending = sorted(wanted - results.keys())
+                        for sha256, result in zip(pending, workers.map(_extract_stored, pending)):
+                            results[sha256] = result
+                            outcome, fields, tier = result
+                            if outcome == "ok":
+                                extract_cache.put(session, sha256, fields, tier=tier)
+
+                        for project in projects:
+                            outcomes = [results[sha] for sha in documents[project.projectuuid]]
+                            counts["processed"] += 1
+                            # 任一文档缺失或解析失败时保持原结果，避免合并出缺字段的数据
+                            if any(outcome == "missing" for outcome, _, _ in outcomes):
+                                counts["missing"] += 1
+                                continue
+                            if any(outcome == "failed" for outcome, _, _ in outcomes):
+                                counts["failed"] += 1
+                                continue
+                            fields = merge_extracted_fields(fields for _, fields, _ in outcomes)
+                            if fields is None:
+                                counts["failed"] += 1
+                                continue
+                            project.pdf_extract_json = json.dumps(fields, ensure_ascii=False)
+                            project.parsed_pdf = True
+                            project.parsed_at = datetime.utcnow()
+                            project.is_invalid = False
+                            upsert_extract_fields(session, project.projectuuid, fields)
+                            index_project(session, project.projectuuid, project.project_name, fields)
+                            counts["updated"] += 1
+                        # 进度与本批结果同一事务提交
+                        self._update(session, job_id, **counts)
+                        session.commit()
+            with SessionLocal() as session:
+                self._update(session, job_id, status="succeeded", finished_at=datetime.utcnow())
+                session.commit()
+            append_log(
+                "INFO",
+                f"重新解析任务 {job_id} 完成：更新 {counts['updated']}，缺失 {counts['missing']}，失败 {counts['failed']}",
+            )
+        except Exception as exc:
+            with SessionLocal() as session:
+                self._update(session, job_id, status="failed", message=str(exc), finished_at=datetime.utcnow())
+                session.commit()
+            append_log("ERROR", f"重新解析任务 {job_id} 失败: {exc}")
+
+    def _prune_jobs(self, session: Session) -> None:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.JOB_RETENTION_SEC)
+        session.execute(delete(ReextractJobRecord).where(ReextractJobRecord.finished_at < cutoff))
+
+
+reextract_jobs = ReextractJobManager()
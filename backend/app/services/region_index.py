@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from ..config import DATA_DIR
+from ..schemas import RegionNode
+
+REGIONS_FILE: Path = DATA_DIR / "regions.json"
+
+_region_list = TypeAdapter(List[RegionNode])
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RegionEntry:
+    code: str
+    name: str
+    parent_id: Optional[str]
+    children: Tuple[str, ...]
+    # 爬虫日志中使用的名称：有上级时为“上级/本级”
+    display_name: str
+
+
+@dataclass(frozen=True)
+class RegionSnapshot:
+    """One parsed version of regions.json: lookups plus the ready-to-send tree response."""
+
+    mtime_ns: int
+    entries: Dict[str, RegionEntry] = field(repr=False)
+    body: bytes = field(repr=False)
+    etag: str = ""
+
+    def display_names(self, codes: Iterable[str]) -> Dict[str, str]:
+        return {code: self.entries[code].display_name if code in self.entries else code for code in codes}
+
+
+def serialize_regions(nodes: List[RegionNode]) -> bytes:
+    # 与 response_model 序列化结果一致（按别名输出 pId）
+    return _region_list.dump_json(nodes, by_alias=True)
+
+
+def _build_snapshot(nodes: List[RegionNode], mtime_ns: int) -> RegionSnapshot:
+    entries: Dict[str, RegionEntry] = {}
+
+    def walk(node: RegionNode, parent: Optional[RegionNode]) -> None:
+        display = node.name
+        if parent is not None and parent.name != node.name:
+            display = f"{parent.name}/{node.name}"
+        entries[node.id] = RegionEntry(
+            code=node.id,
+            name=node.name,
+            parent_id=node.parent_id,
+            children=tuple(child.id for child in node.children),
+            display_name=display,
+        )
+        for child in node.children:
+            walk(child, node)
+
+    for root in nodes:
+        walk(root, None)
+    body = serialize_regions(nodes)
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return RegionSnapshot(mtime_ns=mtime_ns, entries=entries, body=body, etag=etag)
+
+
+class RegionIndex:
+    """Process-wide view of the region tree cached in ``regions.json``.
+
+    The file is parsed once; every access stats it and reloads only when its mtime
+    changed, so edits by another worker (or by hand) are picked up without a restart.
+    Readers get an immutable ``RegionSnapshot``; lookups on it are plain dict accesses.
+    ``on_reload`` is called with each tree loaded from disk (including the first), so
+    state derived from the file can follow edits made outside this process.
+    """
+
+    def __init__(self, path: Path = REGIONS_FILE, on_reload: Optional[Callable[[RegionSnapshot], None]] = None) -> None:
+        self.path = Path(path)
+        self.on_reload = on_reload
+        self._snapshot: Optional[RegionSnapshot] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Optional[RegionSnapshot]:
+        """The current tree, or None if the file is missing or unreadable."""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        current = self._snapshot
+        if current is not None and current.mtime_ns == mtime_ns:
+            return current
+        with self._lock:
+            current = self._snapshot
+            if current is not None and current.mtime_ns == mtime_ns:
+                return current
+            try:
+                payload = json.loads(self.path.read_text(encoding="utf-8"))
+                if not isinstance(payload, list):
+                    return None
+                nodes = _region_list.validate_python(payload)
+            except Exception:
+                # 缓存损坏或不兼容，视为不存在
+                return None
+            snapshot = self._snapshot = _build_snapshot(nodes, mtime_ns)
+        if self.on_reload is not None:
+            try:
+                self.on_reload(snapshot)
+            except Exception:
+                logger.exception("region reload hook failed for %s", self.path)
+        return snapshot
+
+    def replace(self, nodes: List[RegionNode]) -> RegionSnapshot:
+        """Write a freshly fetched tree to disk and swap it in."""
+        data = [node.model_dump() for node in nodes]
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+        with self._lock:
+            self._snapshot = _build_snapshot(nodes, os.stat(self.path).st_mtime_ns)
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+    def get(self, code: str) -> Optional[RegionEntry]:
+        snapshot = self.snapshot()
+        return snapshot.entries.get(code) if snapshot else None
+
+    def display_names(self, codes: Iterable[str]) -> Dict[str, str]:
+        """Code → display name for the crawler logs; unknown codes map to themselves."""
+        codes = list(codes)
+        snapshot = self.snapshot()
+        if snapshot is None:
+            return {code: code for code in codes}
+        return snapshot.display_names(codes)
+
+
+def _write_region_parents(snapshot: RegionSnapshot) -> None:
+    from ..db import session_scope
+    from .region_rollups import sync_region_parents
+
+    try:
+        with session_scope() as session:
+            sync_region_parents(session, snapshot)
+    except Exception:
+        logger.exception("failed to sync region_parents after reloading %s", REGIONS_FILE)
+
+
+def _sync_region_parents(snapshot: RegionSnapshot) -> None:
+    # regions.json 被其他进程或手工修改后，region_parents 与汇总需随之更新。
+    # 另起线程写库：调用方可能正持有读事务，同一线程内等待写锁会一直等到超时
+    threading.Thread(target=_write_region_parents, args=(snapshot,), name="region-parents-sync", daemon=True).start()
+
+
+region_index = RegionIndex(on_reload=_sync_region_parents)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from ..models import RegionParent, RegionRollup
+from ..schemas import RegionRollupNode
+from .region_index import RegionSnapshot
+
+
+def region_parents(snapshot: RegionSnapshot) -> Dict[str, str]:
+    """District → city links; the province above the cities is not part of the tree."""
+    return {
+        code: entry.parent_id
+        for code, entry in snapshot.entries.items()
+        if entry.parent_id and entry.parent_id in snapshot.entries
+    }
+
+
+def sync_region_parents(session: Session, snapshot: RegionSnapshot, rebuild: bool = True) -> bool:
+    """Make region_parents match the region tree; caller commits.
+
+    Returns True if anything changed. The rollups are then rebuilt (unless ``rebuild``
+    is False), since the triggers only see project changes, not a district moving city.
+    """
+    wanted = region_parents(snapshot)
+    current = dict(session.execute(select(RegionParent.region_code, RegionParent.parent_code)).all())
+    if current == wanted:
+        return False
+    session.execute(delete(RegionParent))
+    if wanted:
+        session.execute(
+            insert(RegionParent), [{"region_code": code, "parent_code": parent} for code, parent in wanted.items()]
+        )
+    if rebuild:
+        from ..migrations import rebuild_region_rollups
+
+        rebuild_region_rollups(session)
+    return True
+
+
+def region_rollup_tree(session: Session, snapshot: RegionSnapshot) -> List[RegionRollupNode]:
+    """The region tree annotated with its rollups, read in a single query."""
+    rollups = {row.region_code: row for row in session.scalars(select(RegionRollup))}
+
+    def build(code: str) -> RegionRollupNode:
+        entry = snapshot.entries[code]
+        row = rollups.get(code)
+        node = RegionRollupNode(id=code, name=entry.name, children=[build(child) for child in entry.children])
+        if row is not None:
+            node.all = row.all_count
+            node.parsed = row.parsed_count
+            node.unparsed = row.unparsed_count
+            node.invalid = row.invalid_count
+            # 触发器反复加减浮点数，返回前去掉累积误差
+            node.total_investment = round(row.total_investment, 4)
+        return node
+
+    return [build(code) for code, entry in snapshot.entries.items() if entry.parent_id not in snapshot.entries]
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from ..models import ProjectSearchDoc
+
+
+# FTS5 虚表本身由迁移创建；这里只声明查询需要的列
+SEARCH_TABLE = table("project_search", column("rowid"))
+SEARCH_COLUMNS = ("project_name", "company_name", "legal_representative", "content")
+# bm25 列权重，与 SEARCH_COLUMNS 顺序一致：项目名称最重要
+SEARCH_WEIGHTS = (5.0, 3.0, 3.0, 1.0)
+
+CREATE_SEARCH_TABLE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS project_search USING fts5("
+    + ", ".join(SEARCH_COLUMNS)
+    + ", tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+# 中文连续字符按二元组（bigram）切分后再交给 unicode61 分词器；其余按单词处理
+CJK_PATTERN = re.compile("[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+WORD_PATTERN = re.compile("[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9A-Za-z]+")
+
+
+def _bigrams(run: str) -> List[str]:
+    if len(run) == 1:
+        return [run]
+    return [run[i : i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(value: Optional[str]) -> str:
+    """Turn free text into the space-separated n-gram form stored in the FTS index."""
+    if not value:
+        return ""
+    tokens: List[str] = []
+    for word in WORD_PATTERN.findall(value):
+        if CJK_PATTERN.fullmatch(word):
+            tokens.extend(_bigrams(word))
+        else:
+            tokens.append(word.lower())
+    return " ".join(tokens)
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """Translate user input into an FTS5 MATCH expression; all terms must match.
+
+    A CJK term becomes a phrase of its bigrams (so the characters must be adjacent),
+    a single CJK character or a latin/digit word becomes a prefix query.
+    """
+    clauses: List[str] = []
+    for word in WORD_PATTERN.findall(query or ""):
+        if CJK_PATTERN.fullmatch(word) and len(word) > 1:
+            clauses.append('"' + " ".join(_bigrams(word)) + '"')
+        else:
+            clauses.append(f'"{word.lower()}"*')
+    return " ".join(clauses) or None
+
+
+def _document(project_name: str, extract: Optional[Dict[str, str]]) -> Dict[str, str]:
+    extract = extract or {}
+    return {
+        "project_name": tokenize(project_name),
+        "company_name": tokenize(extract.get("项目（法人）单位")),
+        "legal_representative": tokenize(extract.get("法定代表人")),
+        "content": tokenize(extract.get("建设规模与建设内容（生产能力）")),
+    }
+
+
+def index_project(session: Session, projectuuid: str, project_name: str, extract: Optional[Dict[str, str]] = None) -> None:
+    """Insert or replace the search document for a project; caller commits."""
+    session.execute(
+        insert(ProjectSearchDoc).values(projectuuid=projectuuid).on_conflict_do_nothing(index_elements=["projectuuid"])
+    )
+    docid = session.scalar(select(ProjectSearchDoc.docid).where(ProjectSearchDoc.projectuuid == projectuuid))
+    params = {"docid": docid, **_document(project_name, extract)}
+    session.execute(text("DELETE FROM project_search WHERE rowid = :docid"), {"docid": docid})
+    session.execute(
+        text(
+            f"INSERT INTO project_search (rowid, {', '.join(SEARCH_COLUMNS)}) "
+            f"VALUES (:docid, {', '.join(':' + name for name in SEARCH_COLUMNS)})"
+        ),
+        params,
+    )
+
+
+def index_project_json(session: Session, projectuuid: str, project_name: str, raw_json: Optional[str]) -> None:
+    extract = None
+    if raw_json:
+        try:
+            extract = json.loads(raw_json)
+        except Exception:
+            extract = None
+    index_project(session, projectuuid, project_name, extract if isinstance(extract, dict) else None)
+
+
+def search_matches(match_query: str):
+    """Subquery of (projectuuid, rank) for an FTS5 MATCH; lower rank is more relevant."""
+    fts = literal_column("project_search")
+    rank = func.bm25(fts, *[literal_column(str(weight)) for weight in SEARCH_WEIGHTS])
+    return (
+        select(ProjectSearchDoc.projectuuid.label("projectuuid"), rank.label("rank"))
+        .select_from(SEARCH_TABLE)
+        .join(ProjectSearchDoc, ProjectSearchDoc.docid == SEARCH_TABLE.c.rowid)
+        .where(fts.op("MATCH")(match_query))
+        .subquery("search_matches")
+    )
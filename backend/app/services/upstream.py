@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Optional, TypeVar
+from urllib.error import HTTPError, URLError
+
+from ..config import UPSTREAM_MAX_WORKERS, UPSTREAM_TIMEOUT_SEC
+from ..deadlines import CallBudget, ClientDisconnected, UpstreamTimeout, set_budget
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+T = TypeVar("T")
+
+DISCONNECT_POLL_SEC = 0.5
+
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_MAX_WORKERS, thread_name_prefix="upstream")
+
+
+def _is_socket_timeout(exc: BaseException) -> bool:
+    # 读超时直接抛 TimeoutError；连接超时被 urllib 包成 URLError(reason=timeout)
+    if isinstance(exc, URLError) and not isinstance(exc, HTTPError):
+        return isinstance(exc.reason, TimeoutError)
+    return isinstance(exc, TimeoutError)
+
+
+async def _wait_for_disconnect(request: "Request") -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SEC)
+
+
+async def run_upstream(
+    fn: Callable[..., T],
+    *args,
+    request: Optional["Request"] = None,
+    timeout: float = UPSTREAM_TIMEOUT_SEC,
+) -> T:
+    """Await a blocking upstream call on the dedicated executor.
+
+    Raises UpstreamTimeout after ``timeout`` seconds, or when one of the call's socket
+    operations times out, and ClientDisconnected as soon as ``request``'s client
+    disconnects. The worker thread runs with the same deadline (see app.deadlines): every
+    socket operation opened through ``socket_timeout`` is capped at the time left, and
+    ``check_deadline`` between operations stops a call that was given up on.
+    """
+    loop = asyncio.get_running_loop()
+    budget = CallBudget.starting_now(timeout)
+    context = contextvars.copy_context()
+    context.run(set_budget, budget)
+    call = loop.run_in_executor(_executor, functools.partial(context.run, fn, *args))
+    waiters = {call}
+    watcher = None
+    if request is not None:
+        watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+        waiters.add(watcher)
+    try:
+        done, _ = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        budget.abandon()
+        call.cancel()
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+    if call in done:
+        try:
+            return call.result()
+        except (UpstreamTimeout, ClientDisconnected):
+            raise
+        except Exception as exc:
+            # 截止时间收紧了套接字超时，超时同样按上游超时处理（504），而不是 500
+            if _is_socket_timeout(exc):
+                raise UpstreamTimeout(f"upstream call {getattr(fn, '__name__', fn)} timed out: {exc}") from exc
+            raise
+    budget.abandon(disconnected=watcher is not None and watcher in done)
+    call.cancel()
+    if budget.disconnected:
+        raise ClientDisconnected()
+    raise UpstreamTimeout(f"upstream call {getattr(fn, '__name__', fn)} timed out after {timeout}s")
+
+
+async def aiter_response_chunks(resp, chunk_size: int, timeout: float = UPSTREAM_TIMEOUT_SEC) -> AsyncIterator[bytes]:
+    """Async counterpart of parse_service.iter_response_chunks; each read runs on the upstream executor."""
+    try:
+        while True:
+            chunk = await run_upstream(resp.read, chunk_size, timeout=timeout)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        resp.close()
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,43 @@
+"""Standalone crawler worker: ``python -m app.worker`` (run from ``backend/``).
+
+Takes crawl tasks from the crawl_tasks queue filled by the API and reports status and
+progress back through the database, so the API processes never run crawls themselves
+(start them with ``GOV_STATS_CRAWL_WORKER=external``). Several workers may run at once.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import signal
+
+from .config import CRAWL_WORKER_CONCURRENCY, CRAWL_WORKER_POLL_SEC, STARTUP_BOOTSTRAP
+from .db import SessionLocal
+from .services.crawl_worker import CrawlWorker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run queued crawl tasks.")
+    parser.add_argument("--concurrency", type=int, default=CRAWL_WORKER_CONCURRENCY, help="tasks run at the same time")
+    parser.add_argument("--poll", type=float, default=CRAWL_WORKER_POLL_SEC, help="seconds between queue polls")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if STARTUP_BOOTSTRAP:
+        from .bootstrap import bootstrap
+
+        with SessionLocal() as session:
+            bootstrap(session)
+
+    worker = CrawlWorker(concurrency=args.concurrency, poll_sec=args.poll)
+
+    def _shutdown(signum, _frame) -> None:
+        logging.getLogger(__name__).info("received signal %s, stopping", signum)
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
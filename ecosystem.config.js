@@ -11,7 +11,24 @@ module.exports = {
       watch: false,
       max_memory_restart: '1G',
       env: {
-        NODE_ENV: 'production'
+        NODE_ENV: 'production',
+        GOV_STATS_CRAWL_WORKER: 'external'
+      }
+    },
+    {
+      name: 'gov-crawler-worker',
+      cwd: './backend',
+      script: './venv/bin/python',
+      args: '-m app.worker',
+      interpreter: 'none',
+      instances: 1,
+      autorestart: true,
+      watch: false,
+      max_memory_restart: '1G',
+      kill_timeout: 15000,
+      env: {
+        NODE_ENV: 'production',
+        GOV_STATS_STARTUP_BOOTSTRAP: '0'
       }
     },
     {
@@ -16,4 +16,5 @@ echo "  Backend:  http://60.205.111.170:8010"
 echo
 echo "View logs:"
 echo "  pm2 logs gov-crawler-backend"
+echo "  pm2 logs gov-crawler-worker"
 echo "  pm2 logs gov-crawler-frontend"
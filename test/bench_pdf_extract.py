@@ -0,0 +1,159 @@
+"""Benchmark ``extract_from_pdf`` on the synthetic corpus from ``pdf_corpus.py``.
+
+Run from the repository root:
+
+    python test/bench_pdf_extract.py --copies 25
+    python test/bench_pdf_extract.py --copies 5 --write /tmp/pdf-corpus   # also dump the PDFs
+    python test/bench_pdf_extract.py --table-only                         # baseline without the text tier
+
+For every document type it reports throughput (docs/s), time per page, the peak
+Python heap allocated while extracting a single document, and field-level
+accuracy against the expected values, and how many documents each extractor tier
+(text layer only, or falling back to tables) finished. Timing and memory are measured in separate
+passes because tracemalloc slows extraction down considerably.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from collections import Counter
+from functools import partial
+from typing import Callable, Dict, List, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from app.services.pdf_extractor import extract_with_tier  # noqa: E402
+from pdf_corpus import KINDS, CorpusDocument, build_corpus  # noqa: E402
+
+Extractor = Callable[[bytes], Tuple[Dict[str, str], str]]
+
+
+@dataclass
+class KindStats:
+    kind: str
+    docs: int = 0
+    pages: int = 0
+    seconds: float = 0.0
+    peak_bytes: int = 0
+    fields: int = 0
+    correct: int = 0
+    tiers: Counter = field(default_factory=Counter)
+    mismatches: List[str] = field(default_factory=list)
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.docs / self.seconds if self.seconds else 0.0
+
+    @property
+    def ms_per_page(self) -> float:
+        return self.seconds * 1000 / self.pages if self.pages else 0.0
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.fields if self.fields else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "docs": self.docs,
+            "pages": self.pages,
+            "docs_per_sec": round(self.docs_per_sec, 2),
+            "ms_per_page": round(self.ms_per_page, 2),
+            "peak_kib": round(self.peak_bytes / 1024, 1),
+            "accuracy": round(self.accuracy, 4),
+            "tiers": dict(self.tiers),
+            "mismatches": self.mismatches,
+        }
+
+
+def compare(doc: CorpusDocument, result: Dict[str, str]) -> List[str]:
+    """Field names whose extracted value differs from the expected one."""
+    return [name for name, value in doc.expected.items() if result.get(name, "") != value]
+
+
+def run_benchmark(
+    corpus: Sequence[CorpusDocument], extract: Extractor = extract_with_tier, measure_memory: bool = True
+) -> List[KindStats]:
+    stats: Dict[str, KindStats] = {}
+    if corpus:
+        extract(corpus[0].data)  # 预热：首次调用才会导入 pdfplumber / pdfminer
+    for doc in corpus:
+        entry = stats.setdefault(doc.kind, KindStats(doc.kind))
+        start = time.perf_counter()
+        result, tier = extract(doc.data)
+        entry.seconds += time.perf_counter() - start
+        entry.docs += 1
+        entry.pages += doc.pages
+        entry.tiers[tier] += 1
+        wrong = compare(doc, result)
+        entry.fields += len(doc.expected)
+        entry.correct += len(doc.expected) - len(wrong)
+        entry.mismatches.extend(f"{doc.name}:{name}" for name in wrong)
+
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            for doc in corpus:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                extract(doc.data)
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+                stats[doc.kind].peak_bytes = max(stats[doc.kind].peak_bytes, peak)
+        finally:
+            tracemalloc.stop()
+    return list(stats.values())
+
+
+def write_corpus(corpus: Sequence[CorpusDocument], target: Path) -> None:
+    """Dump each document as ``<name>.pdf`` next to its expected fields in ``<name>.json``."""
+    target.mkdir(parents=True, exist_ok=True)
+    for doc in corpus:
+        (target / f"{doc.name}.pdf").write_bytes(doc.data)
+        (target / f"{doc.name}.json").write_text(
+            json.dumps(doc.expected, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+
+def print_table(stats: Sequence[KindStats]) -> None:
+    print(f"{'kind':<16}{'docs':>6}{'pages':>7}{'docs/s':>9}{'ms/page':>9}{'peak KiB':>10}{'accuracy':>10}  tiers")
+    for entry in stats:
+        print(
+            f"{entry.kind:<16}{entry.docs:>6}{entry.pages:>7}{entry.docs_per_sec:>9.1f}"
+            f"{entry.ms_per_page:>9.2f}{entry.peak_bytes / 1024:>10.1f}{entry.accuracy:>10.2%}  "
+            + " ".join(f"{tier}={count}" for tier, count in sorted(entry.tiers.items()))
+        )
+        for mismatch in entry.mismatches[:5]:
+            print(f"    mismatch {mismatch}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--copies", type=int, default=10, help="documents generated per type")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--seed", type=int, default=20240101)
+    parser.add_argument("--write", type=Path, help="also write the corpus (PDF + expected JSON) here")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--table-only", action="store_true", help="skip the text tier (baseline)")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.copies, args.kinds, args.seed)
+    if args.write:
+        write_corpus(corpus, args.write)
+    extract = partial(extract_with_tier, text_tier=not args.table_only)
+    stats = run_benchmark(corpus, extract, measure_memory=not args.no_memory)
+    if args.json:
+        print(json.dumps([entry.to_dict() for entry in stats], ensure_ascii=False, indent=2))
+    else:
+        print_table(stats)
+    return 0 if all(entry.accuracy == 1.0 for entry in stats) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Benchmark API startup: time to import ``app.main`` and time until the lifespan is ready.
+
+Run from the repository root:
+
+    python test/bench_startup.py --runs 5
+    python test/bench_startup.py --top 15        # also list the slowest imports (python -X importtime)
+
+Every run is a fresh interpreter pointed at a throwaway data directory. Two scenarios
+are measured: ``fresh`` (empty database: tables, migrations and the admin seed are
+created) and ``current`` (schema already at the latest version, the normal restart).
+``import`` is the cost of ``import app.main``; ``ready`` adds the lifespan startup,
+i.e. when uvicorn would start accepting requests.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parents[1] / "backend"
+SCENARIOS = ("fresh", "current")
+
+# 子进程内执行：分别计时 import 与 lifespan 启动，结果以 JSON 输出到最后一行
+_PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def _startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(_startup())
+print(json.dumps({"import": imported - start, "ready": ready - start, "modules": len(sys.modules)}))
+"""
+
+
+@dataclass
+class ScenarioStats:
+    scenario: str
+    import_sec: List[float] = field(default_factory=list)
+    ready_sec: List[float] = field(default_factory=list)
+    modules: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "scenario": self.scenario,
+            "runs": len(self.ready_sec),
+            "import_ms": round(statistics.median(self.import_sec) * 1000, 1),
+            "ready_ms": round(statistics.median(self.ready_sec) * 1000, 1),
+            "modules": self.modules,
+        }
+
+
+def _env(data_dir: Path) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["GOV_STATS_DATA_DIR"] = str(data_dir)
+    env["GOV_STATS_DATABASE_URL"] = f"sqlite:///{(data_dir / 'app.db').as_posix()}"
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def probe(data_dir: Path, extra_args: Sequence[str] = ()) -> Tuple[dict, str]:
+    """Start one interpreter; returns its timings and whatever it wrote to stderr."""
+    proc = subprocess.run(
+        [sys.executable, *extra_args, "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        env=_env(data_dir),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def run_benchmark(runs: int = 3, scenarios: Sequence[str] = SCENARIOS) -> List[ScenarioStats]:
+    results: List[ScenarioStats] = []
+    for scenario in scenarios:
+        stats = ScenarioStats(scenario)
+        with tempfile.TemporaryDirectory(prefix="gov-stats-startup-") as tmp:
+            if scenario == "current":
+                probe(Path(tmp))  # 先建好库，之后的每次启动都是“已是最新版本”
+            for index in range(runs):
+                data_dir = Path(tmp)
+                if scenario == "fresh":
+                    data_dir = Path(tmp) / f"run-{index}"
+                    data_dir.mkdir()
+                timing, _ = probe(data_dir)
+                stats.import_sec.append(timing["import"])
+                stats.ready_sec.append(timing["ready"])
+                stats.modules = timing["modules"]
+        results.append(stats)
+    return results
+
+
+def slowest_imports(limit: int) -> List[Tuple[int, str]]:
+    """Top-level packages by cumulative import time (microseconds) for ``import app.main``."""
+    with tempfile.TemporaryDirectory(prefix="gov-stats-startup-") as tmp:
+        _, stderr = probe(Path(tmp), ["-X", "importtime"])
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        name = name.strip()
+        # 只看顶层包（其累计时间已包含子模块与它拉进来的依赖）；每个包只会首次导入一次
+        if "." not in name:
+            totals[name] = int(cumulative)
+    return sorted(((us, pkg) for pkg, us in totals.items()), reverse=True)[:limit]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="interpreter starts per scenario (median reported)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest top-level imports")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    stats = [entry.to_dict() for entry in run_benchmark(args.runs, args.scenarios)]
+    top = slowest_imports(args.top) if args.top else []
+    if args.json:
+        print(json.dumps({"scenarios": stats, "slowest_imports": top}, ensure_ascii=False, indent=2))
+        return 0
+    print(f"{'scenario':<10}{'runs':>6}{'import ms':>11}{'ready ms':>10}{'modules':>9}")
+    for entry in stats:
+        print(
+            f"{entry['scenario']:<10}{entry['runs']:>6}{entry['import_ms']:>11.1f}"
+            f"{entry['ready_ms']:>10.1f}{entry['modules']:>9}"
+        )
+    if top:
+        print("\nslowest imports (cumulative ms):")
+        for micros, name in top:
+            print(f"  {micros / 1000:>8.1f}  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
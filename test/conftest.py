@@ -0,0 +1,27 @@
+"""Shared setup for the backend tests: an isolated data dir and a migrated SQLite database."""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_TMP_DIR = tempfile.mkdtemp(prefix="gov-stats-test-")
+os.environ["GOV_STATS_DATA_DIR"] = _TMP_DIR
+os.environ["GOV_STATS_DATABASE_URL"] = f"sqlite:///{Path(_TMP_DIR, 'app.db').as_posix()}"
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
+
+from app.db import Base, SessionLocal, engine  # noqa: E402
+from app import models  # noqa: E402,F401
+from app.migrations import ensure_migrations  # noqa: E402
+
+Base.metadata.create_all(bind=engine)
+with SessionLocal() as _session:
+    ensure_migrations(_session)
+
+
+def wait_for(predicate, timeout: float = 5.0) -> None:
+    """Poll ``predicate`` until it holds; for tests driving background threads."""
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline, "timed out waiting for background work"
+        time.sleep(0.01)
@@ -0,0 +1,308 @@
+"""Synthetic 备案/核准 PDFs for the extractor benchmark and regression tests.
+
+The documents are written by hand (no PDF library needed): every table cell is a
+line-bordered box with its text drawn in the built-in STSong-Light CJK font, which
+is how the announcement site's forms come out of pdfplumber as well. Each document
+carries the field values ``extract_from_pdf`` is expected to return for it.
+
+Variants:
+
+* ``single_page``     — the whole form on one page, followed by the declaration.
+* ``multi_page``      — the form split over three pages, the last ending with the
+                        declaration, then a trailing page that must never be read.
+* ``missing_section`` — no 投资情况 / 资金来源 tables; 总投资 falls back to the
+                        固定投资 amount mentioned in the 建设规模 text.
+* ``malformed``       — a line-less cover page, rows with blank and padded cells,
+                        placeholder (non-numeric) amounts and unrelated rows.
+* ``wrapped_label``   — the 项目联系人姓名 label wraps onto a second line in a cell
+                        two rows tall, so each half of it falls into a different
+                        row band of the text tier; only the table pass reads it.
+"""
+from __future__ import annotations
+
+import random
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+TABLE_LEFT = 40
+TABLE_WIDTH = 516
+ROW_HEIGHT = 22
+FONT_SIZE = 9
+
+KINDS = ("single_page", "multi_page", "missing_section", "malformed", "wrapped_label")
+
+INVEST_LABELS = ["合计", "土建工程", "设备购置费", "安装工程", "工程建设其他费用", "预备费", "建设期利息", "铺底流动资金"]
+INVEST_FIELDS = ["总投资", "土建工程", "设备购置费", "安装工程", "工程建设其他费用", "预备费", "建设期利息", "铺底流动资金"]
+FUND_LABELS = ["合计", "财政性资金", "自有资金（非财政性资金）", "银行贷款", "其它"]
+FUND_FIELDS = [None, "财政性资金", "自有资金（非财政性资金）", "银行贷款", "其它"]
+
+Row = Sequence[str]
+
+
+@dataclass
+class CorpusDocument:
+    name: str
+    kind: str
+    pages: int
+    data: bytes
+    expected: Dict[str, str] = field(default_factory=dict)
+
+
+def _hex(text: str) -> str:
+    return "<" + text.encode("utf-16-be").hex().upper() + ">"
+
+
+def _text(ops: List[str], x: float, y: float, text: str, size: float = FONT_SIZE) -> None:
+    ops.append(f"BT /F1 {size:.1f} Tf {x:.1f} {y:.1f} Td {_hex(text)} Tj ET")
+
+
+def _line(ops: List[str], x1: float, y1: float, x2: float, y2: float) -> None:
+    ops.append(f"{x1:.1f} {y1:.1f} m {x2:.1f} {y2:.1f} l S")
+
+
+def _table(ops: List[str], top: float, rows: Sequence[Row]) -> float:
+    """Draw ``rows`` as a bordered table; each row splits the width evenly. Returns the bottom y."""
+    y = top
+    _line(ops, TABLE_LEFT, y, TABLE_LEFT + TABLE_WIDTH, y)
+    for cells in rows:
+        bottom = y - ROW_HEIGHT
+        _line(ops, TABLE_LEFT, bottom, TABLE_LEFT + TABLE_WIDTH, bottom)
+        width = TABLE_WIDTH / len(cells)
+        for idx, cell in enumerate(cells):
+            x = TABLE_LEFT + idx * width
+            _line(ops, x, y, x, bottom)
+            if cell:
+                # 单元格较窄时缩小字号，保证文字完整落在格内
+                size = min(FONT_SIZE, (width - 6) / len(cell))
+                _text(ops, x + 3, bottom + 7, cell, size)
+        y = bottom
+    _line(ops, TABLE_LEFT + TABLE_WIDTH, top, TABLE_LEFT + TABLE_WIDTH, y)
+    return y
+
+
+def render_pdf(pages: Sequence[Sequence[str]]) -> bytes:
+    """Serialise pages of content-stream operators into a minimal PDF."""
+    objects: List[Optional[bytes]] = []
+
+    def add(body: Optional[bytes]) -> int:
+        objects.append(body)
+        return len(objects)
+
+    font, descriptor, cid_font, pages_id = add(None), add(None), add(None), add(None)
+    objects[font - 1] = (
+        "<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /UniGB-UTF16-H "
+        f"/DescendantFonts [{cid_font} 0 R] >>"
+    ).encode()
+    objects[cid_font - 1] = (
+        "<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> "
+        f"/FontDescriptor {descriptor} 0 R /DW 1000 >>"
+    ).encode()
+    objects[descriptor - 1] = (
+        b"<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] "
+        b"/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>"
+    )
+    kids = []
+    for ops in pages:
+        # 内容流末尾必须有换行，否则 pdfminer 会丢掉最后一个操作符
+        stream = zlib.compress(("\n".join(ops) + "\n").encode("latin-1"))
+        contents = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(
+            add(
+                (
+                    f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                    f"/Resources << /Font << /F1 {font} 0 R >> >> /Contents {contents} 0 R >>"
+                ).encode()
+            )
+        )
+    objects[pages_id - 1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+    ).encode()
+    catalog = add(f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode())
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def _page_ops(groups: Sequence[Sequence[Row]]) -> List[str]:
+    """One page holding the row groups as a single continuous table, like the real forms."""
+    ops: List[str] = []
+    _table(ops, PAGE_HEIGHT - 42, [row for rows in groups for row in rows])
+    return ops
+
+
+def _tables_pdf(pages: Sequence[Sequence[Sequence[Row]]]) -> bytes:
+    return render_pdf([_page_ops(groups) for groups in pages])
+
+
+def _empty_expected() -> Dict[str, str]:
+    from app.services.pdf_extractor import FIELD_NAMES
+
+    return {name: "" for name in FIELD_NAMES}
+
+
+def _amount(rng: random.Random, low: int, high: int) -> str:
+    return str(rng.randint(low, high))
+
+
+def _sample(rng: random.Random, index: int) -> Dict[str, str]:
+    """Random but self-consistent field values for one project."""
+    invest = {name: _amount(rng, 10, 900) for name in INVEST_FIELDS[1:]}
+    invest["总投资"] = str(sum(int(v) for v in invest.values()))
+    total = int(invest["总投资"])
+    bank = rng.randint(0, total // 2)
+    fiscal = rng.choice([0, rng.randint(0, total // 4)])
+    other = rng.randint(0, 50)
+    funds = {
+        "财政性资金": str(fiscal),
+        "银行贷款": str(bank),
+        "其它": str(other),
+        "自有资金（非财政性资金）": str(max(0, total - bank - fiscal - other)),
+    }
+    year = rng.randint(2019, 2025)
+    values = {
+        "项目名称": f"年产{rng.randint(1, 90)}万件零部件建设项目{index}",
+        "项目类型": rng.choice(["基本建设", "技术改造"]),
+        "建设性质": rng.choice(["新建", "扩建", "改建"]),
+        "拟开工时间": f"{year}-{rng.randint(1, 12):02d}",
+        "拟建成时间": f"{year + rng.randint(1, 3)}-{rng.randint(1, 12):02d}",
+        "建设规模与建设内容（生产能力）": f"新建厂房{rng.randint(2, 40)}千平方米，固定投资{invest['总投资']}万元",
+        "项目联系人姓名": rng.choice(["张伟", "王芳", "李娜", "刘洋"]),
+        "项目联系人手机": f"13{rng.randint(100000000, 999999999)}",
+        "固定投资": invest["总投资"],
+        "项目（法人）单位": f"浙江某某{rng.choice(['科技', '机械', '新材料'])}有限公司",
+        "成立日期": f"{rng.randint(1995, 2018)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "法定代表人": rng.choice(["陈刚", "周敏", "吴磊"]),
+        "法定代表人手机号码": f"15{rng.randint(100000000, 999999999)}",
+    }
+    values.update(invest)
+    values.update(funds)
+    return values
+
+
+def _basic_rows(v: Dict[str, str]) -> List[Row]:
+    return [
+        ["项目名称", v["项目名称"]],
+        ["项目类型", v["项目类型"], "建设性质", v["建设性质"]],
+        ["拟开工时间", v["拟开工时间"], "拟建成时间", v["拟建成时间"]],
+        ["建设规模与建设内容（生产能力）", v["建设规模与建设内容（生产能力）"]],
+        ["项目联系人姓名", v["项目联系人姓名"], "项目联系人手机", v["项目联系人手机"]],
+    ]
+
+
+def _invest_rows(v: Dict[str, str]) -> List[Row]:
+    return [["项目投资情况（万元）"], INVEST_LABELS, [v[name] for name in INVEST_FIELDS]]
+
+
+def _fund_rows(v: Dict[str, str]) -> List[Row]:
+    return [["资金来源（万元）"], FUND_LABELS, [v["总投资"]] + [v[name] for name in FUND_FIELDS[1:]]]
+
+
+def _unit_rows(v: Dict[str, str]) -> List[Row]:
+    return [
+        ["项目单位基本情况"],
+        ["项目（法人）单位", v["项目（法人）单位"], "成立日期", v["成立日期"]],
+        ["法定代表人", v["法定代表人"], "法定代表人手机号码", v["法定代表人手机号码"]],
+    ]
+
+
+DECLARATION = [["项目单位声明", "本单位承诺所填报信息真实有效"]]
+# 声明之后的页面不应被读取；这里故意放一个会覆盖字段的值
+AFTER_DECLARATION = [["法定代表人", "不应读取"], ["项目名称", "不应读取"]]
+
+
+def _single_page(v: Dict[str, str]) -> CorpusDocument:
+    rows = _basic_rows(v) + _invest_rows(v) + _fund_rows(v) + _unit_rows(v)
+    return CorpusDocument("", "single_page", 1, _tables_pdf([[rows, DECLARATION]]), dict(v))
+
+
+def _multi_page(v: Dict[str, str]) -> CorpusDocument:
+    pages = [
+        [_basic_rows(v)],
+        [_invest_rows(v), _fund_rows(v)],
+        [_unit_rows(v), DECLARATION],
+        [AFTER_DECLARATION],
+    ]
+    return CorpusDocument("", "multi_page", len(pages), _tables_pdf(pages), dict(v))
+
+
+def _missing_section(v: Dict[str, str]) -> CorpusDocument:
+    pages = [[_basic_rows(v)], [_unit_rows(v), DECLARATION]]
+    expected = _empty_expected()
+    for name in expected:
+        if name in v and name not in INVEST_FIELDS and name not in FUND_FIELDS:
+            expected[name] = v[name]
+    expected["总投资"] = v["固定投资"]
+    return CorpusDocument("", "missing_section", len(pages), _tables_pdf(pages), expected)
+
+
+def _malformed(v: Dict[str, str]) -> CorpusDocument:
+    cover: List[str] = []
+    _text(cover, TABLE_LEFT, PAGE_HEIGHT - 80, "浙江省企业投资项目备案（赋码）信息表", 14)
+    _text(cover, TABLE_LEFT, PAGE_HEIGHT - 110, "项目名称 " + v["项目名称"])
+
+    basic = _basic_rows(v)
+    basic.insert(1, ["", ""])  # 空白行
+    basic[2] = ["项目类型", v["项目类型"], "", "建设性质", v["建设性质"], ""]  # 多出来的空单元格
+    invest = _invest_rows(v)
+    invest[2] = [v["总投资"]] + ["—"] * (len(INVEST_FIELDS) - 1)  # 分项金额未填写
+    fund = _fund_rows(v)
+    unrelated = [["附件清单", "备注"], ["营业执照", "已上传"]]
+    pages = [[basic, invest, fund], [unrelated, _unit_rows(v), DECLARATION]]
+    expected = dict(v)
+    for name in INVEST_FIELDS[1:]:
+        expected[name] = ""
+    return CorpusDocument("", "malformed", 3, render_pdf([cover] + [_page_ops(groups) for groups in pages]), expected)
+
+
+def _wrapped_label(v: Dict[str, str]) -> CorpusDocument:
+    basic = _basic_rows(v)
+    contact = basic.pop(4)
+    ops: List[str] = []
+    y = _table(ops, PAGE_HEIGHT - 42, basic)
+    # 标签单元格占两行高，右侧拆成上下两格：联系人姓名与一个空白的备注格
+    middle, bottom = y - ROW_HEIGHT, y - 2 * ROW_HEIGHT
+    split = TABLE_LEFT + TABLE_WIDTH / 2
+    for x in (TABLE_LEFT, split, TABLE_LEFT + TABLE_WIDTH):
+        _line(ops, x, y, x, bottom)
+    _line(ops, split, middle, TABLE_LEFT + TABLE_WIDTH, middle)
+    _line(ops, TABLE_LEFT, bottom, TABLE_LEFT + TABLE_WIDTH, bottom)
+    _text(ops, TABLE_LEFT + 3, middle + 7, contact[0][:5])
+    _text(ops, TABLE_LEFT + 3, bottom + 7, contact[0][5:])
+    _text(ops, split + 3, middle + 7, contact[1])
+    rest = [[contact[2], contact[3]]] + _invest_rows(v) + _fund_rows(v) + _unit_rows(v) + DECLARATION
+    _table(ops, bottom, rest)
+    return CorpusDocument("", "wrapped_label", 1, render_pdf([ops]), dict(v))
+
+
+BUILDERS = {
+    "single_page": _single_page,
+    "multi_page": _multi_page,
+    "missing_section": _missing_section,
+    "malformed": _malformed,
+    "wrapped_label": _wrapped_label,
+}
+
+
+def build_corpus(copies: int = 1, kinds: Sequence[str] = KINDS, seed: int = 20240101) -> List[CorpusDocument]:
+    """``copies`` documents of every kind, with deterministic field values."""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(copies):
+        for kind in kinds:
+            doc = BUILDERS[kind](_sample(rng, index))
+            doc.name = f"{kind}-{index:03d}"
+            corpus.append(doc)
+    return corpus
@@ -0,0 +1,119 @@
+"""get_current_user serves repeat requests from the user cache and honours invalidation."""
+import time
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import event, update
+
+from app.api.routes import auth as auth_routes
+from app.api.routes import users as users_routes
+from app.auth import create_user_token, get_current_user, get_password_hash, user_cache
+from app.db import SessionLocal, engine
+from app.models import User
+from app.schemas import ChangePasswordRequest, ResetPasswordRequest, UpdateUserRequest
+
+
+@pytest.fixture()
+def operator():
+    user_cache.clear()
+    with SessionLocal() as session:
+        user = User(username="cache-op", password_hash=get_password_hash("pw-1"), role="user", is_active=True)
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        yield session, user
+        session.delete(session.get(User, user.id))
+        session.commit()
+    user_cache.clear()
+
+
+def _count_user_queries(match: str = "FROM users"):
+    seen = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if match in statement:
+            seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    return seen, lambda: event.remove(engine, "before_cursor_execute", before_execute)
+
+
+def test_repeat_requests_skip_the_users_query(operator) -> None:
+    session, user = operator
+    token = create_user_token(user)
+    queries, stop = _count_user_queries()
+    try:
+        first = get_current_user(token=token, db=session)
+        for _ in range(5):
+            cached = get_current_user(token=token, db=session)
+    finally:
+        stop()
+    assert len(queries) == 1
+    assert (cached.id, cached.username, cached.role) == (first.id, first.username, first.role)
+
+
+def test_requests_inside_the_stamp_window_run_no_sql(operator) -> None:
+    session, user = operator
+    token = create_user_token(user)
+    get_current_user(token=token, db=session)
+    statements, stop = _count_user_queries(match="")
+    try:
+        for _ in range(5):
+            with SessionLocal() as request_db:
+                get_current_user(token=token, db=request_db)
+    finally:
+        stop()
+    assert statements == []
+
+
+def test_disable_and_reset_take_effect_immediately(operator) -> None:
+    session, user = operator
+    token = create_user_token(user)
+    get_current_user(token=token, db=session)
+
+    users_routes.update_user(user.id, UpdateUserRequest(is_active=False), db=session, _=None)
+    with pytest.raises(HTTPException) as disabled:
+        get_current_user(token=token, db=session)
+    assert disabled.value.status_code == 403
+
+    users_routes.update_user(user.id, UpdateUserRequest(is_active=True), db=session, _=None)
+    get_current_user(token=token, db=session)
+    users_routes.reset_user_password(user.id, ResetPasswordRequest(new_password="pw-2"), db=session, _=None)
+    with pytest.raises(HTTPException) as revoked:
+        get_current_user(token=token, db=session)
+    assert revoked.value.status_code == 401
+
+
+def test_change_password_reissues_the_token(operator) -> None:
+    session, user = operator
+    old_token = create_user_token(user)
+    current = get_current_user(token=old_token, db=session)
+    current = get_current_user(token=old_token, db=session)  # 缓存命中，未绑定会话的对象
+
+    response = Response()
+    auth_routes.change_password(
+        ChangePasswordRequest(old_password="pw-1", new_password="pw-3"), response, current_user=current, db=session
+    )
+    with pytest.raises(HTTPException):
+        get_current_user(token=old_token, db=session)
+    new_token = response.headers["set-cookie"].split("access_token=", 1)[1].split(";", 1)[0]
+    assert get_current_user(token=new_token, db=session).username == "cache-op"
+
+
+def test_changes_from_another_process_are_seen_after_the_stamp_window(operator, monkeypatch) -> None:
+    session, user = operator
+    monkeypatch.setattr(user_cache, "stamp_check_sec", 0.2)
+    token = create_user_token(user)
+    get_current_user(token=token, db=session)
+
+    # 另一个 API 进程直接改库：本进程的缓存没有被显式失效
+    with SessionLocal() as other:
+        other.execute(update(User).where(User.id == user.id).values(is_active=False))
+        other.commit()
+    with SessionLocal() as request_db:
+        # 窗口内仍使用缓存
+        assert get_current_user(token=token, db=request_db).is_active
+    time.sleep(0.25)
+    with SessionLocal() as request_db, pytest.raises(HTTPException) as disabled:
+        get_current_user(token=token, db=request_db)
+    assert disabled.value.status_code == 403
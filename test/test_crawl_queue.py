@@ -0,0 +1,151 @@
+"""crawl_tasks queue: atomic claims, cancellation and the crawler worker, with the crawl itself stubbed."""
+import threading
+import time
+
+from sqlalchemy import delete, update
+
+from app.db import SessionLocal
+from app.models import CrawlRun, CrawlTask
+from app.services.crawl_queue import claim_task, expire_tasks, heartbeat
+from app.services.crawl_worker import CrawlWorker
+from app.services.task_manager import TaskManager
+from conftest import wait_for
+
+REGION = "339961"
+
+
+
+def _clear_queue() -> None:
+    with SessionLocal() as session:
+        session.execute(delete(CrawlTask))
+        session.commit()
+
+
+class FakeCrawler:
+    """Counts items until ``should_stop`` or ``items`` is reached; ``release`` lets it finish."""
+
+    def __init__(self, items: int = 3, block: bool = False, ignore_stop: bool = False) -> None:
+        self.items = items
+        self.ignore_stop = ignore_stop
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+        self.runs = []
+
+    def run_task(self, session, mode, regions, *, run_id, should_stop, exclude_keywords, stats):
+        self.runs.append((mode, list(regions), run_id, exclude_keywords))
+        for _ in range(self.items):
+            stats.total_items += 1
+            stats.valuable_projects += 1
+        while not self.release.is_set() and (self.ignore_stop or not should_stop()):
+            time.sleep(0.01)
+        run = CrawlRun(id=run_id, mode=mode, regions_json="[]")
+        session.merge(run)
+        return run
+
+
+def test_claim_hands_each_task_to_one_worker() -> None:
+    _clear_queue()
+    manager = TaskManager()
+    first = manager.submit("incremental", [REGION], "光伏")
+    second = manager.submit("history", [REGION])
+
+    with SessionLocal() as session:
+        a = claim_task(session, "worker-a")
+        b = claim_task(session, "worker-b")
+        assert claim_task(session, "worker-c") is None
+        session.commit()
+    assert (a.task_id, b.task_id) == (first, second)
+    assert a.regions == [REGION] and a.exclude_keywords == "光伏"
+
+    status = manager.get_status(first)
+    assert status.status == "running" and status.run_id == a.run_id
+    assert [s.task_id for s in manager.list_status(open_only=True)] == [second, first]
+
+    with SessionLocal() as session:
+        assert heartbeat(session, first, "worker-b", 5, 1) is None  # 不是持有者
+        assert heartbeat(session, first, "worker-a", 5, 1) is False
+        session.commit()
+    assert manager.cancel(first)
+    with SessionLocal() as session:
+        assert heartbeat(session, first, "worker-a", 6, 1) is True
+        session.commit()
+    assert manager.get_status(first).total_items == 6
+
+
+def test_pending_cancel_and_expired_lease() -> None:
+    _clear_queue()
+    manager = TaskManager()
+    queued = manager.submit("incremental", [REGION])
+    assert manager.cancel(queued)
+    assert manager.get_status(queued).status == "cancelled"
+    assert not manager.cancel("missing")
+
+    running = manager.submit("incremental", [REGION])
+    with SessionLocal() as session:
+        claim_task(session, "worker-a", ttl_sec=60)
+        session.execute(update(CrawlTask).where(CrawlTask.id == running).values(lease_expires_at=time.time() - 1))
+        assert expire_tasks(session) == 1
+        session.commit()
+    status = manager.get_status(running)
+    assert status.status == "failed" and status.finished_at is not None
+
+
+def test_worker_runs_and_cancels_tasks() -> None:
+    _clear_queue()
+    manager = TaskManager()
+    crawler = FakeCrawler(items=4, block=True)
+    worker = CrawlWorker(concurrency=1, poll_sec=0.02, crawler=crawler, name="test-worker")
+    worker.start()
+    try:
+        blocked = manager.submit("history", [REGION])
+        queued = manager.submit("incremental", [REGION])
+        wait_for(lambda: manager.get_status(blocked).total_items == 4)
+        assert manager.get_status(queued).status == "pending"  # concurrency=1
+
+        manager.cancel(blocked)
+        wait_for(lambda: manager.get_status(blocked).status == "cancelled")
+        crawler.release.set()
+        wait_for(lambda: manager.get_status(queued).status == "succeeded")
+        done = manager.get_status(queued)
+        assert done.valuable_projects == 4 and done.finished_at is not None
+        assert [run[0] for run in crawler.runs] == ["history", "incremental"]
+    finally:
+        worker.stop(timeout=5)
+
+
+def test_stopping_worker_requeues_running_task() -> None:
+    _clear_queue()
+    manager = TaskManager()
+    crawler = FakeCrawler(block=True)
+    worker = CrawlWorker(concurrency=1, poll_sec=0.02, crawler=crawler, name="test-worker")
+    worker.start()
+    task_id = manager.submit("incremental", [REGION])
+    wait_for(lambda: manager.get_status(task_id).status == "running")
+    worker.stop(timeout=5)
+    assert manager.get_status(task_id).status == "pending"
+
+    with SessionLocal() as session:
+        claimed = claim_task(session, "worker-b")
+        session.commit()
+    assert claimed.task_id == task_id and claimed.run_id != crawler.runs[0][2]
+
+
+def test_stop_hands_back_a_task_that_ignores_the_stop_request() -> None:
+    _clear_queue()
+    manager = TaskManager()
+    crawler = FakeCrawler(block=True, ignore_stop=True)
+    worker = CrawlWorker(concurrency=1, poll_sec=0.02, crawler=crawler, name="test-worker", stop_timeout_sec=0.2)
+    worker.start()
+    task_id = manager.submit("incremental", [REGION])
+    wait_for(lambda: manager.get_status(task_id).status == "running")
+
+    started = time.time()
+    worker.stop()
+    # 爬取线程仍在运行，但任务已在 stop() 返回前交还队列，进程此刻被杀也不会卡在 running
+    assert time.time() - started < 5
+    assert manager.get_status(task_id).status == "pending"
+
+    crawler.release.set()
+    wait_for(lambda: worker.active_count() == 0)
+    assert manager.get_status(task_id).status == "pending"
@@ -0,0 +1,136 @@
+"""Background export jobs: the on-disk artifact cache, LRU eviction and the progress stream."""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from app.api.routes import projects as projects_routes
+from app.db import SessionLocal
+from app.models import ValuableProject
+from app.services import export_jobs as jobs_module
+from conftest import wait_for
+
+REGION = "339971"
+
+
+def _seed(count: int = 3) -> None:
+    base = datetime(2024, 3, 1)
+    with SessionLocal() as session:
+        for idx in range(count):
+            session.merge(
+                ValuableProject(
+                    projectuuid=f"export-job-{idx:03d}",
+                    project_name=f"导出任务项目{idx}",
+                    region_code=REGION,
+                    discovered_at=base + timedelta(minutes=idx),
+                )
+            )
+        session.commit()
+
+
+def _counting_writes(monkeypatch) -> list:
+    calls = []
+    write_export = jobs_module.write_export
+
+    def counted(fmt, path, selected=None, on_row=None):
+        calls.append(fmt)
+        return write_export(fmt, path, selected, on_row=on_row)
+
+    monkeypatch.setattr(jobs_module, "write_export", counted)
+    return calls
+
+
+def test_unchanged_data_is_served_from_the_cache(tmp_path, monkeypatch) -> None:
+    _seed()
+    writes = _counting_writes(monkeypatch)
+    manager = jobs_module.ExportJobManager(cache_dir=tmp_path, max_bytes=1 << 30)
+    job = manager.submit("csv", [REGION])
+    wait_for(lambda: manager.get(job.job_id).status == "succeeded")
+    done = manager.get(job.job_id)
+    assert done.rows_written == done.total_rows == 3 and not done.cached
+
+    # 另一个进程（这里是另一个 manager）按同一个缓存键找到同一个任务和文件
+    again = jobs_module.ExportJobManager(cache_dir=tmp_path, max_bytes=1 << 30).submit("csv", [REGION])
+    assert again.job_id == job.job_id and again.status == "succeeded" and again.cached
+    assert writes == ["csv"]
+
+
+def test_a_write_invalidates_the_cached_export(tmp_path, monkeypatch) -> None:
+    _seed()
+    writes = _counting_writes(monkeypatch)
+    manager = jobs_module.ExportJobManager(cache_dir=tmp_path, max_bytes=1 << 30)
+    first = manager.submit("csv", [REGION])
+    wait_for(lambda: manager.get(first.job_id).status == "succeeded")
+
+    with SessionLocal() as session:
+        session.get(ValuableProject, "export-job-000").project_name = "改名后的项目"
+        session.commit()
+
+    second = manager.submit("csv", [REGION])
+    assert second.job_id != first.job_id and not second.cached
+    wait_for(lambda: manager.get(second.job_id).status == "succeeded")
+    assert writes == ["csv", "csv"]
+    assert "改名后的项目" in second.path.read_text(encoding="utf-8-sig")
+
+
+def test_running_export_is_shared_instead_of_restarted(tmp_path, monkeypatch) -> None:
+    _seed()
+    manager = jobs_module.ExportJobManager(cache_dir=tmp_path, max_bytes=1 << 30)
+    other = jobs_module.ExportJobManager(cache_dir=tmp_path, max_bytes=1 << 30)
+    started = []
+    monkeypatch.setattr(other, "_run", lambda job: started.append(job.job_id))
+
+    job = other.submit("xlsx", [REGION])
+    assert started == [job.job_id]
+    # 任务在另一个进程中进行：不会重复生成
+    assert manager.submit("xlsx", [REGION]).status == "pending"
+    assert started == [job.job_id]
+
+    async def first_event() -> dict:
+        response = projects_routes.stream_export_job(job.job_id, None)
+        async for chunk in response.body_iterator:
+            return json.loads(chunk[len("data: "):])
+
+    assert asyncio.run(first_event())["status"] == "pending"
+
+
+def test_evicts_least_recently_used_artifacts(tmp_path) -> None:
+    manager = jobs_module.ExportJobManager(cache_dir=tmp_path, max_bytes=0)
+    now = time.time()
+    paths = []
+    for age in range(3):
+        path = tmp_path / f"artifact-{age}.csv"
+        path.write_bytes(b"x" * 1000)
+        os.utime(path, (now - 100 * age, now - 100 * age))
+        paths.append(path)
+    (tmp_path / "in-progress.csv.part").write_bytes(b"x" * 5000)
+
+    manager.max_bytes = 2000
+    manager.evict()
+    assert [path.exists() for path in paths] == [True, True, False]
+
+    manager.max_bytes = 0
+    manager.evict(keep=paths[1])
+    assert [path.exists() for path in paths] == [False, True, False]
+    assert (tmp_path / "in-progress.csv.part").exists()
+
+
+
+def test_finished_exports_scan_the_cache_only_near_the_cap(tmp_path, monkeypatch) -> None:
+    _seed()
+    manager = jobs_module.ExportJobManager(cache_dir=tmp_path, max_bytes=1 << 30)
+    scans = []
+    evict = manager.evict
+    monkeypatch.setattr(manager, "evict", lambda keep=None: scans.append(keep) or evict(keep))
+
+    for fmt in ("csv", "ndjson"):
+        manager.submit(fmt, [REGION])
+    manager.executor.submit(lambda: None).result()  # 单线程执行器：此前的任务均已结束
+    assert len(scans) == 1  # 仅首个文件生成后扫描以得到初始大小
+
+    manager.max_bytes = 1
+    job = manager.submit("csv", [REGION, "339972"])
+    manager.executor.submit(lambda: None).result()
+    assert len(scans) == 2
+    assert [path.name for path in tmp_path.iterdir()] == [job.path.name]
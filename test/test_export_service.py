@@ -0,0 +1,104 @@
+"""Project exports: headers and rows of every format, and the keyset chunking of iter_export_rows."""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy import delete, insert, select
+
+from app.db import SessionLocal
+from app.models import ValuableProject
+from app.services.export_service import (
+    BASIC_HEADERS,
+    EXPORT_CHUNK_ROWS,
+    EXPORT_FIELD_NAMES,
+    EXPORT_HEADERS,
+    iter_export_rows,
+    stream_export,
+    write_export,
+)
+
+REGION = "339981"
+BULK_REGION = "339982"
+FIELDS = {"项目名称": "光伏电站", "项目类型": "基本建设", "总投资": "1200"}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seeded() -> None:
+    base = datetime(2024, 5, 1, 8, 0, 0)
+    with SessionLocal() as session:
+        session.execute(delete(ValuableProject).where(ValuableProject.region_code.in_([REGION, BULK_REGION])))
+        session.add(
+            ValuableProject(
+                projectuuid="export-parsed",
+                project_name="已解析项目",
+                region_code=REGION,
+                discovered_at=base + timedelta(hours=1),
+                parsed_pdf=True,
+                pdf_extract_json=json.dumps(FIELDS, ensure_ascii=False),
+            )
+        )
+        session.add(
+            ValuableProject(projectuuid="export-unparsed", project_name="未解析项目", region_code=REGION, discovered_at=base)
+        )
+        # 超过一个分块，且大量行的 discovered_at 相同，分块边界只能靠 projectuuid 区分
+        session.execute(
+            insert(ValuableProject),
+            [
+                {
+                    "projectuuid": f"bulk-{idx:05d}",
+                    "project_name": f"批量项目{idx}",
+                    "region_code": BULK_REGION,
+                    "discovered_at": base - timedelta(days=idx // 100),
+                }
+                for idx in range(EXPORT_CHUNK_ROWS * 2 + 37)
+            ],
+        )
+        session.commit()
+
+
+def _expected_rows():
+    parsed = ["export-parsed", "已解析项目", REGION, "2024-05-01 09:00:00", "已解析"]
+    parsed += [FIELDS.get(name, "") for name in EXPORT_FIELD_NAMES]
+    unparsed = ["export-unparsed", "未解析项目", REGION, "2024-05-01 08:00:00", "未解析"] + [""] * len(EXPORT_FIELD_NAMES)
+    return [parsed, unparsed]
+
+
+def test_csv_export() -> None:
+    data = b"".join(stream_export("csv", [REGION])).decode("utf-8")
+    assert data.startswith("\ufeff")
+    rows = list(csv.reader(io.StringIO(data[1:])))
+    assert rows[0] == EXPORT_HEADERS
+    assert rows[1:] == _expected_rows()
+
+
+def test_ndjson_export() -> None:
+    records = [json.loads(line) for line in b"".join(stream_export("ndjson", [REGION])).decode("utf-8").splitlines()]
+    expected = _expected_rows()
+    assert [list(record)[: len(BASIC_HEADERS)] for record in records] == [BASIC_HEADERS, BASIC_HEADERS]
+    assert [[record[h] for h in BASIC_HEADERS] for record in records] == [row[: len(BASIC_HEADERS)] for row in expected]
+    assert records[0]["项目名称"] == "已解析项目"
+    assert records[0]["解析字段"] == dict(zip(EXPORT_FIELD_NAMES, expected[0][len(BASIC_HEADERS):]))
+
+
+def test_xlsx_export(tmp_path) -> None:
+    path = tmp_path / "export.xlsx"
+    assert write_export("xlsx", path.as_posix(), [REGION]) == 2
+    sheet = load_workbook(path, read_only=True)["项目列表"]
+    rows = [[cell if cell is not None else "" for cell in row] for row in sheet.iter_rows(values_only=True)]
+    assert rows[0] == EXPORT_HEADERS
+    assert rows[1:] == _expected_rows()
+
+
+def test_rows_across_chunk_boundaries_are_neither_duplicated_nor_skipped() -> None:
+    with SessionLocal() as session:
+        expected = session.scalars(
+            select(ValuableProject.projectuuid)
+            .where(ValuableProject.region_code == BULK_REGION)
+            .order_by(ValuableProject.discovered_at.desc(), ValuableProject.projectuuid.desc())
+        ).all()
+    assert len(expected) == EXPORT_CHUNK_ROWS * 2 + 37
+    assert [row[0] for row in iter_export_rows([BULK_REGION])] == expected
+    assert [row[0] for row in iter_export_rows([BULK_REGION], chunk_rows=7)] == expected
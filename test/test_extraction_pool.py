@@ -0,0 +1,105 @@
+"""ExtractionPool timeouts, pool recycling and the worker memory limit, with real spawn workers."""
+import asyncio
+import signal
+import threading
+import time
+
+import pytest
+
+from app.services.extraction_pool import ExtractionError, ExtractionPool
+
+# 以下函数在 spawn 出的 worker 里按模块名导入执行
+
+
+def _sleep(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def _stuck(seconds: float) -> None:
+    # 屏蔽 SIGALRM，模拟卡在 C 扩展里、软超时打断不了的 worker
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(seconds)
+
+
+def _allocate(megabytes: int) -> int:
+    return len(bytearray(megabytes * 1024 * 1024))
+
+
+def _pool(**kwargs) -> ExtractionPool:
+    kwargs.setdefault("max_tasks_per_child", 0)
+    return ExtractionPool(**kwargs)
+
+
+def test_time_spent_queued_does_not_count_against_the_timeout() -> None:
+    pool = _pool(max_workers=1, timeout_sec=1.0, hard_grace_sec=0.3)
+    try:
+        pool._call(_sleep, (0.01,), 1.0)  # 先把 worker 拉起来
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(pool._call(_sleep, (0.8,), 1.0))) for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 第二个任务在队列里等了 ~0.8s，总耗时超过 timeout+grace，但执行本身没有超时
+        assert results == [0.8, 0.8]
+        assert pool.restarts == 0
+    finally:
+        pool.shutdown()
+
+
+def test_soft_timeout_fails_the_job_without_recycling_the_pool() -> None:
+    pool = _pool(max_workers=1, timeout_sec=0.5, hard_grace_sec=5.0)
+    try:
+        with pytest.raises(ExtractionError, match="timed out"):
+            pool._call(_sleep, (5.0,), 0.5)
+        assert pool.restarts == 0
+        assert pool._call(_sleep, (0.01,), 0.5) == 0.01
+    finally:
+        pool.shutdown()
+
+
+def test_stuck_worker_recycles_the_pool_and_other_jobs_are_retried() -> None:
+    pool = _pool(max_workers=2, timeout_sec=1.0, hard_grace_sec=0.5)
+    try:
+        pool._call(_sleep, (0.01,), 1.0)
+        healthy = []
+
+        def run_healthy() -> None:
+            time.sleep(1.0)  # 在卡死任务被判定超时前启动，回收时正在执行
+            healthy.append(pool._call(_sleep, (0.8,), 1.0))
+
+        thread = threading.Thread(target=run_healthy)
+        thread.start()
+        started = time.monotonic()
+        with pytest.raises(ExtractionError, match="timed out"):
+            pool._call(_stuck, (30.0,), 1.0)
+        assert time.monotonic() - started < 10
+        thread.join()
+        assert healthy == [0.8]
+        assert pool.restarts == 1
+    finally:
+        pool.shutdown()
+
+
+def test_async_stuck_worker_times_out() -> None:
+    pool = _pool(max_workers=1, timeout_sec=0.5, hard_grace_sec=0.5)
+    try:
+        with pytest.raises(ExtractionError, match="timed out"):
+            asyncio.run(pool._call_async(_stuck, (30.0,), 0.5))
+        assert pool.restarts == 1
+        assert asyncio.run(pool._call_async(_sleep, (0.01,), 0.5)) == 0.01
+    finally:
+        pool.shutdown()
+
+
+def test_worker_memory_limit() -> None:
+    pool = _pool(max_workers=1, max_memory_mb=256)
+    try:
+        with pytest.raises(ExtractionError, match="memory limit"):
+            pool._call(_allocate, (512,), 10.0)
+        assert pool._call(_allocate, (16,), 10.0) == 16 * 1024 * 1024
+    finally:
+        pool.shutdown()
@@ -0,0 +1,453 @@
+"""Parse workflow services with the upstream site stubbed: queue, batch downloads and shared sessions."""
+import asyncio
+import io
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from app.crawler.models import ProjectItem
+from app.db import SessionLocal
+from app.models import ValuableProject
+from app.services import parse_queue as queue_module
+from app.services.parse_leases import acquire_leases
+from app.services.extract_cache import ExtractResultCache
+from app.services.parse_service import ExtractionResult
+from conftest import wait_for
+
+REGION = "339931"
+
+
+
+def _stub_upstream(monkeypatch) -> None:
+    monkeypatch.setattr(
+        queue_module,
+        "first_target_item",
+        lambda client, projectuuid: ProjectItem(sendid=f"send-{projectuuid}", item_name="备案", url="https://x/a.pdf"),
+    )
+    monkeypatch.setattr(queue_module, "establish_session_and_get_captcha", lambda client, p, s: ("JSESSIONID=1", b"img"))
+    monkeypatch.setattr(queue_module, "verify_captcha", lambda client, cookies, referer, code: code == "good")
+    monkeypatch.setattr(queue_module, "download_with_session", lambda *args: io.BytesIO(b"%PDF-1.4 queued"))
+    monkeypatch.setattr(
+        queue_module, "extract_document", lambda db, content: ExtractionResult({"项目类型": "基本建设"}, None, "text")
+    )
+
+
+def test_queue_prefetches_and_parses_in_background(monkeypatch) -> None:
+    _stub_upstream(monkeypatch)
+    base = datetime(2024, 1, 1)
+    with SessionLocal() as session:
+        for idx in range(5):
+            session.merge(
+                ValuableProject(
+                    projectuuid=f"queue-{idx:03d}",
+                    project_name=f"队列项目{idx}",
+                    region_code=REGION,
+                    discovered_at=base + timedelta(minutes=idx),
+                )
+            )
+        session.commit()
+
+    manager = queue_module.ParseQueueManager()
+    first = manager.start(1, "op-1", [REGION], depth=2)
+    other = manager.start(2, "op-2", [REGION], depth=2)
+    wait_for(lambda: all(e.state == "ready" for e in first.to_status().entries + other.to_status().entries))
+
+    mine = [e.projectuuid for e in first.to_status().entries]
+    theirs = [e.projectuuid for e in other.to_status().entries]
+    # 最新发现的项目优先，且两个队列不会领取同一个项目
+    assert mine == ["queue-004", "queue-003"]
+    assert theirs == ["queue-002", "queue-001"]
+
+    # 队列存在 SQLite 中：另一个 API 进程（这里是另一个 manager）也能接着处理
+    elsewhere = queue_module.ParseQueueManager().get(1)
+    entry_id = first.to_status().entries[0].entry_id
+    assert not asyncio.run(elsewhere.verify(elsewhere.get(entry_id), "bad"))
+    entry = first.get(entry_id)
+    assert entry.state == "ready" and entry.message == "验证码错误"
+    assert asyncio.run(elsewhere.verify(entry, "good"))
+    assert not asyncio.run(first.verify(entry, "good"))  # 重复提交不会再次下载
+    wait_for(lambda: first.get(entry_id).state == "succeeded")
+    assert first.get(entry_id).fields == {"项目类型": "基本建设"}
+
+    with SessionLocal() as session:
+        project = session.get(ValuableProject, "queue-004")
+        assert project.parsed_pdf and not project.is_invalid
+
+    # 验证成功后自动补位，仍保持两个待处理项目
+    wait_for(lambda: sum(e.state in ("prefetching", "ready") for e in first.to_status().entries) == 2)
+    assert "queue-000" in [e.projectuuid for e in first.to_status().entries]
+
+    manager.stop(2)
+    with SessionLocal() as session:
+        leased = acquire_leases(session, "op-3", [REGION], 5)
+        session.commit()
+    assert [(projectuuid, name) for projectuuid, name, _, _ in leased] == [("queue-002", "队列项目2"), ("queue-001", "队列项目1")]
+    assert manager.get(2) is None
+
+
+def test_queue_recovers_work_orphaned_by_a_dead_process(monkeypatch) -> None:
+    from sqlalchemy import update
+
+    from app.models import ParseQueueItem
+
+    _stub_upstream(monkeypatch)
+    with SessionLocal() as session:
+        for idx in range(2):
+            session.merge(
+                ValuableProject(projectuuid=f"orphan-{idx}", project_name=f"孤儿项目{idx}", region_code="339933")
+            )
+        session.commit()
+
+    manager = queue_module.ParseQueueManager()
+    queue = manager.start(3, "op-orphan", ["339933"], depth=2)
+    wait_for(lambda: all(e.state == "ready" for e in queue.to_status().entries))
+    waiting, processing = [e.entry_id for e in queue.to_status().entries]
+    # 模拟进程在预取/下载途中退出：条目停在中间状态且长时间没有更新
+    stale = time.time() - 3600
+    with SessionLocal() as session:
+        session.execute(
+            update(ParseQueueItem).where(ParseQueueItem.entry_id == waiting).values(state="prefetching", updated_at=stale)
+        )
+        session.execute(
+            update(ParseQueueItem).where(ParseQueueItem.entry_id == processing).values(state="processing", updated_at=stale)
+        )
+        session.commit()
+
+    queue_module.ParseQueueManager().get(3).top_up()
+    wait_for(lambda: queue.get(waiting).state == "ready")
+    assert queue.get(processing).state == "failed"
+
+
+def test_background_prefetch_gives_up_on_a_stalled_upstream(monkeypatch) -> None:
+    from app.deadlines import check_deadline
+
+    def stalled(client, projectuuid):
+        # 模拟一直没有响应的上游：每次套接字操作都受截止时间约束
+        while True:
+            check_deadline()
+            time.sleep(0.01)
+
+    _stub_upstream(monkeypatch)
+    monkeypatch.setattr(queue_module, "first_target_item", stalled)
+    monkeypatch.setattr(queue_module, "UPSTREAM_TIMEOUT_SEC", 0.1)
+    with SessionLocal() as session:
+        session.merge(ValuableProject(projectuuid="stalled-0", project_name="卡住项目", region_code="339935"))
+        session.commit()
+
+    manager = queue_module.ParseQueueManager()
+    queue = manager.start(5, "op-stalled", ["339935"], depth=1)
+    wait_for(lambda: queue.to_status().entries[0].state == "failed")
+    assert queue.to_status().entries[0].message.startswith("准备验证码失败")
+    manager.stop(5)
+
+
+def test_queue_verify_route_gives_up_when_the_client_leaves(monkeypatch) -> None:
+    from types import SimpleNamespace
+
+    import pytest
+    from fastapi import HTTPException
+
+    from app.api.routes import parse as parse_routes
+    from app.schemas import ParseQueueVerifyRequest
+
+    class GoneRequest:
+        async def is_disconnected(self) -> bool:
+            return True
+
+    _stub_upstream(monkeypatch)
+    monkeypatch.setattr(queue_module, "verify_captcha", lambda client, cookies, referer, code: time.sleep(1) or True)
+    with SessionLocal() as session:
+        session.merge(ValuableProject(projectuuid="verify-gone", project_name="断开项目", region_code="339934"))
+        session.commit()
+    manager = queue_module.ParseQueueManager()
+    monkeypatch.setattr(parse_routes, "parse_queues", manager)
+    queue = manager.start(4, "op-gone", ["339934"], depth=1)
+    wait_for(lambda: all(e.state == "ready" for e in queue.to_status().entries))
+    entry_id = queue.to_status().entries[0].entry_id
+
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(
+            parse_routes.verify_parse_queue_entry(
+                entry_id, ParseQueueVerifyRequest(code="good"), GoneRequest(), SimpleNamespace(id=4)
+            )
+        )
+    # 上游调用在 run_upstream 中执行：客户端断开后立即返回，条目保持待验证
+    assert excinfo.value.status_code == 499
+    assert time.monotonic() - started < 1
+    assert queue.get(entry_id).state == "ready"
+    manager.stop(4)
+
+
+def test_download_all_extracts_each_document_once_and_merges(monkeypatch) -> None:
+    from app.services import parse_service
+
+    bodies = {"s1": b"%PDF-1.4 one", "s2": b"%PDF-1.4 two", "s3": b"%PDF-1.4 one"}
+
+    def fake_download(client, cookies, referer, sendid, flag, code):
+        if sendid == "s4":
+            raise parse_service.DownloadTooLarge("too big")
+        return io.BytesIO(bodies[sendid])
+
+    extracted = []
+
+    def fake_extract(data, timeout_sec=None):
+        extracted.append(data)
+        if data.endswith(b"one"):
+            return {"项目类型": "基本建设", "总投资": ""}, "text"
+        return {"项目类型": "技术改造", "总投资": "300"}, "table"
+
+    monkeypatch.setattr(parse_service, "download_with_session", fake_download)
+    monkeypatch.setattr(parse_service.extraction_pool, "extract_with_tier", fake_extract)
+    monkeypatch.setattr(parse_service, "extract_cache", ExtractResultCache(max_entries=0))
+
+    session = parse_service.ParseSession(
+        id="sid", projectuuid="p", sendid="s1", cookies="", referer="", created_at=0, updated_at=0,
+        verified_captcha_code="good",
+    )
+    downloads = parse_service.download_documents(None, session, ["s1", "s2", "s3", "s4"])
+    assert [error for _, error in downloads] == [None, None, None, "附件过大，无法解析"]
+
+    with SessionLocal() as db:
+        results = parse_service.extract_documents(db, [buf.getvalue() for buf, _ in downloads[:3]])
+        db.rollback()
+    assert sorted(extracted) == [b"%PDF-1.4 one", b"%PDF-1.4 two"]
+    assert results[0] == results[2]
+    assert [result.tier for result in results] == ["text", "table", "text"]
+    merged = parse_service.merge_extracted_fields(result.fields for result in results)
+    assert merged == {"项目类型": "基本建设", "总投资": "300"}
+
+
+def test_parse_sessions_are_shared_and_reaped(tmp_path) -> None:
+    from app.services.parse_service import ParseSessionManager
+
+    worker_a = ParseSessionManager(ttl_sec=60)
+    worker_b = ParseSessionManager(ttl_sec=60)
+    created = worker_a.create("session-project", "send-1", "JSESSIONID=a")
+
+    seen = worker_b.get(created.id)
+    assert seen is not None and seen.verified_captcha_code is None
+    leftover = tmp_path / "leftover.pdf"
+    leftover.write_bytes(b"%PDF")
+    seen.verified_captcha_code = "1234"
+    seen.downloaded_files.append(leftover.as_posix())
+    worker_b.save(seen)
+
+    again = worker_a.get(created.id)
+    assert again.verified_captcha_code == "1234"
+    assert again.downloaded_files == [leftover.as_posix()]
+
+    assert worker_a.reap(now=time.time() + 30) == 0
+    assert worker_a.reap(now=time.time() + 120) >= 1
+    assert worker_b.get(created.id) is None
+    assert not leftover.exists()
+    worker_a.stop()
+    worker_b.stop()
+
+
+def test_leases_are_exclusive_and_released_on_result() -> None:
+    from app.models import ParseLease
+    from app.services.parse_leases import acquire_leases, renew_leases
+    from app.services.parse_service import record_parse_result
+
+    region = "339932"
+    with SessionLocal() as session:
+        for idx in range(3):
+            session.merge(
+                ValuableProject(
+                    projectuuid=f"lease-{idx:03d}",
+                    project_name=f"租约项目{idx}",
+                    region_code=region,
+                    discovered_at=datetime(2024, 2, 1) + timedelta(minutes=idx),
+                )
+            )
+        session.commit()
+
+        first = acquire_leases(session, "alice", [region], 2)
+        second = acquire_leases(session, "bob", [region], 2)
+        session.commit()
+        assert [row[0] for row in first] == ["lease-002", "lease-001"]
+        assert [row[0] for row in second] == ["lease-000"]
+        assert acquire_leases(session, "carol", [region], 1) == []
+
+        assert renew_leases(session, ["lease-002", "lease-000"], "alice") == 1
+        record_parse_result(session, "lease-002", {"项目类型": "基本建设"})
+        session.commit()
+        assert session.get(ParseLease, "lease-002") is None
+        assert session.get(ValuableProject, "lease-002").parsed_pdf
+
+        # 过期租约会在下一次领取时被清理并重新分配
+        session.get(ParseLease, "lease-001").expires_at = time.time() - 1
+        session.commit()
+        assert [row[0] for row in acquire_leases(session, "carol", [region], 5)] == ["lease-001"]
+        session.commit()
+
+
+def test_run_upstream_times_out_and_cancels_on_disconnect() -> None:
+    import pytest
+
+    from app.services.upstream import ClientDisconnected, UpstreamTimeout, run_upstream
+
+    class GoneRequest:
+        async def is_disconnected(self) -> bool:
+            return True
+
+    async def scenario() -> None:
+        assert await run_upstream(lambda a, b: a + b, 1, 2, timeout=1) == 3
+        with pytest.raises(UpstreamTimeout):
+            await run_upstream(time.sleep, 0.5, timeout=0.05)
+        with pytest.raises(ClientDisconnected):
+            await run_upstream(time.sleep, 0.5, request=GoneRequest(), timeout=5)
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_upstream_calls_release_their_threads() -> None:
+    from app import deadlines
+    from app.services import upstream
+
+    def slow_download() -> None:
+        # 模拟逐块读取：每块之间检查截止时间，放弃后线程应很快退出
+        while True:
+            deadlines.check_deadline()
+            time.sleep(0.01)
+
+    async def scenario() -> None:
+        assert await upstream.run_upstream(deadlines.socket_timeout, 30.0, timeout=0.5) <= 0.5
+        workers = upstream._executor._max_workers
+        calls = [upstream.run_upstream(slow_download, timeout=0.05) for _ in range(workers)]
+        for outcome in await asyncio.gather(*calls, return_exceptions=True):
+            assert isinstance(outcome, upstream.UpstreamTimeout)
+        # 若被放弃的调用仍占着线程，这里会排队直到超时
+        assert await upstream.run_upstream(lambda: "free", timeout=1) == "free"
+
+    asyncio.run(scenario())
+
+
+def test_socket_timeouts_surface_as_upstream_timeouts() -> None:
+    import socket
+    import subprocess
+    import sys
+    from urllib.error import URLError
+
+    import pytest
+
+    from app.services.upstream import UpstreamTimeout, run_upstream
+
+    def read_timeout() -> None:
+        raise socket.timeout("timed out")
+
+    def connect_timeout() -> None:
+        raise URLError(socket.timeout("timed out"))
+
+    def refused() -> None:
+        raise URLError(ConnectionRefusedError("refused"))
+
+    async def scenario() -> None:
+        for fn in (read_timeout, connect_timeout):
+            with pytest.raises(UpstreamTimeout):
+                await run_upstream(fn, timeout=1)
+        with pytest.raises(URLError):
+            await run_upstream(refused, timeout=1)
+
+    asyncio.run(scenario())
+
+    # 爬虫客户端不依赖服务层，导入它不会创建上游线程池
+    probe = "import sys, app.crawler.client; print('app.services.upstream' in sys.modules)"
+    backend = str(Path(__file__).resolve().parents[1] / "backend")
+    out = subprocess.run([sys.executable, "-c", probe], cwd=backend, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_async_extraction_keeps_db_and_hashing_off_the_event_loop(monkeypatch) -> None:
+    import threading
+
+    from app.services import parse_service
+
+    threads = []
+    prepare = parse_service._prepare_extractions
+    finish = parse_service._finish_extractions
+
+    def spy_prepare(*args):
+        threads.append(threading.current_thread())
+        return prepare(*args)
+
+    def spy_finish(*args):
+        threads.append(threading.current_thread())
+        return finish(*args)
+
+    monkeypatch.setattr(parse_service, "_prepare_extractions", spy_prepare)
+    monkeypatch.setattr(parse_service, "_finish_extractions", spy_finish)
+    monkeypatch.setattr(parse_service.extraction_pool, "extract_with_tier_async", _fake_extract_async)
+
+    async def scenario():
+        loop_thread = threading.current_thread()
+        with SessionLocal() as session:
+            results = await parse_service.extract_documents_async(session, [b"%PDF-1.4 off-loop"])
+        return loop_thread, results
+
+    loop_thread, results = asyncio.run(scenario())
+    assert results[0][0] == {"项目类型": "基本建设"}
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+async def _fake_extract_async(content: bytes):
+    return {"项目类型": "基本建设"}, "text"
+
+
+class EndlessResponse:
+    """A downFile response that never ends; counts how much of it was read."""
+
+    def __init__(self, length=None) -> None:
+        self.headers = {"Content-Length": str(length)} if length else {}
+        self.read_bytes = 0
+        self.closed = False
+
+    def read(self, size: int) -> bytes:
+        self.read_bytes += size
+        return b"\0" * size
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_oversized_download_stops_at_the_limit(monkeypatch) -> None:
+    import pytest
+    from fastapi import HTTPException
+
+    from app.api.routes import parse as parse_routes
+    from app.config import PARSE_MAX_DOWNLOAD_BYTES
+    from app.crawler.client import PublicAnnouncementClient
+    from app.schemas import ParseDownloadRequest
+    from app.services import parse_service
+
+    responses = []
+
+    def open_download(*args, length=None):
+        responses.append(EndlessResponse(length))
+        return responses[-1]
+
+    monkeypatch.setattr(parse_service, "open_download", open_download)
+    client = PublicAnnouncementClient()
+    with pytest.raises(parse_service.DownloadTooLarge):
+        parse_service.download_with_session(client, "", "", "send", "1", "code")
+    # 超过上限后立即停止读取，不会把整个响应读进内存
+    assert PARSE_MAX_DOWNLOAD_BYTES < responses[0].read_bytes <= PARSE_MAX_DOWNLOAD_BYTES + parse_service.DOWNLOAD_CHUNK_BYTES
+    assert responses[0].closed
+
+    monkeypatch.setattr(parse_service, "open_download", lambda *args: open_download(length=PARSE_MAX_DOWNLOAD_BYTES + 1))
+    with pytest.raises(parse_service.DownloadTooLarge):
+        parse_service.download_with_session(client, "", "", "send", "1", "code")
+    assert responses[1].read_bytes == 0 and responses[1].closed
+
+    class LiveRequest:
+        async def is_disconnected(self) -> bool:
+            return False
+
+    session = parse_service.session_manager.create("too-large", "send", "JSESSIONID=1")
+    session.verified_captcha_code = "good"
+    parse_service.session_manager.save(session)
+    payload = ParseDownloadRequest(parse_session_id=session.id, projectuuid="too-large")
+    with SessionLocal() as db, pytest.raises(HTTPException) as excinfo:
+        asyncio.run(parse_routes.download_and_extract(payload, LiveRequest(), db, None))
+    assert excinfo.value.status_code == 413
@@ -0,0 +1,72 @@
+"""Extractor regression suite over the synthetic corpus (see pdf_corpus.py and bench_pdf_extract.py)."""
+import io
+
+import pytest
+
+from app.services.pdf_extractor import (
+    FIELD_NAMES,
+    TIER_TABLE,
+    TIER_TEXT,
+    collect_fields,
+    extract_from_pdf,
+    extract_with_tier,
+    iter_table_rows,
+)
+from bench_pdf_extract import compare, run_benchmark
+from pdf_corpus import DECLARATION, KINDS, _page_ops, _text, build_corpus, render_pdf
+
+CORPUS = build_corpus(copies=2)
+
+
+@pytest.mark.parametrize("doc", CORPUS, ids=[doc.name for doc in CORPUS])
+def test_extracts_expected_fields(doc) -> None:
+    assert compare(doc, extract_from_pdf(doc.data)) == []
+
+
+@pytest.mark.parametrize("doc", CORPUS, ids=[doc.name for doc in CORPUS])
+def test_text_tier_matches_table_pass(doc) -> None:
+    fields, tier = extract_with_tier(doc.data)
+    table_fields, table_tier = extract_with_tier(doc.data, text_tier=False)
+    assert fields == table_fields
+    assert table_tier == TIER_TABLE
+    # 占位符金额（"—"）有标签无数值、折行标签文字层读不全，只有这两类文档需要回退到表格解析
+    assert tier == (TIER_TABLE if doc.kind in ("malformed", "wrapped_label") else TIER_TEXT)
+
+
+def test_benchmark_reports_every_kind() -> None:
+    stats = run_benchmark(build_corpus(copies=1), measure_memory=True)
+    assert [entry.kind for entry in stats] == list(KINDS)
+    for entry in stats:
+        assert entry.accuracy == 1.0, entry.mismatches
+        assert entry.docs == 1 and entry.pages >= 1
+        assert entry.docs_per_sec > 0 and entry.peak_bytes > 0
+        assert sum(entry.tiers.values()) == 1
+
+
+def test_fields_after_the_declaration_are_not_read() -> None:
+    data = {name: "" for name in FIELD_NAMES}
+    rows = [["项目名称", "声明前的项目"], *DECLARATION, ["法定代表人", "不应读取"], ["项目名称", "不应读取"]]
+    collect_fields(iter(rows), data)
+    assert data["项目名称"] == "声明前的项目"
+    assert data["法定代表人"] == ""
+
+
+def test_table_pass_skips_pages_without_edges(monkeypatch) -> None:
+    import pdfplumber
+    from pdfplumber.page import Page
+
+    cover = []
+    _text(cover, 40, 760, "项目名称 封面上的文字")
+    table = _page_ops([[["项目名称", "表格里的项目"], ["项目类型", "基本建设"]]])
+    extracted = []
+    extract_table = Page.extract_table
+
+    def spy(page, *args, **kwargs):
+        extracted.append(page.page_number)
+        return extract_table(page, *args, **kwargs)
+
+    monkeypatch.setattr(Page, "extract_table", spy)
+    with pdfplumber.open(io.BytesIO(render_pdf([cover, table, cover]))) as pdf:
+        rows = list(iter_table_rows(pdf))
+    assert extracted == [2]
+    assert rows == [["项目名称", "表格里的项目"], ["项目类型", "基本建设"]]
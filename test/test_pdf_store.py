@@ -0,0 +1,225 @@
+"""Content-addressed PDF store, the extraction result cache and the offline re-extraction job."""
+import json
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, update
+
+from app.db import SessionLocal
+from app.models import PdfExtractCache, ProjectExtractFields, ReextractJobRecord, ValuableProject
+from app.services import reextract_jobs as reextract_module
+from app.services.pdf_store import PdfStore
+
+REGION = "339921"
+
+
+def test_store_dedups_and_round_trips(tmp_path) -> None:
+    store = PdfStore(root=tmp_path, max_bytes=0, enabled=True)
+    data = b"%PDF-1.4\n" + b"0" * 10000
+    sha = store.put(data)
+    assert store.put(data) == sha
+    assert len(list(tmp_path.glob("*/*.pdf.gz"))) == 1
+    assert store.path_for(sha).stat().st_size < len(data)
+    assert store.get(sha) == data
+    assert store.get("0" * 64) is None
+
+
+def test_store_evicts_least_recently_used(tmp_path) -> None:
+    store = PdfStore(root=tmp_path, max_bytes=0, enabled=True)
+    keys = [store.put(os.urandom(4096)) for _ in range(3)]
+    now = time.time()
+    for age, sha in enumerate(reversed(keys)):
+        os.utime(store.path_for(sha), (now - 100 * (age + 1), now - 100 * (age + 1)))
+    store.get(keys[0])  # 最早写入但刚被读取过
+
+    store.max_bytes = store.path_for(keys[0]).stat().st_size * 2 + 1
+    store.evict()
+    assert store.contains(keys[0])
+    assert not store.contains(keys[1])
+    assert store.contains(keys[2])
+
+
+
+def test_store_scans_only_when_the_cap_may_be_exceeded(tmp_path, monkeypatch) -> None:
+    store = PdfStore(root=tmp_path, max_bytes=1 << 20, enabled=True)
+    scans = []
+    iter_files = store._iter_files
+    monkeypatch.setattr(store, "_iter_files", lambda: scans.append(1) or iter_files())
+
+    keys = [store.put(os.urandom(4096)) for _ in range(5)]
+    assert len(scans) == 1  # 仅首次写入时扫描以得到初始大小
+
+    store.max_bytes = store.path_for(keys[0]).stat().st_size * 6 + 1
+    store.put(os.urandom(4096))
+    assert len(scans) == 1
+    store.put(os.urandom(4096))
+    assert len(scans) == 2
+    assert len(list(tmp_path.glob("*/*.pdf.gz"))) == 6
+
+def test_reextract_job_updates_stored_projects(tmp_path, monkeypatch) -> None:
+    store = PdfStore(root=tmp_path, max_bytes=0, enabled=True)
+    stored = store.put(b"%PDF-1.4 stored")
+    monkeypatch.setattr(reextract_module, "pdf_store", store)
+    monkeypatch.setattr(
+        reextract_module.extraction_pool,
+        "extract_with_tier",
+        lambda data, timeout_sec=None: ({"项目类型": "技术改造", "总投资": "88"}, "text"),
+    )
+
+    with SessionLocal() as session:
+        for idx, sha in enumerate([stored, "f" * 64, None]):
+            session.merge(
+                ValuableProject(
+                    projectuuid=f"store-{idx:03d}",
+                    project_name=f"存储项目{idx}",
+                    region_code=REGION,
+                    discovered_at=datetime.utcnow(),
+                    pdf_sha256=sha,
+                    is_invalid=True,
+                )
+            )
+        session.commit()
+
+    manager = reextract_module.ReextractJobManager(batch_rows=1)
+    job = manager.submit([REGION])
+    manager.executor.shutdown(wait=True)
+    job = manager.get(job.job_id)
+
+    assert job.status == "succeeded", job.message
+    assert (job.total, job.processed, job.updated, job.missing, job.failed) == (2, 2, 1, 1, 0)
+    with SessionLocal() as session:
+        project = session.get(ValuableProject, "store-000")
+        assert project.parsed_pdf and not project.is_invalid
+        assert json.loads(project.pdf_extract_json)["总投资"] == "88"
+        assert session.get(ProjectExtractFields, "store-000").total_investment == 88.0
+        assert session.get(ValuableProject, "store-001").is_invalid
+
+
+def test_extract_results_are_cached_per_document_and_version(tmp_path, monkeypatch) -> None:
+    import asyncio
+
+    from app.api.routes import parse as parse_routes
+    from app.services import parse_service
+    from app.services.extract_cache import EXTRACTOR_VERSION, ExtractResultCache
+
+    calls = []
+    good, bad = b"%PDF-1.4 cached", b"%PDF-1.4 broken"
+
+    def fake_extract(data, timeout_sec=None):
+        calls.append(data)
+        if data == bad:
+            raise RuntimeError("extraction failed")
+        return {"项目类型": "基本建设"}, "table"
+
+    monkeypatch.setattr(parse_service.extraction_pool, "extract_with_tier", fake_extract)
+    monkeypatch.setattr(parse_service, "pdf_store", PdfStore(root=tmp_path, max_bytes=0, enabled=False))
+    cache = ExtractResultCache(max_entries=4)
+    monkeypatch.setattr(parse_service, "extract_cache", cache)
+
+    with SessionLocal() as session:
+        # 同一批里的重复文档只解析一次；解析失败不缓存
+        results = parse_service.extract_documents(session, [good, bad, good])
+        assert [result.fields for result in results] == [{"项目类型": "基本建设"}, None, {"项目类型": "基本建设"}]
+        assert [result.tier for result in results] == ["table", None, "table"]
+        assert sorted(calls) == [bad, good]
+        results[0][0]["项目类型"] = "changed by caller"
+        session.commit()
+        assert parse_service.extract_documents(session, [good])[0][0] == {"项目类型": "基本建设"}
+        assert len(calls) == 2
+
+        cache.clear_memory()
+        results = parse_service.extract_documents(session, [good, bad])
+        assert [result.fields for result in results] == [{"项目类型": "基本建设"}, None]
+        # 命中数据库中的缓存时也带回当初的解析层级
+        assert results[0].tier == "table"
+        assert sorted(calls) == [bad, bad, good]
+
+        sha = PdfStore.digest(good)
+        assert cache.get(session, sha) == {"项目类型": "基本建设"}
+        assert cache.get(session, sha, version=EXTRACTOR_VERSION + 1) is None
+        assert cache.get(session, PdfStore.digest(bad)) is None
+        session.commit()
+        stats = asyncio.run(parse_routes.get_extraction_tiers(session, None))
+        assert stats.extractor_version == EXTRACTOR_VERSION and stats.documents["table"] >= 1
+
+
+def test_reextract_remerges_every_document_of_download_all(tmp_path, monkeypatch) -> None:
+    from app.services import parse_service
+    from app.services.extract_cache import ExtractResultCache
+
+    store = PdfStore(root=tmp_path, max_bytes=0, enabled=True)
+    for module in (parse_service, reextract_module):
+        monkeypatch.setattr(module, "pdf_store", store)
+        monkeypatch.setattr(module, "extract_cache", ExtractResultCache(max_entries=0))
+    first, second = b"%PDF-1.4 report", b"%PDF-1.4 licence"
+
+    def extractor(version):
+        def extract(data, timeout_sec=None):
+            if data == first:
+                return {"项目类型": f"基本建设{version}", "总投资": ""}, "text"
+            return {"项目类型": "", "总投资": f"{version}00"}, "text"
+
+        return extract
+
+    monkeypatch.setattr(parse_service.extraction_pool, "extract_with_tier", extractor(1))
+    with SessionLocal() as session:
+        session.merge(
+            ValuableProject(projectuuid="store-all", project_name="多文件项目", region_code="339922", discovered_at=datetime.utcnow())
+        )
+        session.commit()
+        # 与 /download-all 相同：逐个解析、合并，并记录全部文档
+        results = parse_service.extract_documents(session, [first, second])
+        merged = parse_service.merge_extracted_fields(result.fields for result in results)
+        assert parse_service.record_parse_result(session, "store-all", merged, [result.pdf_sha256 for result in results])
+        session.commit()
+        assert merged == {"项目类型": "基本建设1", "总投资": "100"}
+
+    # 解析器升级后重新解析（清掉结果缓存相当于提升 EXTRACTOR_VERSION）：两份文档都要重新合并
+    monkeypatch.setattr(reextract_module.extraction_pool, "extract_with_tier", extractor(2))
+    with SessionLocal() as session:
+        session.execute(delete(PdfExtractCache).where(PdfExtractCache.sha256.in_([r.pdf_sha256 for r in results])))
+        session.commit()
+    manager = reextract_module.ReextractJobManager()
+    job = manager.submit(["339922"])
+    manager.executor.shutdown(wait=True)
+    job = manager.get(job.job_id)
+
+    assert job.status == "succeeded", job.message
+    assert (job.updated, job.missing, job.failed) == (1, 0, 0)
+    with SessionLocal() as session:
+        project = session.get(ValuableProject, "store-all")
+        assert json.loads(project.pdf_extract_json) == {"项目类型": "基本建设2", "总投资": "200"}
+        assert session.get(ProjectExtractFields, "store-all").total_investment == 200.0
+
+
+class _IdleExecutor:
+    def submit(self, fn, *args):
+        pass
+
+
+def test_reextract_jobs_are_shared_and_run_one_at_a_time() -> None:
+    # 两个管理器相当于两个 API 进程
+    first, second = reextract_module.ReextractJobManager(), reextract_module.ReextractJobManager()
+    for manager in (first, second):
+        manager.executor = _IdleExecutor()  # 任务不实际运行，保持 pending
+    job = first.submit(["339923"])
+    try:
+        assert second.get(job.job_id).status == "pending"
+        assert second.submit(["339924"]).job_id == job.job_id
+
+        # 运行它的进程已退出：超时后可以提交新任务，旧任务记为失败
+        with SessionLocal() as session:
+            session.execute(
+                update(ReextractJobRecord)
+                .where(ReextractJobRecord.id == job.job_id)
+                .values(updated_at=time.time() - second.STALE_JOB_SEC - 1)
+            )
+            session.commit()
+        replacement = second.submit(["339924"])
+        assert replacement.job_id != job.job_id
+        assert first.get(job.job_id).status == "failed"
+    finally:
+        with SessionLocal() as session:
+            session.execute(delete(ReextractJobRecord).where(ReextractJobRecord.regions_json.in_(['["339923"]', '["339924"]'])))
+            session.commit()
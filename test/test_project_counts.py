@@ -0,0 +1,90 @@
+"""Counts read off the trigger-maintained region_rollups must always agree with a full aggregate."""
+from datetime import datetime
+
+from sqlalchemy import delete, update
+
+from app.db import SessionLocal
+from app.migrations import rebuild_region_rollups
+from app.models import ValuableProject
+from app.schemas import RegionNode
+from app.services.project_counts import aggregate_project_counts, cached_project_counts
+from app.services.region_index import RegionIndex
+from app.services.region_rollups import sync_region_parents
+
+REGIONS = ["339901", "339902"]
+
+
+def _assert_counts_match(session) -> None:
+    for selected in (REGIONS, REGIONS[:1], []):
+        assert cached_project_counts(session, selected) == aggregate_project_counts(session, selected)
+
+
+def test_counters_follow_inserts_updates_and_deletes() -> None:
+    with SessionLocal() as session:
+        for idx in range(30):
+            session.merge(
+                ValuableProject(
+                    projectuuid=f"count-{idx:03d}",
+                    project_name=f"项目{idx}",
+                    region_code=REGIONS[idx % 2],
+                    discovered_at=datetime.utcnow(),
+                )
+            )
+        session.commit()
+        _assert_counts_match(session)
+        assert cached_project_counts(session, REGIONS).unparsed == 30
+
+        project = session.get(ValuableProject, "count-000")
+        project.parsed_pdf = True
+        session.commit()
+        session.execute(
+            update(ValuableProject)
+            .where(ValuableProject.projectuuid.in_(["count-001", "count-002"]))
+            .values(is_invalid=True)
+        )
+        session.execute(
+            update(ValuableProject).where(ValuableProject.projectuuid == "count-003").values(region_code=REGIONS[0])
+        )
+        session.commit()
+        _assert_counts_match(session)
+
+        session.execute(delete(ValuableProject).where(ValuableProject.region_code == REGIONS[1]))
+        session.commit()
+        _assert_counts_match(session)
+
+        rebuild_region_rollups(session)
+        session.commit()
+        _assert_counts_match(session)
+
+
+def test_a_city_selected_alone_counts_only_its_own_projects(tmp_path) -> None:
+    # 市的汇总行包含下属区县，单独选中市时须扣除区县部分
+    city, district = "339903", "339904"
+    tree = [
+        RegionNode.model_validate(
+            {
+                "id": city,
+                "name": "计数市",
+                "parent_id": "339900",
+                "children": [{"id": district, "name": "计数区", "parent_id": city, "children": []}],
+            }
+        )
+    ]
+    snapshot = RegionIndex(tmp_path / "regions.json").replace(tree)
+    with SessionLocal() as session:
+        sync_region_parents(session, snapshot)
+        for idx in range(5):
+            session.merge(
+                ValuableProject(
+                    projectuuid=f"count-tree-{idx}",
+                    project_name=f"项目{idx}",
+                    region_code=city if idx < 2 else district,
+                    parsed_pdf=idx == 0,
+                    discovered_at=datetime.utcnow(),
+                )
+            )
+        session.commit()
+        for selected in ([city], [district], [city, district], [city, REGIONS[0]], []):
+            assert cached_project_counts(session, selected) == aggregate_project_counts(session, selected)
+        assert cached_project_counts(session, [city]).all == 2
+        assert cached_project_counts(session, [city]).parsed == 1
@@ -0,0 +1,154 @@
+"""Keyset pagination, extracted-field filters and full-text search on /api/projects."""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete
+
+from app.api.routes.projects import list_projects
+from app.db import SessionLocal
+from app.models import ProjectExtractFields, ValuableProject
+from app.services.extract_fields import normalize_extract, upsert_extract_fields
+from app.services.search_index import index_project
+
+REGION = "339801"
+
+
+def _list(session, **kwargs):
+    params = dict(
+        region=REGION,
+        regions=[],
+        parsed=None,
+        invalid=None,
+        page=1,
+        size=7,
+        cursor=None,
+        with_total=True,
+        project_type=None,
+        min_investment=None,
+        max_investment=None,
+        start_from=None,
+        start_to=None,
+        q=None,
+        sort=None,
+        order="desc",
+    )
+    params.update(kwargs)
+    return list_projects(db=session, _=None, **params)
+
+
+def test_cursor_pages_match_offset_pages() -> None:
+    with SessionLocal() as session:
+        stamp = datetime(2024, 1, 1)
+        for idx in range(30):
+            session.add(
+                ValuableProject(
+                    projectuuid=f"page-{idx:03d}",
+                    project_name=f"项目{idx}",
+                    region_code=REGION,
+                    # 成对的相同时间戳，确保 projectuuid 参与排序
+                    discovered_at=stamp + timedelta(minutes=idx // 2),
+                )
+            )
+        session.commit()
+
+        offset_uuids = []
+        for page in range(1, 6):
+            offset_uuids.extend(item.projectuuid for item in _list(session, page=page).items)
+
+        first = _list(session)
+        assert first.total == 30
+        pages = [first]
+        while pages[-1].next_cursor:
+            pages.append(_list(session, cursor=pages[-1].next_cursor, with_total=False))
+        assert pages[-1].total is None
+        cursor_uuids = [item.projectuuid for page in pages for item in page.items]
+        assert cursor_uuids == offset_uuids
+        assert len(set(cursor_uuids)) == 30
+
+        back = _list(session, cursor=pages[2].prev_cursor)
+        assert [item.projectuuid for item in back.items] == [item.projectuuid for item in pages[1].items]
+
+
+def test_normalize_extract_parses_amounts_and_dates() -> None:
+    values = normalize_extract({"总投资": "1,200.5", "拟开工时间": "2024年3月", "成立日期": "2019-11-02", "项目类型": "基本建设"})
+    assert values["total_investment"] == 1200.5
+    assert values["planned_start_date"] == date(2024, 3, 1)
+    assert values["established_date"] == date(2019, 11, 2)
+    assert values["project_type"] == "基本建设"
+    assert values["bank_loans"] is None
+
+
+def test_extract_range_filters_and_sort() -> None:
+    region = "339802"
+    with SessionLocal() as session:
+        for idx, invest in enumerate(["50", "500", "5000", ""]):
+            uuid = f"extract-{idx}"
+            session.add(ValuableProject(projectuuid=uuid, project_name=uuid, region_code=region, parsed_pdf=True))
+            upsert_extract_fields(session, uuid, {"总投资": invest, "拟开工时间": f"2024-0{idx + 1}-01", "项目类型": "技术改造"})
+        session.commit()
+        # re-upsert must update in place, not duplicate
+        upsert_extract_fields(session, "extract-0", {"总投资": "60", "拟开工时间": "2024-01-01", "项目类型": "技术改造"})
+        session.commit()
+        assert session.get(ProjectExtractFields, "extract-0").total_investment == 60
+
+        result = _list(session, region=region, min_investment=100, sort="total_investment")
+        assert [item.projectuuid for item in result.items] == ["extract-2", "extract-1"]
+        assert result.total == 2
+        assert result.items[0].total_investment == 5000
+
+        result = _list(session, region=region, start_from=date(2024, 2, 1), start_to=date(2024, 3, 31), sort="planned_start_date", order="asc")
+        assert [item.projectuuid for item in result.items] == ["extract-1", "extract-2"]
+
+        result = _list(session, region=region, sort="total_investment", order="asc")
+        assert [item.projectuuid for item in result.items][-1] == "extract-3"
+
+
+def test_full_text_search_ranks_name_matches_first() -> None:
+    region = "339803"
+    with SessionLocal() as session:
+        docs = {
+            "search-1": ("嘉兴市年产5万吨光伏支架项目", {"项目（法人）单位": "浙江某某新能源有限公司", "法定代表人": "张三"}),
+            "search-2": ("杭州市智能仓储中心建设项目", {"建设规模与建设内容（生产能力）": "新建厂房，配套屋顶光伏电站"}),
+            "search-3": ("温州市道路改造工程", {"法定代表人": "李四"}),
+        }
+        for uuid, (name, extract) in docs.items():
+            session.add(ValuableProject(projectuuid=uuid, project_name=name, region_code=region))
+            index_project(session, uuid, name, extract)
+        session.commit()
+        # 重建索引不产生重复文档
+        index_project(session, "search-1", docs["search-1"][0], docs["search-1"][1])
+        session.commit()
+
+        result = _list(session, region=region, q="光伏")
+        assert [item.projectuuid for item in result.items] == ["search-1", "search-2"]
+        assert result.total == 2
+        assert [item.projectuuid for item in _list(session, region=region, q="李四").items] == ["search-3"]
+        assert [item.projectuuid for item in _list(session, region=region, q="新能源 张三").items] == ["search-1"]
+        assert _list(session, region=region, q="光 支").total == 1
+
+        session.execute(delete(ValuableProject).where(ValuableProject.projectuuid == "search-1"))
+        session.commit()
+        assert [item.projectuuid for item in _list(session, region=region, q="光伏").items] == ["search-2"]
+
+
+def test_offset_pages_report_adjacent_pages_for_any_sort() -> None:
+    region = "339804"
+    with SessionLocal() as session:
+        for idx in range(10):
+            uuid = f"offset-{idx}"
+            session.add(ValuableProject(projectuuid=uuid, project_name=f"光伏项目{idx}", region_code=region))
+            index_project(session, uuid, f"光伏项目{idx}", {})
+        session.commit()
+
+        for kwargs in ({"q": "光伏"}, {"sort": "discovered_at", "order": "asc"}, {"sort": "total_investment"}):
+            first = _list(session, region=region, size=4, **kwargs)
+            middle = _list(session, region=region, size=4, page=2, **kwargs)
+            last = _list(session, region=region, size=4, page=3, **kwargs)
+            assert (first.has_prev, first.has_next) == (False, True)
+            assert (middle.has_prev, middle.has_next) == (True, True)
+            assert (last.has_prev, last.has_next) == (True, False)
+            assert len(last.items) == 2
+            # 非默认排序不发游标
+            assert first.next_cursor is None and middle.prev_cursor is None
+
+        keyset = _list(session, region=region, size=4)
+        assert keyset.has_next and keyset.next_cursor is not None
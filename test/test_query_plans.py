@@ -0,0 +1,101 @@
+"""Query-plan regression tests for the project endpoints.
+
+Run with ``python -m pytest test/test_query_plans.py`` from the repository root.
+Each test runs ``EXPLAIN QUERY PLAN`` against the throwaway SQLite database that
+``conftest.py`` migrates to the current schema, and fails if a project query falls
+back to a full table scan.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, tuple_
+
+from app.api.routes.projects import _filter_projects
+from app.db import SessionLocal, engine
+from app.migrations import SCHEMA_VERSION, ensure_migrations, get_schema_version
+from app.models import CrawlRun, ValuableProject
+
+REGIONS = ["330102", "330105"]
+
+
+def setup_module() -> None:
+    with SessionLocal() as session:
+        now = datetime.utcnow()
+        for idx in range(200):
+            session.add(
+                ValuableProject(
+                    projectuuid=f"plan-{idx:04d}",
+                    project_name=f"项目{idx}",
+                    region_code=["330102", "330105", "330106", "330108"][idx % 4],
+                    discovered_at=now - timedelta(minutes=idx),
+                    parsed_pdf=idx % 3 == 0,
+                    is_invalid=idx % 7 == 0,
+                )
+            )
+        session.commit()
+
+
+def _plan(stmt) -> str:
+    sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def _assert_index_backed(plan: str, table: str = "valuable_projects") -> None:
+    for line in plan.splitlines():
+        if line.startswith(f"SCAN {table}"):
+            assert "INDEX" in line, f"full table scan:\n{plan}"
+    assert "INDEX" in plan, f"no index used:\n{plan}"
+
+
+def test_schema_version_is_current() -> None:
+    with SessionLocal() as session:
+        assert get_schema_version(session) == SCHEMA_VERSION
+        ensure_migrations(session)
+        assert get_schema_version(session) == SCHEMA_VERSION
+
+
+def test_list_query_by_region_uses_index() -> None:
+    for parsed, invalid in [(None, None), (True, None), (False, None), (None, True)]:
+        stmt = _filter_projects(select(ValuableProject), REGIONS, parsed=parsed, invalid=invalid)
+        _assert_index_backed(_plan(stmt.order_by(ValuableProject.discovered_at.desc()).limit(20)))
+
+
+def test_list_query_without_region_avoids_sort_scan() -> None:
+    stmt = select(ValuableProject).order_by(ValuableProject.discovered_at.desc()).limit(20)
+    plan = _plan(stmt)
+    _assert_index_backed(plan)
+    assert "TEMP B-TREE" not in plan, plan
+
+
+def test_count_queries_use_index() -> None:
+    base = select(func.count()).select_from(ValuableProject)
+    for selected in (REGIONS, []):
+        for parsed, invalid in [(None, None), (True, None), (False, None), (None, True)]:
+            _assert_index_backed(_plan(_filter_projects(base, selected, parsed=parsed, invalid=invalid)))
+
+
+def test_delete_by_regions_uses_index() -> None:
+    stmt = delete(ValuableProject).where(ValuableProject.region_code.in_(REGIONS))
+    _assert_index_backed(_plan(stmt))
+
+
+def test_crawl_runs_order_uses_index() -> None:
+    plan = _plan(select(CrawlRun).order_by(CrawlRun.started_at.desc()))
+    _assert_index_backed(plan, table="crawl_runs")
+    assert "TEMP B-TREE" not in plan, plan
+
+
+def test_keyset_page_query_uses_index_order() -> None:
+    anchor = (datetime.utcnow(), "plan-0100")
+    sort_key = tuple_(ValuableProject.discovered_at, ValuableProject.projectuuid)
+    for selected in (REGIONS[:1], []):
+        stmt = (
+            _filter_projects(select(ValuableProject), selected)
+            .where(sort_key < tuple_(*anchor))
+            .order_by(ValuableProject.discovered_at.desc(), ValuableProject.projectuuid.desc())
+            .limit(21)
+        )
+        plan = _plan(stmt)
+        _assert_index_backed(plan)
+        assert "TEMP B-TREE" not in plan, plan
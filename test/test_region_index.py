@@ -0,0 +1,101 @@
+"""The shared region index: lookups, mtime-based reload and the pre-serialised tree response."""
+import copy
+import json
+import os
+
+from starlette.requests import Request
+
+from app.api.routes import regions as regions_route
+from app.schemas import RegionNode
+from app.services.crawler_service import CrawlerService
+from app.services.region_index import RegionIndex
+
+TREE = [
+    {
+        "id": "330100",
+        "name": "杭州市",
+        "parent_id": "330000",
+        "children": [
+            {"id": "330102", "name": "上城区", "parent_id": "330100", "children": []},
+            {"id": "330105", "name": "拱墅区", "parent_id": "330100", "children": []},
+        ],
+    }
+]
+
+
+def _request(etag: str = "") -> Request:
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": "/api/regions", "headers": headers})
+
+
+def test_lookups_and_reload_on_mtime_change(tmp_path) -> None:
+    path = tmp_path / "regions.json"
+    index = RegionIndex(path)
+    assert index.snapshot() is None
+    assert index.display_names(["330102"]) == {"330102": "330102"}
+
+    path.write_text(json.dumps(TREE, ensure_ascii=False), encoding="utf-8")
+    first = index.snapshot()
+    assert index.snapshot() is first
+    assert index.get("330100").children == ("330102", "330105")
+    assert index.get("330105").parent_id == "330100"
+    assert index.display_names(["330100", "330102", "999999"]) == {
+        "330100": "杭州市",
+        "330102": "杭州市/上城区",
+        "999999": "999999",
+    }
+
+    renamed = copy.deepcopy(TREE)
+    renamed[0]["children"][0]["name"] = "上城区（新）"
+    path.write_text(json.dumps(renamed, ensure_ascii=False), encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = index.snapshot()
+    assert second is not first and second.etag != first.etag
+    assert index.get("330102").name == "上城区（新）"
+
+
+
+def test_reload_hook_runs_for_each_tree_loaded_from_disk(tmp_path) -> None:
+    path = tmp_path / "regions.json"
+    loaded = []
+
+    def on_reload(snapshot):
+        loaded.append(snapshot)
+        raise RuntimeError("hook failures must not break lookups")
+
+    index = RegionIndex(path, on_reload=on_reload)
+    path.write_text(json.dumps(TREE, ensure_ascii=False), encoding="utf-8")
+    first = index.snapshot()
+    assert index.snapshot() is first
+    assert loaded == [first]
+
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    second = index.snapshot()
+    assert second is not first and loaded == [first, second]
+
+
+def test_tree_response_uses_etag(tmp_path, monkeypatch) -> None:
+    index = RegionIndex(tmp_path / "regions.json")
+    snapshot = index.replace([RegionNode.model_validate(node) for node in TREE])
+    monkeypatch.setattr(regions_route, "region_index", index)
+
+    response = regions_route.get_regions(_request(), None, None)
+    assert response.status_code == 200
+    assert response.headers["etag"] == snapshot.etag
+    body = json.loads(response.body)
+    assert body[0]["pId"] == "330000" and [c["id"] for c in body[0]["children"]] == ["330102", "330105"]
+
+    assert regions_route.get_regions(_request(snapshot.etag), None, None).status_code == 304
+    assert regions_route.get_regions(_request('"stale", W/' + snapshot.etag), None, None).status_code == 304
+    assert regions_route.get_regions(_request('"stale"'), None, None).status_code == 200
+
+
+def test_crawler_names_come_from_the_index(tmp_path, monkeypatch) -> None:
+    from app.services import crawler_service
+
+    index = RegionIndex(tmp_path / "regions.json")
+    index.replace([RegionNode.model_validate(node) for node in TREE])
+    monkeypatch.setattr(crawler_service, "region_index", index)
+    assert CrawlerService(client=object())._build_region_name_map(["330105"]) == {"330105": "杭州市/拱墅区"}
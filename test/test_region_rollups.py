@@ -0,0 +1,137 @@
+"""Trigger-maintained city/district rollups must always agree with a full rebuild."""
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.db import SessionLocal
+from app.migrations import rebuild_region_rollups
+from app.models import ProjectExtractFields, RegionParent, RegionRollup, ValuableProject
+from app.schemas import RegionNode
+from app.services.extract_fields import upsert_extract_fields
+from app.services import region_index as region_index_module
+from app.services.region_index import RegionIndex
+from app.services.region_rollups import region_rollup_tree, sync_region_parents
+
+CITY, DISTRICT_A, DISTRICT_B = "339950", "339951", "339952"
+TREE = [
+    {
+        "id": CITY,
+        "name": "测试市",
+        "parent_id": "339900",
+        "children": [
+            {"id": DISTRICT_A, "name": "甲区", "parent_id": CITY, "children": []},
+            {"id": DISTRICT_B, "name": "乙区", "parent_id": CITY, "children": []},
+        ],
+    }
+]
+
+
+def _rollups(session) -> dict:
+    rows = session.scalars(select(RegionRollup).where(RegionRollup.region_code.in_([CITY, DISTRICT_A, DISTRICT_B])))
+    return {
+        row.region_code: (
+            row.all_count, row.parsed_count, row.unparsed_count, row.invalid_count, round(row.total_investment, 4)
+        )
+        for row in rows
+    }
+
+
+def _assert_matches_rebuild(session) -> dict:
+    incremental = _rollups(session)
+    rebuild_region_rollups(session)
+    session.commit()
+    assert _rollups(session) == incremental
+    return incremental
+
+
+@pytest.fixture()
+def snapshot(tmp_path):
+    index = RegionIndex(tmp_path / "regions.json")
+    snapshot = index.replace([RegionNode.model_validate(node) for node in TREE])
+    with SessionLocal() as session:
+        sync_region_parents(session, snapshot)
+        session.commit()
+    return snapshot
+
+
+def test_rollups_follow_project_and_field_changes(snapshot) -> None:
+    with SessionLocal() as session:
+        for idx in range(6):
+            session.add(
+                ValuableProject(
+                    projectuuid=f"rollup-{idx:03d}",
+                    project_name=f"汇总项目{idx}",
+                    region_code=DISTRICT_A if idx < 4 else DISTRICT_B,
+                    discovered_at=datetime.utcnow(),
+                )
+            )
+        session.commit()
+        assert _assert_matches_rebuild(session)[CITY] == (6, 0, 6, 0, 0)
+
+        for idx, amount in ((0, "120.5"), (1, "80"), (4, "300")):
+            project = session.get(ValuableProject, f"rollup-{idx:03d}")
+            project.parsed_pdf = True
+            upsert_extract_fields(session, project.projectuuid, {"总投资": amount})
+        session.get(ValuableProject, "rollup-002").is_invalid = True
+        session.commit()
+        counts = _assert_matches_rebuild(session)
+        assert counts[DISTRICT_A] == (4, 2, 1, 1, 200.5)
+        assert counts[DISTRICT_B] == (2, 1, 1, 0, 300)
+        assert counts[CITY] == (6, 3, 2, 1, 500.5)
+
+        # 重新解析改变投资额、项目换区、删除项目
+        upsert_extract_fields(session, "rollup-001", {"总投资": "100"})
+        session.get(ValuableProject, "rollup-000").region_code = DISTRICT_B
+        session.commit()
+        counts = _assert_matches_rebuild(session)
+        assert counts[DISTRICT_A] == (3, 1, 1, 1, 100)
+        assert counts[DISTRICT_B] == (3, 2, 1, 0, 420.5)
+
+        session.execute(delete(ValuableProject).where(ValuableProject.projectuuid == "rollup-004"))
+        session.execute(delete(ProjectExtractFields).where(ProjectExtractFields.projectuuid == "rollup-001"))
+        session.commit()
+        counts = _assert_matches_rebuild(session)
+        assert counts[CITY] == (5, 2, 2, 1, 120.5)
+
+        tree = region_rollup_tree(session, snapshot)
+        assert [node.id for node in tree] == [CITY]
+        assert (tree[0].all, tree[0].total_investment) == (5, 120.5)
+        assert {child.id: child.parsed for child in tree[0].children} == {DISTRICT_A: 1, DISTRICT_B: 1}
+
+
+def test_parent_changes_rebuild_rollups(snapshot, tmp_path) -> None:
+    with SessionLocal() as session:
+        session.merge(
+            ValuableProject(
+                projectuuid="rollup-move", project_name="迁移项目", region_code=DISTRICT_B, discovered_at=datetime.utcnow()
+            )
+        )
+        session.commit()
+        before = _rollups(session)[CITY][0]
+
+        moved = [dict(TREE[0], children=TREE[0]["children"][:1]), {"id": DISTRICT_B, "name": "乙区", "children": []}]
+        new_snapshot = RegionIndex(tmp_path / "moved.json").replace([RegionNode.model_validate(n) for n in moved])
+        assert sync_region_parents(session, new_snapshot)
+        assert not sync_region_parents(session, new_snapshot)
+        session.commit()
+        assert _rollups(session)[CITY][0] == before - _rollups(session)[DISTRICT_B][0]
+        _assert_matches_rebuild(session)
+        sync_region_parents(session, snapshot)
+        session.commit()
+
+
+def test_reloading_an_edited_regions_file_resyncs_parents(snapshot, tmp_path) -> None:
+    # regions.json 被其他进程改写后，本进程重新加载时由钩子同步 region_parents
+    path = tmp_path / "edited.json"
+    moved = [dict(TREE[0], children=TREE[0]["children"][:1]), {"id": DISTRICT_B, "name": "乙区", "children": []}]
+    path.write_text(json.dumps(moved, ensure_ascii=False), encoding="utf-8")
+    index = RegionIndex(path, on_reload=region_index_module._write_region_parents)
+    index.snapshot()
+    with SessionLocal() as session:
+        parents = dict(session.execute(select(RegionParent.region_code, RegionParent.parent_code)).all())
+        assert parents == {DISTRICT_A: CITY}
+        _assert_matches_rebuild(session)
+        sync_region_parents(session, snapshot)
+        session.commit()
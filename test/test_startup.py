@@ -0,0 +1,50 @@
+"""Startup stays side-effect free: the database work lives in the lifespan (app.bootstrap)."""
+import json
+import sqlite3
+import subprocess
+import sys
+
+from app import bootstrap as bootstrap_module
+from app.bootstrap import DEFAULT_ADMIN_USERNAME, bootstrap, ensure_default_admin, ensure_schema
+from app.db import SessionLocal
+from app.migrations import SCHEMA_VERSION
+from bench_startup import BACKEND_DIR, _env, probe
+
+LAZY_MODULES = ("jose", "passlib", "openpyxl", "pdfplumber", "pdfminer")
+
+
+def test_import_does_not_touch_database_or_heavy_modules(tmp_path) -> None:
+    script = (
+        "import json, sys\n"
+        "import app.main\n"
+        f"print(json.dumps(sorted(m for m in {LAZY_MODULES!r} if m in sys.modules)))\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, env=_env(tmp_path), capture_output=True, text=True, check=True
+    )
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
+    assert not (tmp_path / "app.db").exists()
+
+
+def test_lifespan_bootstraps_fresh_database(tmp_path) -> None:
+    timing, _ = probe(tmp_path)
+    assert timing["ready"] >= timing["import"] > 0
+    with sqlite3.connect(tmp_path / "app.db") as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        assert conn.execute("SELECT role FROM users WHERE username = ?", (DEFAULT_ADMIN_USERNAME,)).fetchall() == [
+            ("admin",)
+        ]
+
+
+def test_bootstrap_is_a_no_op_once_current(monkeypatch) -> None:
+    with SessionLocal() as session:
+        bootstrap(session)
+
+        def fail(*_args, **_kwargs):
+            raise AssertionError("current database should not be bootstrapped again")
+
+        monkeypatch.setattr(bootstrap_module, "ensure_migrations", fail)
+        monkeypatch.setattr(bootstrap_module, "get_password_hash", fail)
+        monkeypatch.setattr(bootstrap_module.Base.metadata, "create_all", fail)
+        assert ensure_schema(session) is False
+        assert ensure_default_admin(session) is False